@@ -0,0 +1,37 @@
+"""add_data_versions_table
+
+Revision ID: a7c3e9f1d482
+Revises: f2b8d5e1c374
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f1d482'
+down_revision: Union[str, None] = 'f2b8d5e1c374'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # HTTPキャッシュ用のデータバージョンテーブルを作成
+    op.create_table('data_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('resource', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'resource', name='uq_data_versions_user_resource')
+    )
+    op.create_index(op.f('ix_data_versions_id'), 'data_versions', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_data_versions_id'), table_name='data_versions')
+    op.drop_table('data_versions')
@@ -0,0 +1,27 @@
+"""add_import_job_worker_id
+
+Revision ID: a9c4e7f1b560
+Revises: f8b3d6e0a459
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e7f1b560'
+down_revision: Union[str, None] = 'f8b3d6e0a459'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 実行中のワーカー（再起動時に前のプロセスが残したジョブを判定）
+    op.add_column('import_jobs', sa.Column('worker_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('import_jobs', 'worker_id')
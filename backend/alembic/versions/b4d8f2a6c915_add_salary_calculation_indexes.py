@@ -0,0 +1,33 @@
+"""add_salary_calculation_indexes
+
+Revision ID: b4d8f2a6c915
+Revises: a7c3e9f1d482
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d8f2a6c915'
+down_revision: Union[str, None] = 'a7c3e9f1d482'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 給与計算結果の集計用インデックス（期間 → 社員は一意、社員 → 期間は履歴用）
+    op.create_unique_constraint(
+        'uq_salary_calculations_period_employee', 'salary_calculations', ['calculation_period_id', 'employee_id']
+    )
+    op.create_index(
+        'ix_salary_calculations_employee_period', 'salary_calculations', ['employee_id', 'calculation_period_id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_salary_calculations_employee_period', table_name='salary_calculations')
+    op.drop_constraint('uq_salary_calculations_period_employee', 'salary_calculations', type_='unique')
@@ -0,0 +1,27 @@
+"""add_excel_template_column_map
+
+Revision ID: c5e9a3b7d026
+Revises: b4d8f2a6c915
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e9a3b7d026'
+down_revision: Union[str, None] = 'b4d8f2a6c915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # テンプレートの列マップ（既存のテンプレートは次回のExcel生成時に検出して保存）
+    op.add_column('excel_templates', sa.Column('column_map', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('excel_templates', 'column_map')
@@ -0,0 +1,27 @@
+"""add_excel_template_metadata
+
+Revision ID: d6f1b4c8e237
+Revises: c5e9a3b7d026
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6f1b4c8e237'
+down_revision: Union[str, None] = 'c5e9a3b7d026'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # テンプレートの解析結果（既存のテンプレートは次回のExcel生成時に解析して保存）
+    op.add_column('excel_templates', sa.Column('template_metadata', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('excel_templates', 'template_metadata')
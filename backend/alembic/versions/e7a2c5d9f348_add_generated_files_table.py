@@ -0,0 +1,51 @@
+"""add_generated_files_table
+
+Revision ID: e7a2c5d9f348
+Revises: d6f1b4c8e237
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2c5d9f348'
+down_revision: Union[str, None] = 'd6f1b4c8e237'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 生成ファイルの管理テーブルを作成
+    op.create_table('generated_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_name', sa.String(), nullable=False),
+        sa.Column('storage_backend', sa.String(), nullable=False),
+        sa.Column('storage_key', sa.String(), nullable=False),
+        sa.Column('file_size', sa.Integer(), nullable=True),
+        sa.Column('sha256', sa.String(), nullable=True),
+        sa.Column('calculation_period_id', sa.Integer(), nullable=True),
+        sa.Column('template_id', sa.Integer(), nullable=True),
+        sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_downloaded_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['calculation_period_id'], ['calculation_periods.id'], ),
+        sa.ForeignKeyConstraint(['template_id'], ['excel_templates.id'], ),
+        sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generated_files_id'), 'generated_files', ['id'], unique=False)
+    op.create_index(op.f('ix_generated_files_file_name'), 'generated_files', ['file_name'], unique=True)
+    op.create_index(op.f('ix_generated_files_calculation_period_id'), 'generated_files', ['calculation_period_id'], unique=False)
+    op.create_index(op.f('ix_generated_files_created_at'), 'generated_files', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generated_files_created_at'), table_name='generated_files')
+    op.drop_index(op.f('ix_generated_files_calculation_period_id'), table_name='generated_files')
+    op.drop_index(op.f('ix_generated_files_file_name'), table_name='generated_files')
+    op.drop_index(op.f('ix_generated_files_id'), table_name='generated_files')
+    op.drop_table('generated_files')
@@ -0,0 +1,46 @@
+"""add_period_snapshots_table
+
+Revision ID: f2b8d5e1c374
+Revises: e1a4c7b2f903
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d5e1c374'
+down_revision: Union[str, None] = 'e1a4c7b2f903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 確定済み計算期間のスナップショットテーブルを作成
+    op.create_table('period_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('calculation_period_id', sa.Integer(), nullable=False),
+        sa.Column('summaries', sa.JSON(), nullable=False),
+        sa.Column('summary_count', sa.Integer(), nullable=True),
+        sa.Column('row_counts', sa.JSON(), nullable=True),
+        sa.Column('template_id', sa.Integer(), nullable=True),
+        sa.Column('workbook_file_name', sa.String(), nullable=True),
+        sa.Column('workbook_sha256', sa.String(), nullable=True),
+        sa.Column('created_by_user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['calculation_period_id'], ['calculation_periods.id'], ),
+        sa.ForeignKeyConstraint(['template_id'], ['excel_templates.id'], ),
+        sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_period_snapshots_id'), 'period_snapshots', ['id'], unique=False)
+    op.create_index(op.f('ix_period_snapshots_calculation_period_id'), 'period_snapshots', ['calculation_period_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_period_snapshots_calculation_period_id'), table_name='period_snapshots')
+    op.drop_index(op.f('ix_period_snapshots_id'), table_name='period_snapshots')
+    op.drop_table('period_snapshots')
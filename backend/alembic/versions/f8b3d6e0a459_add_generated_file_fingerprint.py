@@ -0,0 +1,29 @@
+"""add_generated_file_input_fingerprint
+
+Revision ID: f8b3d6e0a459
+Revises: e7a2c5d9f348
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b3d6e0a459'
+down_revision: Union[str, None] = 'e7a2c5d9f348'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 生成時の入力のフィンガープリント（既存の行は NULL のままで再利用しない）
+    op.add_column('generated_files', sa.Column('input_fingerprint', sa.String(), nullable=True))
+    op.create_index(op.f('ix_generated_files_input_fingerprint'), 'generated_files', ['input_fingerprint'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generated_files_input_fingerprint'), table_name='generated_files')
+    op.drop_column('generated_files', 'input_fingerprint')
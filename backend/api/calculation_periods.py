@@ -1,18 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 
-from database import get_db
+from database import get_db, get_read_db
 from models import User, CalculationPeriod
-from schemas import CalculationPeriodCreate, CalculationPeriodUpdate, CalculationPeriodResponse
+from schemas import (
+    CalculationPeriodCreate, CalculationPeriodUpdate, CalculationPeriodResponse, PeriodSnapshotResponse
+)
 from core.security import get_current_user
+from services.data_versions import (
+    CALCULATION_PERIODS, GLOBAL_SCOPE, WORK_DATA, bump_data_version, not_modified_response
+)
+from services.period_snapshot import (
+    LOCKED_STATUS, freeze_period, get_period_snapshot, release_period_snapshot
+)
 
 router = APIRouter()
 
 @router.get("/calculation-periods", response_model=List[CalculationPeriodResponse])
-async def get_calculation_periods(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """計算期間一覧を取得"""
+async def get_calculation_periods(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """計算期間一覧を取得（変更がなければ 304）"""
+    not_modified = not_modified_response(request, response, db, (CALCULATION_PERIODS, GLOBAL_SCOPE))
+    if not_modified:
+        return not_modified
+    
     periods = db.query(CalculationPeriod).order_by(CalculationPeriod.year.desc(), CalculationPeriod.month.desc()).all()
     return periods
 
@@ -47,6 +64,7 @@ async def create_calculation_period(period_data: CalculationPeriodCreate, curren
     )
     
     db.add(db_period)
+    bump_data_version(db, CALCULATION_PERIODS)
     db.commit()
     db.refresh(db_period)
     
@@ -67,14 +85,38 @@ async def update_calculation_period(
     
     # ステータス更新
     if period_data.status:
+        previous_status = period.status
         period.status = period_data.status
         period.updated_at = datetime.utcnow()
+        
+        # ロック時はスナップショットを作成、ロック解除時は破棄
+        if period_data.status == LOCKED_STATUS and previous_status != LOCKED_STATUS:
+            try:
+                freeze_period(db, period, current_user.id, period_data.template_id)
+            except ValueError as e:
+                db.rollback()
+                raise HTTPException(status_code=400, detail=f"スナップショットの作成に失敗しました: {str(e)}")
+        elif previous_status == LOCKED_STATUS and period_data.status != LOCKED_STATUS:
+            release_period_snapshot(db, period.id)
+        
+        bump_data_version(db, CALCULATION_PERIODS)
+        bump_data_version(db, WORK_DATA, current_user.id)
     
     db.commit()
     db.refresh(period)
     
     return period
 
+@router.get("/calculation-periods/{period_id}/snapshot", response_model=PeriodSnapshotResponse)
+async def get_calculation_period_snapshot(period_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """確定済み計算期間のスナップショット情報を取得"""
+    snapshot = get_period_snapshot(db, period_id)
+    
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="スナップショットが見つかりません")
+    
+    return snapshot
+
 @router.delete("/calculation-periods/{period_id}")
 async def delete_calculation_period(period_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """計算期間を削除"""
@@ -88,6 +130,7 @@ async def delete_calculation_period(period_id: int, current_user: User = Depends
         raise HTTPException(status_code=400, detail="ドラフト状態の計算期間のみ削除できます")
     
     db.delete(period)
+    bump_data_version(db, CALCULATION_PERIODS)
     db.commit()
     
     return {"message": "計算期間が削除されました"}
@@ -152,6 +195,7 @@ async def start_salary_calculation(
             # ドラフト状態の場合は計算開始に変更
             existing_period.status = "calculating"
             existing_period.updated_at = datetime.utcnow()
+            bump_data_version(db, CALCULATION_PERIODS)
             db.commit()
             db.refresh(existing_period)
             return existing_period
@@ -165,6 +209,7 @@ async def start_salary_calculation(
             status="calculating"
         )
         db.add(new_period)
+        bump_data_version(db, CALCULATION_PERIODS)
         db.commit()
         db.refresh(new_period)
         return new_period
\ No newline at end of file
@@ -1,19 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_db, get_read_db
 from models import User, Employee
-from schemas import EmployeeCreate, EmployeeUpdate, EmployeeResponse
+from schemas import EmployeeCreate, EmployeeUpdate, EmployeeResponse, EmployeeImportResponse
+from core.fast_json import FastJSONResponse
 from core.security import get_current_user
+from services.csv_import import CSVDecodeError, decode_csv_content
+from services.data_versions import EMPLOYEES, WORK_DATA, bump_data_version, not_modified_response
+from services.employee_directory import get_employee_directory, invalidate_employee_directory
+from services.employee_import import parse_employee_csv, upsert_employees
 
 router = APIRouter()
 
 @router.get("/employees", response_model=List[EmployeeResponse])
-async def get_employees(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """現在のユーザーの社員一覧を取得"""
-    employees = db.query(Employee).filter(Employee.user_id == current_user.id).all()
-    return employees
+async def get_employees(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """現在のユーザーの社員一覧を取得（変更がなければ 304）"""
+    not_modified = not_modified_response(request, response, db, (EMPLOYEES, current_user.id))
+    if not_modified:
+        return not_modified
+    
+    directory = get_employee_directory(db, current_user.id)
+    return FastJSONResponse(directory.response_body(), headers=response.headers)
 
 @router.get("/employees/{employee_id}", response_model=EmployeeResponse)
 async def get_employee(employee_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -55,11 +69,47 @@ async def create_employee(employee_data: EmployeeCreate, current_user: User = De
     )
     
     db.add(db_employee)
+    bump_data_version(db, EMPLOYEES, current_user.id)
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
+    invalidate_employee_directory(current_user.id)
     db.refresh(db_employee)
     
     return db_employee
 
+@router.post("/employees/import-csv", response_model=EmployeeImportResponse)
+async def import_employees_csv(
+    file: UploadFile = File(...),
+    deactivate_missing: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """社員CSVを社員番号で一括アップサート（既存社員のIDは変わらない）
+    
+    deactivate_missing=true の場合、CSVに無い社員を無効化する（社員の行が無いCSVは 400）
+    CSVに無い任意の列（Kiwi氏名・リモート手当上限なし）は既存の値を保持する
+    """
+    content = await file.read()
+    if not content:
+        raise HTTPException(status_code=400, detail="CSVファイルが空です")
+    
+    try:
+        content_str, _ = decode_csv_content(content, replace_on_failure=False)
+    except CSVDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows, errors = parse_employee_csv(content_str)
+    if errors:
+        return EmployeeImportResponse(total_rows=len(rows) + len(errors), errors=errors, success=False)
+    
+    try:
+        result = upsert_employees(db, current_user.id, rows, deactivate_missing=deactivate_missing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    invalidate_employee_directory(current_user.id)
+    return result
+
 @router.put("/employees/{employee_id}", response_model=EmployeeResponse)
 async def update_employee(
     employee_id: int,
@@ -107,7 +157,10 @@ async def update_employee(
     if employee_data.is_active is not None:
         employee.is_active = employee_data.is_active
     
+    bump_data_version(db, EMPLOYEES, current_user.id)
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
+    invalidate_employee_directory(current_user.id)
     db.refresh(employee)
     
     return employee
@@ -124,6 +177,9 @@ async def delete_employee(employee_id: int, current_user: User = Depends(get_cur
         raise HTTPException(status_code=404, detail="社員が見つかりません")
     
     db.delete(employee)
+    bump_data_version(db, EMPLOYEES, current_user.id)
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
+    invalidate_employee_directory(current_user.id)
     
     return {"message": "社員が削除されました"}
\ No newline at end of file
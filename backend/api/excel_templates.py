@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
@@ -10,6 +10,8 @@ from database import get_db
 from models import User, ExcelTemplate
 from schemas import ExcelTemplateResponse, ExcelTemplateListResponse
 from core.security import get_current_user
+from services.data_versions import EXCEL_TEMPLATES, bump_data_version, not_modified_response
+from services.template_layout import TemplateAnalysisError, analyze_template
 
 router = APIRouter()
 
@@ -31,8 +33,17 @@ def get_next_version(user_id: int, db: Session) -> str:
         return "1.0"
 
 @router.get("/excel-templates", response_model=List[ExcelTemplateListResponse])
-async def get_excel_templates(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """現在のユーザーのExcelテンプレート一覧を取得（アップロード順）"""
+async def get_excel_templates(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """現在のユーザーのExcelテンプレート一覧を取得（アップロード順、変更がなければ 304）"""
+    not_modified = not_modified_response(request, response, db, (EXCEL_TEMPLATES, current_user.id))
+    if not_modified:
+        return not_modified
+    
     templates = db.query(ExcelTemplate).filter(
         ExcelTemplate.created_by_user_id == current_user.id
     ).order_by(
@@ -48,7 +59,7 @@ async def create_excel_template(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """新しいExcelテンプレートをアップロード"""
+    """新しいExcelテンプレートをアップロード（解析できないテンプレートは 400）"""
     # ファイル形式チェック
     allowed_mime_types = [
         "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  # .xlsx
@@ -64,6 +75,12 @@ async def create_excel_template(
     # ファイル内容を読み込み
     file_content = await file.read()
     
+    # テンプレートを解析（ヘッダー行・社員行・列マップを生成時に毎回探さない）
+    try:
+        template_metadata, column_map = analyze_template(file_content)
+    except TemplateAnalysisError as e:
+        raise HTTPException(status_code=400, detail=f"テンプレートとして使用できません: {e}")
+    
     # 自動バージョニング（アップロード順）
     next_version = get_next_version(current_user.id, db)
     
@@ -76,10 +93,13 @@ async def create_excel_template(
         file_data=file_content,
         file_size=len(file_content),
         mime_type=file.content_type,
-        version=next_version
+        version=next_version,
+        column_map=column_map,
+        template_metadata=template_metadata
     )
     
     db.add(db_template)
+    bump_data_version(db, EXCEL_TEMPLATES, current_user.id)
     db.commit()
     db.refresh(db_template)
     
@@ -125,6 +145,7 @@ async def delete_excel_template(
         raise HTTPException(status_code=404, detail="テンプレートが見つかりません")
     
     db.delete(template)
+    bump_data_version(db, EXCEL_TEMPLATES, current_user.id)
     db.commit()
     
     return {"message": "テンプレートが削除されました"}
\ No newline at end of file
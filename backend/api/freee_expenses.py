@@ -1,54 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List
 import csv
 import io
-import re
 import logging
-from datetime import datetime
-from decimal import Decimal
+import time
 
-from database import get_db
+from database import get_db, get_read_db
+from core.fast_json import list_response
+from core.metrics import observe_import
 from core.security import get_current_user
+from core.tracing import get_tracer
+from services.data_versions import WORK_DATA, bump_data_version
+from services.exports import stream_export
+from services.employee_service import get_owned_record, owned_by_user
+from services.csv_import import (
+    CSVDecodeError, EmployeeResolver, FreeeRowMapper, build_dry_run_report, decode_csv_content
+)
 from models import User, FreeeExpense, Employee, CalculationPeriod
 from schemas import (
     FreeeExpenseCreate, FreeeExpenseUpdate, FreeeExpenseResponse,
-    FreeeExpenseCSVImport, FreeeExpenseImportResponse
+    FreeeExpenseImportResponse
 )
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-
-def extract_employee_number(partner_name: str) -> str:
-    """取引先名から社員番号を抽出"""
-    if not partner_name:
-        return None
-    
-    # ★100吉村芙実 のような形式から100を抽出
-    match = re.match(r'★(\d+)', partner_name)
-    if match:
-        return match.group(1)
-    return None
-
-def parse_csv_date(date_str: str):
-    """CSV日付文字列をdateオブジェクトに変換"""
-    if not date_str or date_str.strip() == "":
-        return None
-    try:
-        return datetime.strptime(date_str, "%Y/%m/%d").date()
-    except ValueError:
-        return None
-
-def parse_csv_decimal(amount_str: str):
-    """CSV金額文字列をDecimalに変換"""
-    if not amount_str or amount_str.strip() == "":
-        return Decimal('0')
-    try:
-        # カンマを除去して数値に変換
-        clean_amount = amount_str.replace(',', '')
-        return Decimal(clean_amount)
-    except (ValueError, TypeError):
-        return Decimal('0')
+_trace = get_tracer(__name__)
 
 @router.get("/", response_model=List[FreeeExpenseResponse])
 def get_freee_expenses(
@@ -56,7 +33,7 @@ def get_freee_expenses(
     employee_id: int = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Freee経費データを取得"""
@@ -69,11 +46,35 @@ def get_freee_expenses(
         query = query.filter(FreeeExpense.employee_id == employee_id)
     
     # ユーザーの社員データのみ取得
-    user_employee_ids = db.query(Employee.id).filter(Employee.user_id == current_user.id).subquery()
-    query = query.filter(FreeeExpense.employee_id.in_(user_employee_ids))
+    query = query.filter(owned_by_user(FreeeExpense, current_user.id))
+    
+    return list_response(query.offset(skip).limit(limit), FreeeExpenseResponse)
+
+@router.get("/export")
+def export_freee_expenses(
+    calculation_period_id: int,
+    format: str = "ndjson",
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Freee経費データを計算期間単位でストリーミング出力（format=ndjson|csv）"""
+    calc_period = db.query(CalculationPeriod).filter(
+        CalculationPeriod.id == calculation_period_id
+    ).first()
+    if not calc_period:
+        raise HTTPException(status_code=404, detail="計算期間が見つかりません")
     
-    expenses = query.offset(skip).limit(limit).all()
-    return expenses
+    user_id = current_user.id
+    
+    def build_query(export_db: Session):
+        return export_db.query(FreeeExpense).filter(
+            FreeeExpense.calculation_period_id == calculation_period_id,
+            owned_by_user(FreeeExpense, user_id)
+        ).order_by(FreeeExpense.id)
+    
+    return stream_export(
+        build_query, FreeeExpense, FreeeExpenseResponse, format, f"freee_expenses_{calc_period.year}_{calc_period.month:02d}"
+    )
 
 @router.get("/{expense_id}", response_model=FreeeExpenseResponse)
 def get_freee_expense(
@@ -82,14 +83,7 @@ def get_freee_expense(
     current_user: User = Depends(get_current_user)
 ):
     """特定のFreee経費データを取得"""
-    expense = db.query(FreeeExpense).filter(FreeeExpense.id == expense_id).first()
-    if not expense:
-        raise HTTPException(status_code=404, detail="経費データが見つかりません")
-    
-    # ユーザーの権限チェック
-    employee = db.query(Employee).filter(Employee.id == expense.employee_id).first()
-    if not employee or employee.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="アクセス権限がありません")
+    expense = get_owned_record(db, FreeeExpense, expense_id, current_user.id, "経費データが見つかりません")
     
     return expense
 
@@ -115,6 +109,7 @@ def create_freee_expense(
     
     db_expense = FreeeExpense(**expense.dict())
     db.add(db_expense)
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
     db.refresh(db_expense)
     return db_expense
@@ -127,19 +122,13 @@ def update_freee_expense(
     current_user: User = Depends(get_current_user)
 ):
     """Freee経費データを更新"""
-    expense = db.query(FreeeExpense).filter(FreeeExpense.id == expense_id).first()
-    if not expense:
-        raise HTTPException(status_code=404, detail="経費データが見つかりません")
-    
-    # ユーザーの権限チェック
-    employee = db.query(Employee).filter(Employee.id == expense.employee_id).first()
-    if not employee or employee.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="アクセス権限がありません")
+    expense = get_owned_record(db, FreeeExpense, expense_id, current_user.id, "経費データが見つかりません")
     
     update_data = expense_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(expense, field, value)
     
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
     db.refresh(expense)
     return expense
@@ -151,16 +140,10 @@ def delete_freee_expense(
     current_user: User = Depends(get_current_user)
 ):
     """Freee経費データを削除"""
-    expense = db.query(FreeeExpense).filter(FreeeExpense.id == expense_id).first()
-    if not expense:
-        raise HTTPException(status_code=404, detail="経費データが見つかりません")
-    
-    # ユーザーの権限チェック
-    employee = db.query(Employee).filter(Employee.id == expense.employee_id).first()
-    if not employee or employee.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="アクセス権限がありません")
+    expense = get_owned_record(db, FreeeExpense, expense_id, current_user.id, "経費データが見つかりません")
     
     db.delete(expense)
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
     return {"message": "経費データを削除しました"}
 
@@ -170,18 +153,15 @@ def delete_all_freee_expenses(
     current_user: User = Depends(get_current_user)
 ):
     """現在のユーザーのFreee経費データを全て削除"""
-    # ユーザーの社員IDを取得
-    user_employee_ids = db.query(Employee.id).filter(Employee.user_id == current_user.id).all()
-    user_employee_ids_list = [emp.id for emp in user_employee_ids]
-    
-    if not user_employee_ids_list:
-        return {"message": "削除する経費データがありません", "deleted_count": 0}
-    
     # ユーザーの経費データを全て削除
     deleted_count = db.query(FreeeExpense).filter(
-        FreeeExpense.employee_id.in_(user_employee_ids_list)
+        owned_by_user(FreeeExpense, current_user.id)
     ).delete(synchronize_session=False)
     
+    if not deleted_count:
+        return {"message": "削除する経費データがありません", "deleted_count": 0}
+    
+    bump_data_version(db, WORK_DATA, current_user.id)
     db.commit()
     logger.info(f"Deleted {deleted_count} Freee expense records for user {current_user.id}")
     return {"message": f"{deleted_count}件の経費データを削除しました", "deleted_count": deleted_count}
@@ -190,13 +170,18 @@ def delete_all_freee_expenses(
 async def import_freee_expenses_csv(
     calculation_period_id: int,
     file: UploadFile = File(...),
+    dry_run: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """FreeeのCSVファイルをインポート"""
+    """FreeeのCSVファイルをインポート
+
+    dry_run=true の場合はDBに書き込まず、行ごとの診断結果を返す
+    """
     
+    import_start = time.perf_counter()
     try:
-        logger.info(f"CSV import started by user {current_user.id} for calculation period {calculation_period_id}")
+        logger.info(f"CSV import started by user {current_user.id} for calculation period {calculation_period_id} (dry_run={dry_run})")
         logger.info(f"File: {file.filename}, size: {file.size}, content_type: {file.content_type}")
         
         # ファイル拡張子チェック
@@ -220,49 +205,26 @@ async def import_freee_expenses_csv(
         content = await file.read()
         logger.info(f"File content size: {len(content)} bytes")
         
-        # ファイルの最初の100バイトを確認
-        sample_bytes = content[:100]
-        logger.info(f"File sample bytes: {sample_bytes}")
-        
-        # BOMの確認と除去
-        if content.startswith(b'\xef\xbb\xbf'):
-            content = content[3:]  # UTF-8 BOMを除去
-            logger.info("Removed UTF-8 BOM")
-        elif content.startswith(b'\xff\xfe'):
-            content = content[2:]  # UTF-16LE BOMを除去
-            logger.info("Removed UTF-16LE BOM")
-        elif content.startswith(b'\xfe\xff'):
-            content = content[2:]  # UTF-16BE BOMを除去
-            logger.info("Removed UTF-16BE BOM")
-        
-        # 複数のエンコーディングを試行
-        content_str = None
-        encodings_to_try = ['utf-8', 'utf-8-sig', 'shift_jis', 'cp932', 'euc-jp', 'iso-2022-jp', 'latin1']
-        
-        for encoding in encodings_to_try:
-            try:
-                content_str = content.decode(encoding)
-                logger.info(f"Successfully decoded as {encoding}")
-                # デコード後の最初の数行をログ出力
-                lines = content_str.split('\n')[:3]
-                logger.info(f"First few lines: {lines}")
-                break
-            except UnicodeDecodeError as e:
-                logger.warning(f"Failed to decode as {encoding}: {str(e)}")
-                continue
-        
-        if content_str is None:
-            logger.error(f"Failed to decode file with all attempted encodings: {encodings_to_try}")
-            # 最後の手段として、エラーを無視してUTF-8でデコード
-            try:
-                content_str = content.decode('utf-8', errors='replace')
-                logger.warning("Decoded with UTF-8 using error replacement")
-            except Exception as e:
-                logger.error(f"Even error-tolerant UTF-8 decoding failed: {str(e)}")
-                raise HTTPException(status_code=400, detail="CSVファイルの文字エンコーディングが不正です")
+        # BOM除去と文字エンコーディングの判定
+        try:
+            content_str, encoding = decode_csv_content(content, replace_on_failure=False)
+        except CSVDecodeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # CSVパース
+        # CSVパース（社員番号は事前に読み込んだ社員一覧から解決）
         csv_reader = csv.DictReader(io.StringIO(content_str))
+        resolver = EmployeeResolver(db, current_user.id, numeric_fallback=FreeeRowMapper.numeric_employee_match)
+        mapper = FreeeRowMapper(calculation_period_id, resolver)
+        
+        if dry_run:
+            report, errors = build_dry_run_report(csv_reader, mapper, encoding)
+            logger.info(f"CSV dry run completed: {report.total_rows} rows, {report.error_rows} errors, {report.unmatched_rows} unmatched")
+            return FreeeExpenseImportResponse(
+                imported_count=0,
+                errors=errors,
+                success=not errors,
+                dry_run_report=report
+            )
         
         imported_count = 0
         errors = []
@@ -271,63 +233,33 @@ async def import_freee_expenses_csv(
         
         for row_num, row in enumerate(csv_reader, start=2):  # ヘッダー行をスキップ
             try:
-                logger.debug(f"Processing row {row_num}: {row}")
-                # 社員番号を抽出
-                partner_name = row.get('取引先', '')
-                employee_number = extract_employee_number(partner_name)
-                
-                # 社員番号から社員IDを取得
-                employee_id = None
-                if employee_number:
-                    employee = db.query(Employee).filter(
-                        Employee.employee_number == employee_number,
-                        Employee.user_id == current_user.id
-                    ).first()
-                    if employee:
-                        employee_id = employee.id
-                
-                # FreeeExpenseオブジェクトを作成
-                freee_expense = FreeeExpense(
-                    calculation_period_id=calculation_period_id,
-                    employee_id=employee_id,
-                    income_expense_type=row.get('収支区分', ''),
-                    management_number=row.get('管理番号', ''),
-                    occurrence_date=parse_csv_date(row.get('発生日', '')),
-                    payment_due_date=parse_csv_date(row.get('支払期日', '')),
-                    partner_name=partner_name,
-                    account_item=row.get('勘定科目', ''),
-                    tax_classification=row.get('税区分', ''),
-                    amount=parse_csv_decimal(row.get('金額', '0')),
-                    tax_calculation_type=row.get('税計算区分', ''),
-                    tax_amount=parse_csv_decimal(row.get('税額', '0')),
-                    notes=row.get('備考', ''),
-                    item_name=row.get('品目', ''),
-                    department=row.get('部門', ''),
-                    memo_tags=row.get('メモタグ（複数指定可、カンマ区切り）', ''),
-                    payment_date=parse_csv_date(row.get('支払日', '')),
-                    payment_account=row.get('支払口座', ''),
-                    payment_amount=parse_csv_decimal(row.get('支払金額', '0')),
-                    employee_number=employee_number,
-                    data_source='freee_csv'
-                )
+                if _trace.enabled:
+                    _trace("csv.row", row_num=row_num, row=row)
                 
-                db.add(freee_expense)
+                values, _ = mapper.map_row(row)
+                db.add(FreeeExpense(**values))
                 imported_count += 1
                 
             except Exception as e:
                 logger.error(f"Error processing row {row_num}: {str(e)}")
                 errors.append(f"行 {row_num}: {str(e)}")
         
+        if resolver.unmatched:
+            logger.warning("社員番号に一致する社員が見つかりませんでした: %s", sorted(resolver.unmatched))
+        
         if errors:
             logger.error(f"CSV import failed with {len(errors)} errors")
             db.rollback()
+            observe_import("freee", "sync", 0, len(errors), time.perf_counter() - import_start, failed=True)
             return FreeeExpenseImportResponse(
                 imported_count=0,
                 errors=errors,
                 success=False
             )
         
+        bump_data_version(db, WORK_DATA, current_user.id)
         db.commit()
+        observe_import("freee", "sync", imported_count, 0, time.perf_counter() - import_start)
         logger.info(f"CSV import completed successfully. Imported {imported_count} records")
         return FreeeExpenseImportResponse(
             imported_count=imported_count,
@@ -335,7 +267,11 @@ async def import_freee_expenses_csv(
             success=True
         )
     
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         logger.error(f"Unexpected error during CSV import: {str(e)}")
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"CSV インポート中にエラーが発生しました: {str(e)}")
\ No newline at end of file
+        observe_import("freee", "sync", 0, 0, time.perf_counter() - import_start, failed=True)
+        raise HTTPException(status_code=500, detail=f"CSV インポート中にエラーが発生しました: {str(e)}")
@@ -0,0 +1,107 @@
+"""
+CSVインポートジョブAPI
+大きなCSVをリクエスト内で同期処理せず、ジョブとして非同期に取り込む
+"""
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List
+import logging
+
+from database import get_db
+from core.config import settings
+from core.security import get_current_user
+from models import User, CalculationPeriod, ImportJob
+from schemas import ImportJobResponse
+from services.csv_import import IMPORT_MAPPERS
+from services.import_jobs import (
+    create_import_job, rows_per_second, spool_upload, submit_import_job
+)
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def to_import_job_response(job: ImportJob) -> ImportJobResponse:
+    """ImportJobをレスポンスに変換（スループットを付与）"""
+    return ImportJobResponse(
+        id=job.id,
+        source=job.source,
+        status=job.status,
+        calculation_period_id=job.calculation_period_id,
+        file_name=job.file_name,
+        file_size=job.file_size,
+        encoding=job.encoding,
+        rows_parsed=job.rows_parsed or 0,
+        rows_inserted=job.rows_inserted or 0,
+        error_count=job.error_count or 0,
+        errors=job.errors or [],
+        checkpoint_row=job.checkpoint_row or 0,
+        rows_per_second=rows_per_second(job),
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        created_at=job.created_at
+    )
+
+@router.post("/{source}", response_model=ImportJobResponse, status_code=202)
+async def start_import_job(
+    source: str,
+    calculation_period_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """CSVファイルを一時保存し、インポートジョブを開始（source: freee, kincone, attendance）"""
+    if source not in IMPORT_MAPPERS:
+        raise HTTPException(status_code=404, detail=f"未対応のインポート種別です: {source}")
+    
+    if file.size == 0:
+        raise HTTPException(status_code=400, detail="CSVファイルが空です")
+    
+    # 計算期間の存在確認
+    calc_period = db.query(CalculationPeriod).filter(
+        CalculationPeriod.id == calculation_period_id
+    ).first()
+    if not calc_period:
+        raise HTTPException(status_code=404, detail="計算期間が見つかりません")
+    
+    spool_path = await spool_upload(file)
+    job = create_import_job(db, current_user.id, source, calculation_period_id, file.filename, spool_path)
+    submit_import_job(job.id)
+    
+    logger.info(f"Import job {job.id} queued: source={source}, file={file.filename}, size={job.file_size}")
+    return to_import_job_response(job)
+
+@router.get("/", response_model=List[ImportJobResponse])
+def get_import_jobs(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """現在のユーザーのインポートジョブ一覧を取得（新しい順）"""
+    jobs = db.query(ImportJob).filter(
+        ImportJob.user_id == current_user.id
+    ).order_by(ImportJob.id.desc()).limit(limit).all()
+    return [to_import_job_response(job) for job in jobs]
+
+@router.get("/{job_id}", response_model=ImportJobResponse)
+def get_import_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """インポートジョブの進捗を取得"""
+    job = db.query(ImportJob).filter(
+        ImportJob.id == job_id,
+        ImportJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="インポートジョブが見つかりません")
+    
+    # ハートビートが途絶えた実行中ジョブはチェックポイントから再開する
+    if job.status == "running" and job.heartbeat_at:
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.IMPORT_JOB_STALE_SECONDS)
+        if job.heartbeat_at < stale_before:
+            logger.warning(f"Import job {job.id} looks stale, resubmitting")
+            submit_import_job(job.id)
+    
+    return to_import_job_response(job)
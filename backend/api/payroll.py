@@ -2,24 +2,31 @@
 給与計算API
 Firebase Cloud Functionsからの移行版
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
-import os
+from datetime import datetime
 
-from database import get_db
-from core.security import get_current_user
+from database import get_db, get_read_db
+from core.config import settings
+from core.security import get_current_user, is_admin_user
 from models import User
 from schemas import (
     PayrollGenerationRequest, 
     PayrollGenerationResponse,
     WorkDataSummary
 )
+from services.artifact_store import get_artifact_store, validate_file_name
+from services.data_versions import ALL_USERS, WORK_DATA, not_modified_response
+from services.generated_files import find_generated_file
 from services.payroll_service import PayrollService
+from services.profiling import PhaseProfiler, ProfilerBusyError
 
 router = APIRouter()
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 @router.post("/generate", response_model=PayrollGenerationResponse)
 async def generate_payroll_excel(
     request: PayrollGenerationRequest,
@@ -30,12 +37,31 @@ async def generate_payroll_excel(
     給与計算Excelファイルを生成
     
     Firebase Cloud Functionsのgenerate_payroll関数を移行
+    
+    profile=true でフェーズ別の処理時間・メモリ確保ピークを返す。
+    profile_dump=true（管理者のみ）で cProfile を PROFILE_OUTPUT_DIR に書き出す
+    （プロファイル付きの実行は同時に1つのみ。実行中は 409）
+    計算結果は SalaryCalculation に保存され、/salary-calculations から参照できる
+    同じ入力で生成済みのファイルがあればそれを返す（reused=true）。force=true で生成し直す
     """
+    if request.profile_dump and not is_admin_user(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="プロファイルの出力は管理者のみ実行できます"
+        )
+    
     try:
+        profiler = PhaseProfiler(
+            enabled=request.profile,
+            cprofile_dir=settings.PROFILE_OUTPUT_DIR if request.profile_dump else None
+        )
         payroll_service = PayrollService(db)
         result = payroll_service.generate_payroll_excel(
             calculation_period_id=request.calculation_period_id,
-            template_id=request.template_id
+            template_id=request.template_id,
+            profiler=profiler,
+            user_id=current_user.id,
+            force=request.force
         )
         
         if result.status == "error":
@@ -44,8 +70,12 @@ async def generate_payroll_excel(
                 detail=f"給与計算Excel生成に失敗しました: {', '.join(result.messages)}"
             )
         
+        # 生成時に保存した給与計算結果・生成ファイルの記録を確定
+        db.commit()
         return result
         
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -55,15 +85,23 @@ async def generate_payroll_excel(
 @router.get("/work-data-summary/{calculation_period_id}", response_model=List[WorkDataSummary])
 async def get_work_data_summary(
     calculation_period_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     指定した計算期間の勤務データサマリを取得
+    
+    勤怠・経費・交通費・社員・期間ロックに変更がなければ 304 を返す
     """
+    not_modified = not_modified_response(request, response, db, (WORK_DATA, ALL_USERS))
+    if not_modified:
+        return not_modified
+    
     try:
         payroll_service = PayrollService(db)
-        summaries = payroll_service._get_work_data_summaries(calculation_period_id)
+        summaries = payroll_service.get_work_data_summaries(calculation_period_id)
         
         return summaries
         
@@ -74,38 +112,51 @@ async def get_work_data_summary(
         )
 
 @router.get("/download/{file_name}")
-async def download_payroll_file(
+def download_payroll_file(
     file_name: str,
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     生成された給与計算Excelファイルをダウンロード
+    
+    ローカル保存ではファイルのパスを FileResponse で返す（ASGIサーバーが http.response.pathsend に
+    対応していればゼロコピーで送信される）。S3互換ストレージはチャンクでストリーミングする。
     """
+    # セキュリティチェック: ファイル名の検証（ファイルシステム・DBを参照する前に行う）
+    try:
+        validate_file_name(file_name)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不正なファイル名です"
+        )
+    
     try:
-        # ファイルパスの構築
-        current_dir = os.path.dirname(os.path.dirname(__file__))  # backend/
-        project_root = os.path.dirname(current_dir)  # プロジェクトルート
-        file_path = os.path.join(project_root, "output_files", file_name)
+        store = get_artifact_store()
+        generated_file = find_generated_file(db, file_name)
+        if generated_file is not None:
+            key = generated_file.storage_key if generated_file.storage_backend == store.backend else None
+        else:
+            # generated_files 導入前に output_files 直下へ保存されたファイル
+            key = file_name
         
         # ファイル存在確認
-        if not os.path.exists(file_path):
+        if key is None or not store.exists(key):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="ファイルが見つかりません"
             )
         
-        # セキュリティチェック: ファイル名の検証
-        if not file_name.endswith('.xlsx') or '..' in file_name or '/' in file_name:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="不正なファイル名です"
-            )
+        if generated_file is not None:
+            generated_file.last_downloaded_at = datetime.utcnow()
+            db.commit()
         
-        return FileResponse(
-            path=file_path,
-            filename=file_name,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        headers = {"Content-Disposition": f"attachment; filename={file_name}"}
+        file_path = store.local_path(key)
+        if file_path:
+            return FileResponse(path=file_path, filename=file_name, media_type=XLSX_MEDIA_TYPE)
+        return StreamingResponse(store.open_stream(key), media_type=XLSX_MEDIA_TYPE, headers=headers)
         
     except HTTPException:
         raise
@@ -113,4 +164,4 @@ async def download_payroll_file(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"ファイルダウンロード中にエラーが発生しました: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,89 @@
+"""
+給与計算結果API
+
+Excel生成時に保存した SalaryCalculation を一覧・期間合計・社員ごとの履歴として返す
+（ワークブックを再生成・解析せずに SQL の集計で取得する）
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from typing import List
+
+from database import get_read_db
+from core.fast_json import list_response
+from core.security import get_current_user
+from models import User, SalaryCalculation
+from schemas import SalaryCalculationResponse, SalaryHistoryEntry, SalaryPeriodTotals
+from services.data_versions import EMPLOYEES, GLOBAL_SCOPE, SALARY_CALCULATIONS, not_modified_response
+from services.employee_directory import get_employee_directory
+from services.employee_service import owned_by_user
+from services.salary_ledger import employee_history, period_totals
+
+router = APIRouter()
+
+@router.get("/salary-calculations", response_model=List[SalaryCalculationResponse])
+def get_salary_calculations(
+    request: Request,
+    response: Response,
+    calculation_period_id: int = None,
+    employee_id: int = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """給与計算結果を取得（変更がなければ 304）"""
+    not_modified = not_modified_response(
+        request, response, db, (SALARY_CALCULATIONS, GLOBAL_SCOPE), (EMPLOYEES, current_user.id)
+    )
+    if not_modified:
+        return not_modified
+
+    query = db.query(SalaryCalculation)
+
+    if calculation_period_id:
+        query = query.filter(SalaryCalculation.calculation_period_id == calculation_period_id)
+
+    if employee_id:
+        query = query.filter(SalaryCalculation.employee_id == employee_id)
+
+    # ユーザーの社員データのみ取得
+    query = query.filter(owned_by_user(SalaryCalculation, current_user.id)).order_by(SalaryCalculation.id)
+
+    return list_response(query.offset(skip).limit(limit), SalaryCalculationResponse, headers=response.headers)
+
+@router.get("/salary-calculations/totals", response_model=List[SalaryPeriodTotals])
+def get_salary_period_totals(
+    request: Request,
+    response: Response,
+    calculation_period_id: int = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """計算期間ごとの合計（calculation_period_id 指定時はその期間のみ）"""
+    not_modified = not_modified_response(
+        request, response, db, (SALARY_CALCULATIONS, GLOBAL_SCOPE), (EMPLOYEES, current_user.id)
+    )
+    if not_modified:
+        return not_modified
+
+    return period_totals(db, current_user.id, calculation_period_id)
+
+@router.get("/salary-calculations/employees/{employee_id}/history", response_model=List[SalaryHistoryEntry])
+def get_salary_history(
+    employee_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """社員の給与計算結果を計算期間の古い順に取得"""
+    if employee_id not in get_employee_directory(db, current_user.id).ids:
+        raise HTTPException(status_code=404, detail="社員が見つかりません")
+
+    not_modified = not_modified_response(
+        request, response, db, (SALARY_CALCULATIONS, GLOBAL_SCOPE), (EMPLOYEES, current_user.id)
+    )
+    if not_modified:
+        return not_modified
+
+    return employee_history(db, employee_id)
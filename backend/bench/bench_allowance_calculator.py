@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+給与計算Excelの書き込みフェーズの時間（社員数ごと）
+
+N 人分の社員番号を持つテンプレート（A列）とランダムな勤務データサマリを作り、
+以下の2方式でワークシートに書き込む時間を比較する。
+    scalar    社員ごとに pandas でテンプレートの行を検索し、f-string の数式を1セルずつ書き込む
+              （従来の _generate_payroll_excel の書き込みフェーズと同じ処理）
+    numpy     社員番号 → 行番号の dict を1回作り、AllowanceCalculator で列単位に計算して列ごとに書き込む
+              （PayrollService._write_work_data_to_excel、列は従来の列位置）
+書き込まれたセルが両方式で一致することも確認する。
+
+使い方:
+    python bench/bench_allowance_calculator.py [--rows 100,1000,5000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import List
+
+# backend/ をパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from openpyxl import Workbook
+
+from schemas import WorkDataSummary
+from services.allowance_calculator import AllowanceCalculator
+from services.payroll_service import PayrollService
+from services.template_layout import LEGACY_COLUMN_MAP
+
+COUNT_FIELDS = (
+    "working_days", "absence_days", "remote_count", "lunch_count", "office_count", "event_count",
+    "trip_night_before_count", "trip_count", "travel_onday_count", "travel_holidays_count",
+    "special_holiday", "special_holiday_without_pay", "kiwi_points", "freee_expenses", "kincone_expenses",
+)
+
+
+def make_summaries(rows: int) -> List[WorkDataSummary]:
+    rng = random.Random(rows)
+    summaries = []
+    for index in range(rows):
+        values = {name: (None if rng.random() < 0.1 else rng.randint(0, 20)) for name in COUNT_FIELDS}
+        summaries.append(WorkDataSummary(
+            employee_id=index,
+            employee_number=f"{index:03d}",
+            employee_name=f"社員{index}",
+            total_work_hours="160:00",
+            paid_leave_days=1.0,
+            no_remote_allowance_limit=rng.random() < 0.2,
+            **values
+        ))
+    return summaries
+
+
+def make_template(rows: int) -> pd.DataFrame:
+    """pd.read_excel(header=4) で読んだテンプレートと同じ形（1行目は説明行）"""
+    return pd.DataFrame({"社員No": ["給与計算に必要な項目"] + [f"{index:03d}" for index in range(rows)]})
+
+
+def scalar_cells(work_data: WorkDataSummary) -> dict:
+    """従来の _write_work_data_to_excel と同じ規則（比較用）"""
+    cells = {}
+    for column, name in (("E", "working_days"), ("F", "total_work_hours"), ("G", "paid_leave_days"),
+                         ("N", "statutory_holiday_hours"), ("O", "night_working_hours"), ("P", "absence_days"),
+                         ("AK", "kiwi_points"), ("AT", "freee_expenses"), ("AU", "kincone_expenses")):
+        if getattr(work_data, name) is not None:
+            cells[column] = getattr(work_data, name)
+    if work_data.remote_count is not None:
+        remote_count = work_data.remote_count
+        if remote_count >= 10 and not work_data.no_remote_allowance_limit:
+            remote_count = 10
+        cells["X"] = remote_count
+    if work_data.lunch_count is not None:
+        cells["AG"] = f"=500*{min(work_data.lunch_count, 10)}"
+    if work_data.office_count is not None:
+        cells["AP"] = work_data.office_count
+        cells["AF"] = f"=2000*{min(work_data.office_count, 10)}"
+    if work_data.event_count is not None:
+        cells["AH"] = f"=3000*{work_data.event_count}"
+    if all(x is not None for x in [
+        work_data.trip_night_before_count, work_data.trip_count,
+        work_data.travel_onday_count, work_data.travel_holidays_count
+    ]):
+        cells["AR"] = (
+            f"=2000*{work_data.trip_night_before_count}+2000*{work_data.trip_count}+"
+            f"2000*{work_data.travel_onday_count}+1000*{work_data.travel_holidays_count}"
+        )
+    if work_data.special_holiday is not None:
+        cells["H"] = f"=H2+{work_data.special_holiday}"
+    if work_data.special_holiday_without_pay is not None:
+        cells["I"] = f"=I2+{work_data.special_holiday_without_pay}"
+    return cells
+
+
+def run_scalar(summaries, template_df):
+    ws = Workbook().active
+    employee_numbers = template_df.iloc[:, 0].astype(str)
+    for work_data in summaries:
+        matching_row_index = template_df[employee_numbers == str(work_data.employee_number)].index
+        if not matching_row_index.empty:
+            row = matching_row_index[0] + 5 + 1
+            for column, value in scalar_cells(work_data).items():
+                ws[f"{column}{row}"] = value
+    return ws
+
+
+def run_numpy(summaries, template_df):
+    ws = Workbook().active
+    employee_rows = {}
+    for row_index, employee_number in zip(template_df.index, template_df.iloc[:, 0].astype(str)):
+        employee_rows.setdefault(employee_number, row_index + 5 + 1)
+    rows = [employee_rows.get(str(work_data.employee_number)) for work_data in summaries]
+    PayrollService(None)._write_work_data_to_excel(ws, rows, AllowanceCalculator(summaries), LEGACY_COLUMN_MAP)
+    return ws
+
+
+def sheet_values(ws) -> dict:
+    return {cell.coordinate: cell.value for row in ws.iter_rows() for cell in row if cell.value is not None}
+
+
+def measure(func, summaries, template_df, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(summaries, template_df)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100,1000,5000", help="社員数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'社員数':>8} {'scalar':>10} {'numpy':>10}")
+    for rows in (int(value) for value in args.rows.split(",")):
+        summaries = make_summaries(rows)
+        template_df = make_template(rows)
+        if sheet_values(run_scalar(summaries, template_df)) != sheet_values(run_numpy(summaries, template_df)):
+            print(f"NG {rows} 件: 書き込まれたセルが一致しません")
+            sys.exit(1)
+        scalar = measure(run_scalar, summaries, template_df, args.repeat)
+        vectorised = measure(run_numpy, summaries, template_df, args.repeat)
+        print(f"{rows:>8} {scalar * 1000:>8.1f}ms {vectorised * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
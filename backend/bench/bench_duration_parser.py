@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+時間文字列パーサーのマイクロベンチマーク
+
+サンプル勤怠CSV（sample_datafiles/attendance_*.csv）の時間列のセルを
+指定件数（デフォルト100万セル）まで繰り返し、旧実装と共通パーサーを比較する。
+
+使い方:
+    python bench/bench_duration_parser.py [--cells 1000000] [--csv path/to/attendance.csv]
+"""
+import argparse
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from datetime import timedelta
+from itertools import islice, cycle
+
+# backend/ をパスに追加
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from services import duration_parser
+from services.duration_parser import parse_duration_hours, parse_duration_timedelta
+
+SAMPLE_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "sample_datafiles")
+
+
+def legacy_parse_csv_time_to_timedelta(time_str: str):
+    """旧 attendance_records.parse_csv_time_to_timedelta（比較用）"""
+    if not time_str or time_str.strip() == "" or time_str == "-":
+        return None
+    try:
+        if ':' in time_str:
+            hours, minutes = time_str.split(':')
+            return timedelta(hours=int(hours), minutes=int(minutes))
+        return timedelta(hours=float(time_str))
+    except (ValueError, TypeError):
+        return None
+
+
+def legacy_parse_interval_string_to_hours(interval_str: str) -> float:
+    """旧 PayrollService._parse_interval_string_to_hours（ログ出力除く、比較用）"""
+    if not interval_str:
+        return 0.0
+    try:
+        if ':' in interval_str:
+            parts = interval_str.split(':')
+            hours = int(parts[0])
+            minutes = int(parts[1]) if len(parts) > 1 else 0
+            seconds = int(parts[2]) if len(parts) > 2 else 0
+            return hours + minutes / 60 + seconds / 3600
+        hours_match = re.search(r'(\d+)\s*(?:hours?|hrs?|h)', interval_str, re.IGNORECASE)
+        minutes_match = re.search(r'(\d+)\s*(?:minutes?|mins?|m)', interval_str, re.IGNORECASE)
+        seconds_match = re.search(r'(\d+)\s*(?:seconds?|secs?|s)', interval_str, re.IGNORECASE)
+        hours = int(hours_match.group(1)) if hours_match else 0
+        minutes = int(minutes_match.group(1)) if minutes_match else 0
+        seconds = int(seconds_match.group(1)) if seconds_match else 0
+        return hours + minutes / 60 + seconds / 3600
+    except (ValueError, IndexError, AttributeError):
+        return 0.0
+
+
+def load_time_cells(csv_path: str) -> list:
+    """勤怠CSVから時間形式（HH:MM）の列のセルを取り出す"""
+    with open(csv_path, encoding="cp932", newline="") as f:
+        rows = list(csv.reader(f))
+    header, data = rows[0], rows[1:]
+    time_columns = [
+        index for index in range(len(header))
+        if data and ':' in data[0][index]
+    ]
+    return [row[index] for row in data for index in time_columns]
+
+
+def run(label: str, func, values) -> float:
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:7.3f} s  ({elapsed / len(values) * 1e9:6.0f} ns/cell)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=1_000_000, help="計測するセル数")
+    parser.add_argument("--csv", default=None, help="勤怠CSVのパス（cp932）")
+    args = parser.parse_args()
+
+    csv_path = args.csv or sorted(glob.glob(os.path.join(SAMPLE_DIR, "attendance_*.csv")))[0]
+    cells = load_time_cells(csv_path)
+    values = list(islice(cycle(cells), args.cells))
+    print(f"入力: {csv_path}")
+    print(f"時間セル {len(cells):,} 件（ユニーク {len(set(cells)):,} 件）を {len(values):,} セルに拡張\n")
+
+    legacy_td = run("旧 parse_csv_time_to_timedelta", legacy_parse_csv_time_to_timedelta, values)
+    legacy_hours = run("旧 _parse_interval_string_to_hours", legacy_parse_interval_string_to_hours, values)
+
+    duration_parser.parse_duration_seconds.cache_clear()
+    new_td = run("parse_duration_timedelta", parse_duration_timedelta, values)
+    new_hours = run("parse_duration_hours", parse_duration_hours, values)
+
+    info = duration_parser.parse_duration_seconds.cache_info()
+    print(f"\nキャッシュ: hits={info.hits:,} misses={info.misses:,} size={info.currsize}/{info.maxsize}")
+    print(f"timedelta変換: {legacy_td / new_td:.1f}倍, 時間変換: {legacy_hours / new_hours:.1f}倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+APIプロセスの import 時間（コールドスタート）の計測
+
+python -X importtime -c "import main" を別プロセスで repeat 回実行し、
+main の累積 import 時間の最小値と、時間のかかっているモジュールを表示する。
+以下のどちらかに当てはまると終了コード 1 で終わるため、CIでの予算チェックに使える。
+    - main の import 時間が --budget-ms を超えた
+    - 起動時に読み込んではいけないモジュール（pandas, openpyxl, numpy）が読み込まれた
+
+使い方:
+    python bench/bench_import_time.py [--repeat 5] [--budget-ms 2000] [--top 15]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Excel生成時にだけ読み込むモジュール
+LAZY_MODULES = ("pandas", "openpyxl", "numpy")
+
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def run_importtime(target: str) -> List[Tuple[int, int, int, str]]:
+    """(self μs, 累積 μs, 深さ, モジュール名) のリストを返す"""
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///:memory:")
+    env.setdefault("READ_DATABASE_URL", "")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} に失敗しました:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="main", help="計測するモジュール")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=2000, help="import 時間の上限（ミリ秒）")
+    parser.add_argument("--top", type=int, default=15, help="表示するモジュール数")
+    args = parser.parse_args()
+
+    best_total = None
+    best_entries = None
+    for _ in range(args.repeat):
+        entries = run_importtime(args.target)
+        total = next(cumulative for _, cumulative, depth, name in reversed(entries)
+                     if depth == 0 and name == args.target)
+        if best_total is None or total < best_total:
+            best_total, best_entries = total, entries
+
+    # 直接 import しているモジュール（深さ1）ごとの累積時間
+    direct: Dict[str, int] = {}
+    for _, cumulative, depth, name in best_entries:
+        if depth == 1:
+            direct[name] = cumulative
+    print(f"import {args.target}: {best_total / 1000:.1f} ms（{args.repeat}回中の最小）\n")
+    print(f"{'モジュール':<40} {'累積':>10}")
+    for name, cumulative in sorted(direct.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>8.1f}ms")
+
+    failures = []
+    loaded_lazy = sorted({name.split(".")[0] for _, _, _, name in best_entries} & set(LAZY_MODULES))
+    if loaded_lazy:
+        failures.append(f"起動時に読み込まれています: {', '.join(loaded_lazy)}")
+    if best_total / 1000 > args.budget_ms:
+        failures.append(f"予算超過: {best_total / 1000:.1f} ms > {args.budget_ms:.0f} ms")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"NG {failure}")
+        sys.exit(1)
+    print(f"OK 予算 {args.budget_ms:.0f} ms 以内")
+
+
+if __name__ == "__main__":
+    main()
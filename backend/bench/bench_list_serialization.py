@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+一覧レスポンスのシリアライズ時間（行数ごと）
+
+勤怠データ（raw_data のJSON列を含む）とFreee経費を N 行投入し、以下の3方式で
+クエリ実行からJSONバイト列ができるまでの時間を比較する。
+    legacy    ORM全列取得 → pydantic（from_attributes）で1行ずつ検証 → jsonable_encoder → json.dumps
+              （response_model 経由の従来の処理と同じ流れ）
+    validate  core.fast_json.list_response(validate=True)  列の射影 + TypeAdapter で一括検証
+    fast      core.fast_json.list_response()               列の射影 + orjson（検証なし）
+
+使い方:
+    python bench/bench_list_serialization.py [--rows 1000,10000,50000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List
+
+# backend/ をパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from core.fast_json import list_response, orjson
+from schemas import AttendanceRecordResponse, FreeeExpenseResponse
+
+RAW_DATA_KEYS = 40  # 勤怠CSVの列数に近い値
+
+
+def populate(session, rows: int, rng: random.Random) -> None:
+    period = models.CalculationPeriod(year=2024, month=11, period_name="2024年11月", status="draft")
+    session.add(period)
+    session.flush()
+
+    attendance = []
+    expenses = []
+    for i in range(rows):
+        number = str(1000 + i)
+        attendance.append(dict(
+            calculation_period_id=period.id,
+            employee_number=number,
+            employee_name=f"社員{number}",
+            period_start=date(2024, 10, 16),
+            period_end=date(2024, 11, 15),
+            work_days=rng.randint(15, 22),
+            total_work_time=f"{rng.randint(120, 200)}:{rng.randint(0, 59):02d}",
+            overtime_work_time=f"{rng.randint(0, 40)}:{rng.randint(0, 59):02d}",
+            paid_leave_used=Decimal(rng.randint(0, 3)),
+            raw_data={f"列{k}": f"{rng.random():.6f}" for k in range(RAW_DATA_KEYS)},
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        ))
+        expenses.append(dict(
+            calculation_period_id=period.id,
+            income_expense_type="支出",
+            occurrence_date=date(2024, 11, rng.randint(1, 30)),
+            partner_name=f"★{number}社員{number}",
+            account_item="旅費交通費",
+            tax_classification="課対仕入10%",
+            amount=Decimal(rng.randint(100, 30000)),
+            tax_calculation_type="内税",
+            tax_amount=Decimal(rng.randint(10, 3000)),
+            employee_number=number,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        ))
+    session.bulk_insert_mappings(models.AttendanceRecord, attendance)
+    session.bulk_insert_mappings(models.FreeeExpense, expenses)
+    session.commit()
+
+
+def legacy(session, model, schema) -> bytes:
+    adapter = TypeAdapter(List[schema])
+    items = adapter.validate_python(session.query(model).all(), from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(items, mode="json"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast(session, model, schema, validate: bool = False) -> bytes:
+    return list_response(session.query(model), schema, validate=validate).body
+
+
+def timed(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000", help="行数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"orjson: {'あり' if orjson is not None else 'なし（pydantic の dump_json を使用）'}\n")
+    print(f"{'テーブル':<20} {'行数':>7} {'legacy':>10} {'validate':>10} {'fast':>10} {'倍率':>6}")
+
+    for rows in (int(value) for value in args.rows.split(",")):
+        engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            populate(session, rows, random.Random(rows))
+            for model, schema in (
+                (models.AttendanceRecord, AttendanceRecordResponse),
+                (models.FreeeExpense, FreeeExpenseResponse),
+            ):
+                results = {
+                    "legacy": timed(lambda: legacy(session, model, schema), args.repeat),
+                    "validate": timed(lambda: fast(session, model, schema, validate=True), args.repeat),
+                    "fast": timed(lambda: fast(session, model, schema), args.repeat),
+                }
+                # 出力内容が一致することを確認
+                assert json.loads(legacy(session, model, schema)) == json.loads(fast(session, model, schema))
+                print(f"{model.__tablename__:<20} {rows:>7} "
+                      f"{results['legacy'] * 1000:>8.1f}ms {results['validate'] * 1000:>8.1f}ms "
+                      f"{results['fast'] * 1000:>8.1f}ms {results['legacy'] / results['fast']:>5.1f}x")
+        finally:
+            session.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
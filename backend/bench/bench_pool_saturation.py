@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+コネクションプールの飽和負荷テスト
+
+同時実行数を段階的に増やし、各ワーカーが接続を一定時間保持するクエリを繰り返す。
+プール上限（pool_size + max_overflow）を超えると取得待ち時間が伸び、
+pool_timeout を超えたリクエストはタイムアウトになる様子を確認できる。
+
+使い方:
+    python bench/bench_pool_saturation.py [--url postgresql://...] [--pool-size 5] [--max-overflow 10]
+        [--timeout 2] [--hold-ms 50] [--requests 20] [--concurrency 5,15,30,60]
+
+--url 未指定時は一時ディレクトリの SQLite ファイルを使う。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# backend/ をパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import create_db_engine, pool_stats
+
+
+def worker(engine, requests: int, hold_seconds: float, peak: dict, lock: threading.Lock) -> int:
+    """接続を取得して hold_seconds 保持する処理を requests 回繰り返す（タイムアウト数を返す）"""
+    timeouts = 0
+    for _ in range(requests):
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                stats = pool_stats(engine)
+                with lock:
+                    peak["checked_out"] = max(peak["checked_out"], stats["checked_out"])
+                    peak["overflow"] = max(peak["overflow"], stats["overflow"])
+                time.sleep(hold_seconds)
+        except PoolTimeoutError:
+            timeouts += 1
+    return timeouts
+
+
+def run_level(engine, concurrency: int, requests: int, hold_seconds: float) -> dict:
+    engine.pool.wait_stats.reset()
+    peak = {"checked_out": 0, "overflow": 0}
+    lock = threading.Lock()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(worker, engine, requests, hold_seconds, peak, lock)
+            for _ in range(concurrency)
+        ]
+        timeouts = sum(future.result() for future in futures)
+    elapsed = time.perf_counter() - start
+
+    stats = pool_stats(engine)
+    total = concurrency * requests
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput": (total - timeouts) / elapsed,
+        "peak_checked_out": peak["checked_out"],
+        "peak_overflow": peak["overflow"],
+        "wait_avg_ms": stats["wait_seconds_avg"] * 1000,
+        "wait_max_ms": stats["wait_seconds_max"] * 1000,
+        "timeouts": timeouts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="接続先（未指定時はSQLiteファイル）")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=2.0, help="pool_timeout（秒）")
+    parser.add_argument("--hold-ms", type=float, default=50.0, help="1リクエストあたりの接続保持時間")
+    parser.add_argument("--requests", type=int, default=20, help="ワーカーあたりのリクエスト数")
+    parser.add_argument("--concurrency", default="5,15,30,60", help="同時実行数（カンマ区切り）")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool_bench.db')}"
+    engine = create_db_engine(
+        url,
+        pool_size=args.pool_size,
+        max_overflow=args.max_overflow,
+        pool_timeout=args.timeout,
+    )
+    capacity = args.pool_size + args.max_overflow
+    print(f"接続先: {engine.url.render_as_string(hide_password=True)}")
+    print(f"pool_size={args.pool_size} max_overflow={args.max_overflow} (上限 {capacity}) "
+          f"timeout={args.timeout}s hold={args.hold_ms}ms\n")
+    print(f"{'同時実行':>8} {'件数':>6} {'req/s':>8} {'最大使用':>8} {'最大overflow':>12} "
+          f"{'平均待ち(ms)':>12} {'最大待ち(ms)':>12} {'timeout':>8}")
+
+    for concurrency in (int(value) for value in args.concurrency.split(",")):
+        result = run_level(engine, concurrency, args.requests, args.hold_ms / 1000)
+        marker = "  ← 飽和" if concurrency > capacity else ""
+        print(f"{result['concurrency']:>8} {result['requests']:>6} {result['throughput']:>8.1f} "
+              f"{result['peak_checked_out']:>8} {result['peak_overflow']:>12} "
+              f"{result['wait_avg_ms']:>12.1f} {result['wait_max_ms']:>12.1f} {result['timeouts']:>8}{marker}")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
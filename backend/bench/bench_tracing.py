@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+時間変換ホットパスのログ出力コストを比較するマイクロベンチマーク
+
+旧実装（呼び出しごとの logger.info f文字列）と、トレース無効／有効（サンプリング）時の
+PayrollService._timedelta_to_hours を同じ入力で計測する。
+
+使い方:
+    python bench/bench_tracing.py [--count 200000]
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import time
+
+# backend/ をパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.tracing import set_trace_enabled
+from services.payroll_service import PayrollService
+
+legacy_logger = logging.getLogger("bench.legacy")
+
+
+def legacy_timedelta_to_hours(td) -> float:
+    """ログ出力を含む旧実装（比較用）"""
+    if not td:
+        return 0.0
+    legacy_logger.info(f"時間変換処理: {td} (型: {type(td)})")
+    if isinstance(td, str):
+        legacy_logger.info(f"INTERVAL文字列解析開始: '{td}'")
+        parts = td.split(':')
+        hours = int(parts[0])
+        minutes = int(parts[1]) if len(parts) > 1 else 0
+        seconds = int(parts[2]) if len(parts) > 2 else 0
+        result = hours + minutes / 60 + seconds / 3600
+        legacy_logger.info(f"HH:MM:SS形式解析: {hours}h {minutes}m {seconds}s → {result}時間")
+        legacy_logger.info(f"文字列から時間変換: '{td}' → {result}時間")
+        return result
+    if isinstance(td, datetime.timedelta):
+        hours = td.total_seconds() / 3600
+        legacy_logger.info(f"timedeltaから時間変換: {td} → {hours}時間")
+        return hours
+    return 0.0
+
+
+def run(label: str, func, values) -> float:
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:9.1f} ms  ({elapsed / len(values) * 1e9:7.0f} ns/call)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200_000, help="変換する値の数")
+    args = parser.parse_args()
+
+    # 本番同様にハンドラへ出力させる（出力先は /dev/null）
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=open(os.devnull, "w"),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    samples = ["144:57", "00:00", "142:02:00", "17:43", datetime.timedelta(hours=8, minutes=30)]
+    values = [samples[i % len(samples)] for i in range(args.count)]
+    service = PayrollService(db=None)
+
+    print(f"入力: {args.count:,} 件")
+    legacy = run("旧実装 (INFOログ)", legacy_timedelta_to_hours, values)
+
+    set_trace_enabled("services.payroll_service", False)
+    disabled = run("トレース無効", service._timedelta_to_hours, values)
+
+    set_trace_enabled("services.payroll_service", True, sample_rate=0.01)
+    sampled = run("トレース有効 (1%サンプリング)", service._timedelta_to_hours, values)
+
+    set_trace_enabled("services.payroll_service", True, sample_rate=1.0)
+    full = run("トレース有効 (全件)", service._timedelta_to_hours, values)
+
+    print(f"\n旧実装比: 無効 {legacy / disabled:.1f}倍高速, 1%サンプリング {legacy / sampled:.1f}倍高速, 全件 {legacy / full:.1f}倍")
+
+
+if __name__ == "__main__":
+    main()
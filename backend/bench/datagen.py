@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク用の合成データ生成
+
+sample_datafiles の実データ（勤怠・Kincone交通費・Freee経費CSV、給与テンプレートxlsx）を雛形に、
+指定人数分の社員データを生成する。値は実データの行から無作為に選ぶため、分布は実データに近い。
+
+出力（<out>/<人数>/ 以下）:
+    employees.csv   社員番号・氏名（UTF-8）
+    attendance.csv  勤怠CSV（cp932）
+    kincone.csv     Kincone交通費CSV（cp932）
+    freee.csv       Freee経費CSV（cp932、1人あたり平均2件）
+    template.xlsx   社員番号をA列7行目以降に並べた給与テンプレート
+
+使い方:
+    python bench/datagen.py [--sizes 100,1000,10000,50000] [--out bench/data] [--encoding cp932] [--seed 42]
+"""
+import argparse
+import csv
+import glob
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from openpyxl import load_workbook
+from openpyxl.formula.translate import Translator
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "sample_datafiles")
+DEFAULT_OUT_DIR = os.path.join(BACKEND_DIR, "bench", "data")
+
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+
+# 社員番号の開始値（テンプレートA列の数値と文字列表現が一致するよう先頭ゼロを避ける）
+EMPLOYEE_NUMBER_START = 1000
+
+# テンプレートの構造（ヘッダーは5行目、社員行は7行目から。8行目を数式の雛形として使う）
+TEMPLATE_FIRST_ROW = 7
+TEMPLATE_PROTOTYPE_ROW = 8
+
+FREEE_ROWS_PER_EMPLOYEE = 2
+
+
+def employee_number(index: int) -> str:
+    return str(EMPLOYEE_NUMBER_START + index)
+
+
+def _read_sample_csv(pattern: str) -> Tuple[List[str], List[List[str]]]:
+    paths = sorted(glob.glob(os.path.join(SAMPLE_DIR, pattern)))
+    if not paths:
+        raise FileNotFoundError(f"サンプルCSVが見つかりません: {os.path.join(SAMPLE_DIR, pattern)}")
+    with open(paths[0], encoding="cp932", newline="") as f:
+        rows = list(csv.reader(f))
+    return rows[0], [row for row in rows[1:] if any(row)]
+
+
+def _write_csv(path: str, header: List[str], rows, encoding: str, quoting=csv.QUOTE_ALL) -> None:
+    with open(path, "w", encoding=encoding, newline="", errors="replace") as f:
+        writer = csv.writer(f, quoting=quoting)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _sample_names(attendance_rows: List[List[str]], name_index: int) -> List[str]:
+    return sorted({row[name_index] for row in attendance_rows if row[name_index]})
+
+
+def generate_employees(size: int, names: List[str], rng: random.Random) -> List[Dict[str, str]]:
+    return [
+        {"employee_number": employee_number(i), "name": rng.choice(names)}
+        for i in range(size)
+    ]
+
+
+def write_employees(path: str, employees: List[Dict[str, str]]) -> None:
+    _write_csv(
+        path, ["社員番号", "氏名"],
+        ([e["employee_number"], e["name"]] for e in employees),
+        "utf-8", quoting=csv.QUOTE_MINIMAL
+    )
+
+
+def write_per_employee_csv(path: str, employees, header, sample_rows, rng: random.Random, encoding: str) -> None:
+    """1人1行のCSV（勤怠・Kincone交通費）"""
+    number_index, name_index = header.index("従業員番号"), header.index("従業員名")
+
+    def rows():
+        for employee in employees:
+            row = list(rng.choice(sample_rows))
+            row[number_index] = employee["employee_number"]
+            row[name_index] = employee["name"]
+            yield row
+
+    _write_csv(path, header, rows(), encoding)
+
+
+def write_freee(path: str, employees, header, sample_rows, rng: random.Random, encoding: str) -> None:
+    partner_index = header.index("取引先")
+    expense_rows = [row for row in sample_rows if row[partner_index].startswith("★")]
+
+    def rows():
+        for employee in employees:
+            for _ in range(rng.randint(0, FREEE_ROWS_PER_EMPLOYEE * 2)):
+                row = list(rng.choice(expense_rows))
+                row[partner_index] = f"★{employee['employee_number']}{employee['name'].replace(' ', '')}"
+                yield row
+
+    # Freeeのエクスポートは引用符なし
+    _write_csv(path, header, rows(), encoding, quoting=csv.QUOTE_MINIMAL)
+
+
+def write_template(path: str, employees) -> None:
+    """サンプルテンプレートの社員行を差し替え、8行目の数式を各行に展開"""
+    wb = load_workbook(os.path.join(SAMPLE_DIR, "template.xlsx"))
+    ws = wb.active
+
+    prototype = []
+    for cell in ws[TEMPLATE_PROTOTYPE_ROW]:
+        value = cell.value
+        if isinstance(value, str) and value.startswith("="):
+            prototype.append((cell.column, cell.coordinate, value))
+        elif cell.column > 3 and value is not None:
+            prototype.append((cell.column, None, value))
+    employee_type = ws.cell(TEMPLATE_PROTOTYPE_ROW, 3).value
+
+    ws.delete_rows(TEMPLATE_FIRST_ROW, ws.max_row - TEMPLATE_FIRST_ROW + 1)
+
+    for offset, employee in enumerate(employees):
+        row = TEMPLATE_FIRST_ROW + offset
+        ws.cell(row, 1, int(employee["employee_number"]))
+        ws.cell(row, 2, employee["name"])
+        ws.cell(row, 3, employee_type)
+        for column, origin, value in prototype:
+            if origin is not None:
+                target = f"{ws.cell(row, column).column_letter}{row}"
+                value = Translator(value, origin=origin).translate_formula(target)
+            ws.cell(row, column, value)
+
+    wb.save(path)
+
+
+def generate_dataset(size: int, out_dir: str, encoding: str = "cp932", seed: int = 42) -> str:
+    """指定人数のデータセットを生成し、出力ディレクトリを返す"""
+    rng = random.Random(seed + size)
+    dataset_dir = os.path.join(out_dir, str(size))
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    attendance_header, attendance_rows = _read_sample_csv("attendance_*.csv")
+    kincone_header, kincone_rows = _read_sample_csv("交通費.csv")
+    freee_header, freee_rows = _read_sample_csv("経費.csv")
+
+    names = _sample_names(attendance_rows, attendance_header.index("従業員名"))
+    employees = generate_employees(size, names, rng)
+
+    write_employees(os.path.join(dataset_dir, "employees.csv"), employees)
+    write_per_employee_csv(os.path.join(dataset_dir, "attendance.csv"), employees, attendance_header, attendance_rows, rng, encoding)
+    write_per_employee_csv(os.path.join(dataset_dir, "kincone.csv"), employees, kincone_header, kincone_rows, rng, encoding)
+    write_freee(os.path.join(dataset_dir, "freee.csv"), employees, freee_header, freee_rows, rng, encoding)
+    write_template(os.path.join(dataset_dir, "template.xlsx"), employees)
+    return dataset_dir
+
+
+def ensure_dataset(size: int, out_dir: str = DEFAULT_OUT_DIR, encoding: str = "cp932") -> str:
+    """データセットが無ければ生成"""
+    dataset_dir = os.path.join(out_dir, str(size))
+    if not os.path.exists(os.path.join(dataset_dir, "template.xlsx")):
+        generate_dataset(size, out_dir, encoding)
+    return dataset_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="社員数（カンマ区切り）")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="出力先ディレクトリ")
+    parser.add_argument("--encoding", default="cp932", help="CSVの文字コード（cp932, utf-8, utf-8-sig）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in (int(value) for value in args.sizes.split(",")):
+        start = time.perf_counter()
+        dataset_dir = generate_dataset(size, args.out, args.encoding, args.seed)
+        print(f"{size:>6}人: {dataset_dir} ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
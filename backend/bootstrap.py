@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+DBスキーマと初期管理者ユーザーの準備（冪等）
+
+起動のたびに実行しても、テーブルと管理者が揃っていればテーブル一覧と管理者の2クエリだけで終わる。
+不足しているテーブルのみ作成し、管理者がいなければ作成する。
+アプリの起動時（AUTO_BOOTSTRAP=true）に同じプロセス内で呼ばれるほか、単体でも実行できる。
+
+使い方:
+    python bootstrap.py
+"""
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, engine as default_engine
+from models import Base, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADMIN_EMAIL = "admin@agileware.com"
+DEFAULT_ADMIN_NAME = "管理者"
+DEFAULT_ADMIN_PASSWORD = "admin123"
+
+
+def ensure_schema(engine: Engine = default_engine) -> list:
+    """不足しているテーブルを作成し、作成したテーブル名を返す"""
+    existing = set(inspect(engine).get_table_names())
+    missing = [table for table in Base.metadata.sorted_tables if table.name not in existing]
+    if missing:
+        Base.metadata.create_all(bind=engine, tables=missing)
+        logger.info("テーブルを作成しました: %s", ", ".join(table.name for table in missing))
+    return [table.name for table in missing]
+
+
+def ensure_admin_user() -> bool:
+    """管理者ユーザーが無ければ作成（作成した場合 True）"""
+    db = SessionLocal()
+    try:
+        if db.query(User.id).filter(User.email == DEFAULT_ADMIN_EMAIL).first():
+            return False
+
+        # bcrypt は作成時だけ使う
+        from core.security import get_password_hash
+
+        db.add(User(
+            email=DEFAULT_ADMIN_EMAIL,
+            name=DEFAULT_ADMIN_NAME,
+            hashed_password=get_password_hash(DEFAULT_ADMIN_PASSWORD)
+        ))
+        db.commit()
+        logger.warning("管理者ユーザーを作成しました: %s（初期パスワードを変更してください）", DEFAULT_ADMIN_EMAIL)
+        return True
+    except IntegrityError:
+        # 複数プロセスが同時に起動した場合は先に作成した方を使う
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def bootstrap_database(engine: Engine = default_engine) -> dict:
+    """スキーマと管理者ユーザーを準備"""
+    created_tables = ensure_schema(engine)
+    created_admin = ensure_admin_user()
+    return {"created_tables": created_tables, "created_admin": created_admin}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    result = bootstrap_database()
+    if not result["created_tables"] and not result["created_admin"]:
+        print("スキーマと管理者ユーザーは準備済みです。")
+    else:
+        print(f"作成したテーブル: {len(result['created_tables'])}件, 管理者ユーザー作成: {result['created_admin']}")
@@ -0,0 +1,83 @@
+"""
+大量行の一覧レスポンス向けの高速JSONシリアライズ
+
+通常の response_model 経由では、ORMオブジェクトを1行ずつ pydantic（from_attributes）で検証し、
+jsonable_encoder と標準の json で再エンコードする。一覧エンドポイントでは代わりに
+- レスポンススキーマのフィールドに対応する列だけを with_entities で取得し
+- DBから取得した行はそのまま信頼して orjson で直接バイト列にする（validate=True なら TypeAdapter で一括検証）
+ことで、1万行規模のレスポンスでもシリアライズのコストを抑える。
+
+出力形式は response_model 経由と同じ（Decimal は文字列、日時は ISO 8601）。
+orjson が無い環境では pydantic の dump_json にフォールバックする。
+"""
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Query
+
+try:
+    import orjson
+except ImportError:  # requirements.txt には含まれるが、無い環境でも動作させる
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """orjson が直接扱えない型（pydantic の JSON モードと同じ表現にする）"""
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return _any_adapter().dump_json(content)
+
+
+@lru_cache(maxsize=None)
+def _any_adapter() -> TypeAdapter:
+    return TypeAdapter(Any)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson でエンコードするJSONレスポンス"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):  # エンコード済み
+            return content
+        return dumps(content)
+
+
+def project_rows(query: Query, schema: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """スキーマのフィールドに対応する列だけを取得して dict のリストで返す"""
+    model = query.column_descriptions[0]["entity"]
+    names = [name for name in schema.model_fields if hasattr(model, name)]
+    rows = query.with_entities(*(getattr(model, name) for name in names)).all()
+    return [dict(zip(names, row)) for row in rows]
+
+
+def list_response(
+    query: Query,
+    schema: Type[BaseModel],
+    validate: bool = False,
+    headers: Optional[Mapping[str, str]] = None
+) -> FastJSONResponse:
+    """
+    一覧クエリの結果をJSONレスポンスにする
+
+    validate=False: DBの行をそのままエンコード（スキーマ外の列は取得しない）
+    validate=True: TypeAdapter で一括検証・シリアライズ（既定値の補完や型変換が必要な場合）
+    """
+    rows = project_rows(query, schema)
+    if validate:
+        adapter = _list_adapter(schema)
+        return FastJSONResponse(adapter.dump_json(adapter.validate_python(rows)), headers=headers)
+    return FastJSONResponse(rows, headers=headers)
@@ -0,0 +1,257 @@
+"""
+Prometheus形式のメトリクスレジストリ
+外部サービスに依存せず、/metrics でテキスト形式（text/plain; version=0.0.4）を返す
+
+- 記録はロック内の辞書更新のみ（ヒストグラムは固定バケットを二分探索）で、本番でも常時有効にできる
+- ラベルの組み合わせが増えすぎないよう、ルートはパステンプレート（/employees/{employee_id}）で記録する
+- DBプールなど取得時点の値は register_collector() で登録した関数からスクレイプ時に収集する
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ラベルが一致しません {sorted(labels)} != {sorted(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> List[Sample]:
+        ...
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counter は減算できません")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """任意に増減する値"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """固定バケットのヒストグラム"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [バケット別件数..., +Inf件数, 合計]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """with ブロックの経過時間を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+
+        samples = []
+        for key, counts in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_count", labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, counts[-1]))
+        return samples
+
+
+class MetricFamily:
+    """コレクター関数が返す、スクレイプ時点の値"""
+
+    def __init__(self, name: str, documentation: str, type_name: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.type_name = type_name
+        self._samples: List[Sample] = []
+
+    def add(self, value: float, **labels) -> "MetricFamily":
+        self._samples.append((self.name, labels, value))
+        return self
+
+    def samples(self) -> List[Sample]:
+        return self._samples
+
+
+class MetricsRegistry:
+    """メトリクスの登録とテキスト形式への変換"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"メトリクス {metric.name} は登録済みです")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheusテキスト形式で出力"""
+        with self._lock:
+            families = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            families.extend(collector())
+
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.type_name}")
+            for name, labels, value in family.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# APIリクエスト
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "APIリクエストの処理時間（秒）", ("method", "route", "status")
+)
+
+# CSVインポート
+IMPORT_ROWS = registry.counter(
+    "import_rows_total", "CSVインポートの処理行数", ("source", "outcome")
+)
+IMPORT_DURATION = registry.histogram(
+    "import_duration_seconds", "CSVインポート1件あたりの処理時間（秒）", ("source", "mode"),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+IMPORT_ROWS_PER_SECOND = registry.gauge(
+    "import_rows_per_second", "直近のCSVインポートのスループット（挿入行数/秒）", ("source",)
+)
+IMPORT_FAILURES = registry.counter(
+    "import_failures_total", "失敗したCSVインポート（エラー行があり取り込まれなかった・ジョブ異常終了）", ("source",)
+)
+
+# 給与計算Excel生成
+PAYROLL_PHASE_DURATION = registry.histogram(
+    "payroll_generation_phase_seconds", "給与計算Excel生成のフェーズ別処理時間（秒）", ("phase",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+PAYROLL_GENERATIONS = registry.counter(
+    "payroll_generations_total", "給与計算Excel生成の実行回数", ("status",)
+)
+
+
+def observe_import(source: str, mode: str, rows_inserted: int, rows_failed: int,
+                   elapsed_seconds: float, failed: bool = False) -> None:
+    """CSVインポート1件分の結果を記録（mode: sync, job）"""
+    if rows_inserted:
+        IMPORT_ROWS.inc(rows_inserted, source=source, outcome="inserted")
+    if rows_failed:
+        IMPORT_ROWS.inc(rows_failed, source=source, outcome="failed")
+    if failed:
+        IMPORT_FAILURES.inc(source=source)
+    IMPORT_DURATION.observe(elapsed_seconds, source=source, mode=mode)
+    if rows_inserted and elapsed_seconds > 0:
+        IMPORT_ROWS_PER_SECOND.set(rows_inserted / elapsed_seconds, source=source)
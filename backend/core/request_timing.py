@@ -0,0 +1,126 @@
+"""
+リクエスト単位の計測
+SQLAlchemy の before/after_cursor_execute でクエリ数とSQL時間を集計し、
+ハンドラ時間・レスポンスサイズとあわせて Server-Timing ヘッダーと構造化ログに出力する
+
+- 集計はリクエストごとの ContextVar に保持する（同期エンドポイントのスレッドにも引き継がれる）
+- リクエスト外（インポートジョブのワーカー等）のクエリは集計しない
+- SLOW_REQUEST_THRESHOLD_MS を超えたリクエストは WARNING で記録する
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.config import settings
+from core.metrics import HTTP_REQUEST_DURATION
+
+logger = logging.getLogger("request_timing")
+
+
+class RequestStats:
+    """1リクエスト分の計測値"""
+
+    __slots__ = ("query_count", "sql_seconds")
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_seconds = 0.0
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """実行中リクエストの計測値（リクエスト外ならNone）"""
+    return _current_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    stats.query_count += 1
+    stats.sql_seconds += time.perf_counter() - start_times.pop()
+
+
+def _server_timing(stats: RequestStats, handler_seconds: float) -> str:
+    return (
+        f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.query_count} queries", '
+        f'app;dur={handler_seconds * 1000:.1f}'
+    )
+
+
+def _log_request(request: Request, status_code: int, stats: RequestStats,
+                 handler_seconds: float, response_bytes: Optional[int]) -> None:
+    route = request.scope.get("route")
+    record = {
+        "method": request.method,
+        "path": request.url.path,
+        "route": getattr(route, "path", None),
+        "status": status_code,
+        "handler_ms": round(handler_seconds * 1000, 1),
+        "sql_ms": round(stats.sql_seconds * 1000, 1),
+        "query_count": stats.query_count,
+        "response_bytes": response_bytes,
+    }
+    if handler_seconds * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+        logger.warning("slow_request %s", json.dumps(record, ensure_ascii=False))
+    else:
+        logger.info("request %s", json.dumps(record, ensure_ascii=False))
+
+
+async def request_timing_middleware(request: Request, call_next):
+    """クエリ数・SQL時間・ハンドラ時間・レスポンスサイズを計測"""
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+    handler_seconds = time.perf_counter() - start
+
+    # 未定義パスはパスごとにラベルを作らない
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.observe(
+        handler_seconds,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    )
+
+    response.headers["Server-Timing"] = _server_timing(stats, handler_seconds)
+
+    content_length = response.headers.get("content-length")
+    if content_length is not None:
+        _log_request(request, response.status_code, stats, handler_seconds, int(content_length))
+        return response
+
+    # ストリーミングレスポンスは送信し終えた時点のサイズを記録
+    body_iterator = response.body_iterator
+
+    async def counting_iterator():
+        sent = 0
+        async for chunk in body_iterator:
+            sent += len(chunk)
+            yield chunk
+        _log_request(request, response.status_code, stats, handler_seconds, sent)
+
+    response.body_iterator = counting_iterator()
+    return response
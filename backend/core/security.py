@@ -62,4 +62,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     user = get_user(db, email=email)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+def is_admin_user(user: User) -> bool:
+    """管理者ユーザーか（ADMIN_EMAILS に含まれるメールアドレス）"""
+    return user.email in settings.ADMIN_EMAILS
@@ -0,0 +1,103 @@
+"""
+構造化デバッグトレース
+ホットパス向けに、遅延フォーマット・サンプリング・モジュール単位のON/OFFを提供する
+
+使い方:
+    _trace = get_tracer(__name__)
+
+    if _trace.enabled:
+        _trace("interval.parse", value=interval_str, hours=result)
+
+無効時のコストは属性参照1回のみ。メッセージは出力されるときにだけ整形される。
+有効化は環境変数 TRACE_MODULES（カンマ区切りのモジュール名、"*" で全て）と
+TRACE_SAMPLE_RATE（0.0〜1.0）で行う。実行中は set_trace_enabled() で切り替え可能。
+"""
+import logging
+import random
+import threading
+from typing import Dict, Optional
+
+from core.config import settings
+
+TRACE_LOGGER_PREFIX = "trace"
+
+
+class _LazyFields:
+    """ログ出力時にだけ key=value 形式へ整形するフィールド保持クラス"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Dict[str, object]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join(f"{key}={value!r}" for key, value in self.fields.items())
+
+
+class Tracer:
+    """モジュール単位のトレーサー"""
+
+    __slots__ = ("name", "enabled", "sample_rate", "_logger")
+
+    def __init__(self, name: str, enabled: bool = False, sample_rate: float = 1.0):
+        self.name = name
+        self.sample_rate = sample_rate
+        self._logger = logging.getLogger(f"{TRACE_LOGGER_PREFIX}.{name}")
+        self.enabled = False
+        self.set_enabled(enabled)
+
+    def set_enabled(self, enabled: bool) -> None:
+        """トレースの有効・無効を切り替え"""
+        self.enabled = enabled
+        if enabled:
+            # ルートロガーのレベルに関係なくDEBUGを通す
+            self._logger.setLevel(logging.DEBUG)
+
+    def __call__(self, event: str, **fields) -> None:
+        """イベントを記録（無効時・サンプリング対象外の場合は何もしない）"""
+        if not self.enabled:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._logger.debug("%s %s", event, _LazyFields(fields))
+
+
+_tracers: Dict[str, Tracer] = {}
+_lock = threading.Lock()
+
+
+def _parse_modules(value: str) -> set:
+    return {module.strip() for module in value.split(",") if module.strip()}
+
+
+_enabled_modules = _parse_modules(settings.TRACE_MODULES)
+
+
+def _is_enabled_for(name: str) -> bool:
+    if "*" in _enabled_modules:
+        return True
+    # "services" を指定すると "services.payroll_service" も対象になる
+    return any(name == module or name.startswith(f"{module}.") for module in _enabled_modules)
+
+
+def get_tracer(name: str) -> Tracer:
+    """モジュール名に対応するトレーサーを取得（なければ作成）"""
+    tracer = _tracers.get(name)
+    if tracer is not None:
+        return tracer
+
+    with _lock:
+        tracer = _tracers.get(name)
+        if tracer is None:
+            tracer = Tracer(name, _is_enabled_for(name), settings.TRACE_SAMPLE_RATE)
+            _tracers[name] = tracer
+    return tracer
+
+
+def set_trace_enabled(name: str, enabled: bool, sample_rate: Optional[float] = None) -> None:
+    """実行中にモジュールのトレースを切り替え（"*" で登録済みの全モジュール）"""
+    targets = list(_tracers.values()) if name == "*" else [get_tracer(name)]
+    for tracer in targets:
+        if sample_rate is not None:
+            tracer.sample_rate = sample_rate
+        tracer.set_enabled(enabled)
@@ -2,41 +2,26 @@
 """
 社員情報CSVファイルをデータベースにインポートするスクリプト
 """
-import csv
 import os
 import sys
-from datetime import datetime
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 
 # プロジェクトのルートディレクトリをパスに追加
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from models import User, Employee
+from models import User
+from services.employee_directory import invalidate_employee_directory
+from services.employee_import import parse_employee_csv, upsert_employees
 from core.config import settings
 
 def read_csv_file(csv_path):
     """CSVファイルを読み込む"""
-    employees_data = []
-    
     with open(csv_path, 'r', encoding='utf-8') as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            # リモート手当の判定（'x'がある場合はTrue）
-            remote_allowance = bool(row.get('リモート手当上限なし', '').strip() == 'x')
-            
-            employee_data = {
-                'employee_number': str(row['社員番号']).strip(),
-                'name': row['給与計算氏名'].strip(),
-                'resignation_date': None, # CSVにないため None
-                
-                'hire_date': None, # CSVにないため None
-                'kincone_name': row['Kincone氏名'].strip() if row['Kincone氏名'].strip() else None,
-                'freee_name': row['給与計算氏名'].strip(),  # 給与計算氏名をFreee氏名として使用
-                'kiwi_name': row['Kiwi氏名'].strip() if row['Kiwi氏名'].strip() else None,
-                'remote_allowance': remote_allowance
-            }
-            employees_data.append(employee_data)
+        employees_data, errors = parse_employee_csv(file.read())
+    
+    for error in errors:
+        print(f"⚠️ {error}")
     
     return employees_data
 
@@ -58,8 +43,8 @@ def get_or_create_default_user(db_session):
     
     return user
 
-def import_employees(csv_path, user_id):
-    """社員データをデータベースにインポート"""
+def import_employees(csv_path, user_id, deactivate_missing=False):
+    """社員データを社員番号で一括アップサート（既存の社員は削除せず更新）"""
     # データベース接続
     engine = create_engine(settings.DATABASE_URL)
     Session = sessionmaker(bind=engine)
@@ -70,37 +55,20 @@ def import_employees(csv_path, user_id):
         employees_data = read_csv_file(csv_path)
         print(f"CSVファイルから {len(employees_data)} 件の社員データを読み込みました")
         
-        # 既存の社員データを削除（user_idが一致するもの）
-        existing_count = db_session.query(Employee).filter(Employee.user_id == user_id).count()
-        if existing_count > 0:
-            db_session.query(Employee).filter(Employee.user_id == user_id).delete()
-            print(f"既存の {existing_count} 件の社員データを削除しました")
-        
-        # 新しい社員データを追加
-        imported_count = 0
-        for emp_data in employees_data:
-            employee = Employee(
-                user_id=user_id,
-                employee_number=emp_data['employee_number'],
-                name=emp_data['name'],
-                
-                
-                hire_date=emp_data['hire_date'],
-                resignation_date=emp_data['resignation_date'],
-                kincone_name=emp_data['kincone_name'],
-                freee_name=emp_data['freee_name'],
-                kiwi_name=emp_data['kiwi_name'],
-                remote_allowance=emp_data['remote_allowance']
-            )
-            db_session.add(employee)
-            imported_count += 1
+        # 社員番号をキーに追加・更新（IDが変わらないため勤怠・経費データの紐付けも保たれる）
+        result = upsert_employees(db_session, user_id, employees_data, deactivate_missing=deactivate_missing)
         
         # データベースにコミット
         db_session.commit()
-        print(f"✅ {imported_count} 件の社員データをインポートしました")
+        invalidate_employee_directory(user_id)
+        print(f"✅ 追加 {result.inserted_count} 件 / 更新 {result.updated_count} 件 / 変更なし {result.unchanged_count} 件")
+        if result.deactivated_count:
+            print(f"🔒 CSVに無い {result.deactivated_count} 件の社員を無効化しました")
+        if result.conflicts:
+            print(f"⚠️ 他のユーザーが使用中の社員番号をスキップしました: {', '.join(result.conflicts)}")
         
         # リモート手当対象者の統計
-        remote_count = sum(1 for emp in employees_data if emp['remote_allowance'])
+        remote_count = sum(1 for emp in employees_data if emp.get('remote_allowance'))
         print(f"📊 リモート手当対象者: {remote_count} 名")
         
     except Exception as e:
@@ -112,7 +80,10 @@ def import_employees(csv_path, user_id):
 
 def main():
     """メイン関数"""
-    csv_path = '/app/社員情報.csv'  # Dockerコンテナ内のパス
+    # 引数: [CSVパス] [--deactivate-missing]（CSVに無い社員を無効化）
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    csv_path = args[0] if args else '/app/社員情報.csv'  # Dockerコンテナ内のパス
+    deactivate_missing = '--deactivate-missing' in sys.argv
     
     # ファイルの存在確認
     if not os.path.exists(csv_path):
@@ -129,7 +100,7 @@ def main():
         user = get_or_create_default_user(db_session)
         
         # 社員データをインポート
-        import_employees(csv_path, user.id)
+        import_employees(csv_path, user.id, deactivate_missing=deactivate_missing)
         
     finally:
         db_session.close()
@@ -1,8 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.config import settings
-from api import auth, users, employees, excel_templates, calculation_periods, freee_expenses, kincone_transportation, attendance_records, payroll
+from core.metrics import CONTENT_TYPE, registry
+from core.request_timing import request_timing_middleware
+from api import auth, users, employees, excel_templates, calculation_periods, freee_expenses, kincone_transportation, attendance_records, payroll, imports, salary_calculations
+from services.generated_files import start_generated_file_gc, stop_generated_file_gc
+from services.import_jobs import resume_pending_import_jobs, start_import_job_watchdog, stop_import_job_watchdog
 
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
 
@@ -15,6 +19,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# リクエスト計測（クエリ数・SQL時間・ハンドラ時間を Server-Timing ヘッダーとログに出力）
+app.middleware("http")(request_timing_middleware)
+
 # APIルーターを登録
 app.include_router(auth.router, tags=["認証"])
 app.include_router(users.router, tags=["ユーザー"])
@@ -25,6 +32,34 @@ app.include_router(freee_expenses.router, prefix="/freee-expenses", tags=["Freee
 app.include_router(kincone_transportation.router, prefix="/kincone-transportation", tags=["Kincone交通費"])
 app.include_router(attendance_records.router, prefix="/attendance-records", tags=["勤務データ"])
 app.include_router(payroll.router, prefix="/payroll", tags=["給与計算"])
+app.include_router(imports.router, prefix="/imports", tags=["CSVインポートジョブ"])
+app.include_router(salary_calculations.router, tags=["給与計算結果"])
+
+@app.on_event("startup")
+def bootstrap():
+    """テーブルと管理者ユーザーを準備（揃っていれば確認のみ）"""
+    if settings.AUTO_BOOTSTRAP:
+        from bootstrap import bootstrap_database
+        bootstrap_database()
+
+@app.on_event("startup")
+def resume_import_jobs():
+    """再起動前に完了しなかったインポートジョブをチェックポイントから再開し、停止したジョブの定期確認を開始"""
+    resume_pending_import_jobs()
+    start_import_job_watchdog()
+
+@app.on_event("shutdown")
+def stop_import_job_check():
+    stop_import_job_watchdog()
+
+@app.on_event("startup")
+def start_generated_file_cleanup():
+    """保持期間・保持件数を超えた生成ファイルを定期的に削除"""
+    start_generated_file_gc()
+
+@app.on_event("shutdown")
+def stop_generated_file_cleanup():
+    stop_generated_file_gc()
 
 @app.get("/")
 def read_root():
@@ -32,4 +67,9 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus形式のメトリクス（リクエスト・CSVインポート・給与計算・DBプール）"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
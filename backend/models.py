@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Numeric, Text, LargeBinary, Boolean, JSON, Interval
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Numeric, Text, LargeBinary, Boolean, JSON, Interval, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
@@ -126,6 +126,12 @@ class KiwigoReport(Base):
 
 class SalaryCalculation(Base):
     __tablename__ = "salary_calculations"
+    __table_args__ = (
+        # 期間ごとの集計・再生成時の置き換え（期間 → 社員）
+        UniqueConstraint("calculation_period_id", "employee_id", name="uq_salary_calculations_period_employee"),
+        # 社員ごとの期間をまたいだ履歴
+        Index("ix_salary_calculations_employee_period", "employee_id", "calculation_period_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     calculation_period_id = Column(Integer, ForeignKey("calculation_periods.id"))
@@ -159,6 +165,8 @@ class ExcelTemplate(Base):
     mime_type = Column(String, default="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
     version = Column(String, default="1.0")
     is_active = Column(Boolean, default=True)
+    column_map = Column(JSON)  # 項目 → 列番号（ヘッダー行から検出、services.template_layout）
+    template_metadata = Column(JSON)  # アップロード時の解析結果（ヘッダー行・社員行・数式セルなど）
     created_by_user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -285,4 +293,68 @@ class AttendanceRecord(Base):
     
     # Relationships
     calculation_period = relationship("CalculationPeriod", back_populates="attendance_records")
-    employee = relationship("Employee", back_populates="attendance_records")
\ No newline at end of file
+    employee = relationship("Employee", back_populates="attendance_records")
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    calculation_period_id = Column(Integer, ForeignKey("calculation_periods.id"))
+    source = Column(String, nullable=False)  # freee, kincone, attendance
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed
+    file_name = Column(String)  # アップロード時のファイル名
+    spool_path = Column(String)  # 一時保存先
+    file_size = Column(Integer)
+    encoding = Column(String)
+    rows_parsed = Column(Integer, default=0)
+    rows_inserted = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    errors = Column(JSON)  # 先頭のエラーのみ保持
+    checkpoint_row = Column(Integer, default=0)  # コミット済みの最終CSV行番号
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # バッチコミットごとに更新
+    worker_id = Column(String)  # 実行中のワーカー（ホスト名:PID:起動ID、再起動時に前のプロセスのジョブを判定）
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PeriodSnapshot(Base):
+    __tablename__ = "period_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    calculation_period_id = Column(Integer, ForeignKey("calculation_periods.id"), unique=True, index=True, nullable=False)
+    summaries = Column(JSON, nullable=False)  # ロック時点の WorkDataSummary 一覧
+    summary_count = Column(Integer, default=0)
+    row_counts = Column(JSON)  # {"attendance": 件数, "freee": 件数, "kincone": 件数}
+    template_id = Column(Integer, ForeignKey("excel_templates.id"))
+    workbook_file_name = Column(String)
+    workbook_sha256 = Column(String)  # ロック時に生成したExcelのハッシュ
+    created_by_user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    __table_args__ = (UniqueConstraint("user_id", "resource", name="uq_data_versions_user_resource"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, default=0)  # 0 は全ユーザー共通のリソース
+    resource = Column(String, nullable=False)  # calculation_periods, employees, excel_templates, work_data
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class GeneratedFile(Base):
+    __tablename__ = "generated_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_name = Column(String, unique=True, index=True, nullable=False)  # ダウンロードURLのファイル名
+    storage_backend = Column(String, nullable=False)  # local, s3
+    storage_key = Column(String, nullable=False)  # 保存先のキー（ab/cd/ファイル名）
+    file_size = Column(Integer)
+    sha256 = Column(String)
+    input_fingerprint = Column(String, index=True)  # 生成時の入力（データ・テンプレート・コードのバージョン）のハッシュ
+    calculation_period_id = Column(Integer, ForeignKey("calculation_periods.id"), index=True)
+    template_id = Column(Integer, ForeignKey("excel_templates.id"))
+    created_by_user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_downloaded_at = Column(DateTime)
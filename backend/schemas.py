@@ -43,6 +43,7 @@ class CalculationPeriodCreate(CalculationPeriodBase):
 
 class CalculationPeriodUpdate(BaseModel):
     status: Optional[str] = None
+    template_id: Optional[int] = None  # ロック時にこのテンプレートでExcelを生成し、ハッシュを保存
 
 class CalculationPeriodResponse(CalculationPeriodBase):
     id: int
@@ -85,6 +86,16 @@ class EmployeeResponse(EmployeeBase):
     class Config:
         from_attributes = True
 
+class EmployeeImportResponse(BaseModel):
+    total_rows: int
+    inserted_count: int = 0
+    updated_count: int = 0
+    unchanged_count: int = 0
+    deactivated_count: int = 0  # deactivate_missing=true でCSVに無かった社員
+    conflicts: List[str] = []  # 他のユーザーが使用中の社員番号（更新しない）
+    errors: List[str] = []
+    success: bool
+
 # 勤務データ関連
 class WorkDataBase(BaseModel):
     work_date: date
@@ -183,13 +194,13 @@ class KiwigoReportResponse(KiwigoReportBase):
 
 # 給与計算関連
 class SalaryCalculationBase(BaseModel):
-    base_salary: Decimal
+    base_salary: Optional[Decimal] = None  # Excel生成で保存する行では None（基本給はテンプレート側で管理）
     overtime_pay: Decimal = 0
     transportation_allowance: Decimal = 0
     remote_allowance: Decimal = 0
     total_gross: Decimal
     deductions: Decimal = 0
-    net_salary: Decimal
+    net_salary: Optional[Decimal] = None
     calculation_details: Optional[Dict[str, Any]] = None
     status: str = "draft"
 
@@ -218,6 +229,25 @@ class SalaryCalculationResponse(SalaryCalculationBase):
     class Config:
         from_attributes = True
 
+class SalaryHistoryEntry(SalaryCalculationResponse):
+    year: int
+    month: int
+    period_name: str
+
+class SalaryPeriodTotals(BaseModel):
+    calculation_period_id: int
+    year: int
+    month: int
+    period_name: str
+    employee_count: int
+    base_salary: Optional[Decimal] = None  # 未計算の社員がいる期間は None
+    overtime_pay: Decimal = 0
+    transportation_allowance: Decimal = 0
+    remote_allowance: Decimal = 0
+    total_gross: Decimal = 0
+    deductions: Decimal = 0
+    net_salary: Optional[Decimal] = None  # 未計算の社員がいる期間は None
+
 # Excelテンプレート関連
 class ExcelTemplateBase(BaseModel):
     name: str
@@ -241,6 +271,8 @@ class ExcelTemplateResponse(ExcelTemplateBase):
     file_name: str
     file_size: Optional[int] = None
     mime_type: str
+    column_map: Optional[Dict[str, int]] = None  # 項目 → 列番号
+    template_metadata: Optional[Dict[str, Any]] = None  # アップロード時の解析結果
     created_by_user_id: int
     created_at: datetime
     updated_at: datetime
@@ -282,6 +314,26 @@ class TemplateUsageResponse(TemplateUsageBase):
     class Config:
         from_attributes = True
 
+# CSVインポート共通（ドライラン診断）
+class CSVImportRowDiagnostic(BaseModel):
+    row_number: int  # CSV上の行番号（ヘッダー行=1）
+    employee_number: Optional[str] = None
+    employee_id: Optional[int] = None
+    status: str  # warning, error
+    messages: List[str] = []
+
+class CSVImportDryRunReport(BaseModel):
+    source: str  # freee, kincone, attendance
+    encoding: str
+    total_rows: int
+    valid_rows: int
+    error_rows: int
+    matched_rows: int
+    unmatched_rows: int
+    unmatched_employee_numbers: List[str] = []
+    total_amount: Optional[Decimal] = None
+    rows: List[CSVImportRowDiagnostic] = []  # 警告・エラーのある行のみ
+
 # Freee経費関連
 class FreeeExpenseBase(BaseModel):
     income_expense_type: str  # 収支区分
@@ -347,6 +399,7 @@ class FreeeExpenseImportResponse(BaseModel):
     imported_count: int
     errors: List[str]
     success: bool
+    dry_run_report: Optional[CSVImportDryRunReport] = None
 
 # 古いスキーマ（後方互換性のため保持）
 class ExpenseBase(BaseModel):
@@ -419,6 +472,7 @@ class KinconeTransportationImportResponse(BaseModel):
     imported_count: int
     errors: List[str]
     success: bool
+    dry_run_report: Optional[CSVImportDryRunReport] = None
 
 # 勤務データスキーマ
 class AttendanceRecordBase(BaseModel):
@@ -464,6 +518,13 @@ class AttendanceRecordUpdate(BaseModel):
     early_leave_count: Optional[int] = None
 
 class AttendanceRecordResponse(AttendanceRecordBase):
+    # 時間項目はDBにHH:MM形式の文字列で保存されているためそのまま返す
+    total_work_time: Optional[str] = None
+    regular_work_time: Optional[str] = None
+    actual_work_time: Optional[str] = None
+    overtime_work_time: Optional[str] = None
+    late_night_work_time: Optional[str] = None
+    holiday_work_time: Optional[str] = None
     id: int
     calculation_period_id: int
     employee_id: Optional[int] = None
@@ -482,6 +543,7 @@ class AttendanceRecordImportResponse(BaseModel):
     imported_count: int
     errors: List[str]
     success: bool
+    dry_run_report: Optional[CSVImportDryRunReport] = None
 
 # エラーレスポンス
 class ApiError(BaseModel):
@@ -491,12 +553,28 @@ class ApiError(BaseModel):
 class PayrollGenerationRequest(BaseModel):
     calculation_period_id: int
     template_id: int
+    profile: bool = False  # フェーズ別の処理時間・メモリ確保ピークを返す
+    profile_dump: bool = False  # cProfile を .pstats に書き出す（管理者のみ）
+    force: bool = False  # 同じ入力で生成済みのファイルがあっても生成し直す
+
+class PayrollPhaseProfile(BaseModel):
+    phase: str  # lookup, aggregate, template_load, calculate, write, persist, save
+    wall_ms: float
+    peak_alloc_kb: Optional[float] = None  # フェーズ中のメモリ確保ピーク（開始時点からの増分）
+
+class PayrollProfile(BaseModel):
+    total_ms: float
+    phases: List[PayrollPhaseProfile] = []
+    pstats_file: Optional[str] = None
 
 class PayrollGenerationResponse(BaseModel):
     status: str
     messages: List[str] = []
     file_name: Optional[str] = None
     download_url: Optional[str] = None
+    file_sha256: Optional[str] = None
+    reused: bool = False  # 同じ入力で生成済みのファイルを返した
+    profile: Optional[PayrollProfile] = None
 
 # 勤務データ統合用
 class WorkDataSummary(BaseModel):
@@ -522,4 +600,37 @@ class WorkDataSummary(BaseModel):
     kiwi_points: Optional[int] = None
     freee_expenses: Optional[int] = None
     kincone_expenses: Optional[int] = None
-    no_remote_allowance_limit: bool = False
\ No newline at end of file
+    no_remote_allowance_limit: bool = False
+
+# 確定済み期間のスナップショット
+class PeriodSnapshotResponse(BaseModel):
+    id: int
+    calculation_period_id: int
+    summary_count: int
+    row_counts: Dict[str, int] = {}
+    template_id: Optional[int] = None
+    workbook_file_name: Optional[str] = None
+    workbook_sha256: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# CSVインポートジョブ関連
+class ImportJobResponse(BaseModel):
+    id: int
+    source: str
+    status: str  # queued, running, completed, failed
+    calculation_period_id: int
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    encoding: Optional[str] = None
+    rows_parsed: int = 0
+    rows_inserted: int = 0
+    error_count: int = 0
+    errors: List[str] = []
+    checkpoint_row: int = 0
+    rows_per_second: Optional[float] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime
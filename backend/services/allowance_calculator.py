@@ -0,0 +1,242 @@
+"""
+給与計算の手当計算エンジン
+
+勤務データサマリ（WorkDataSummary）の一覧から、手当のルールを全社員分まとめて
+NumPy の列演算で計算する。結果はExcelテンプレートへの書き込み（数式または値）と
+SalaryCalculation の行の両方に使う。書き込む列はテンプレートの列マップ（services.template_layout）で決まる。
+
+ルール（テンプレートの注記と同じ、列は標準のテンプレートの位置）:
+    X   リモート＠家日数       上限10日（no_remote_allowance_limit の社員は上限なし）
+    Z   リモートお菓子飲み物手当 225円/日（KIWIポイントがテンプレートAK2未満なら0、テンプレート側の数式）
+    AB  リモート光熱費         300円/日（テンプレート側の数式）
+    AF  出社手当               2000円/日 上限10日
+    AG  ランチ手当             500円/日 上限10日
+    AH  イベントありがとう手当   3000円/回
+    AR  出張日当               前泊・宿泊・当日移動 2000円、休日移動 1000円
+    H/I 特別休暇（有給/無給）   テンプレート2行目の値に加算
+
+numpy の読み込みに時間がかかるため、このモジュールはExcel生成時にだけ import する。
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from schemas import WorkDataSummary
+
+REMOTE_DAYS_CAP = 10
+OFFICE_DAYS_CAP = 10
+LUNCH_DAYS_CAP = 10
+
+OFFICE_ALLOWANCE_PER_DAY = 2000
+LUNCH_ALLOWANCE_PER_DAY = 500
+EVENT_ALLOWANCE_PER_EVENT = 3000
+TRIP_NIGHT_BEFORE_PER_DIEM = 2000
+TRIP_PER_DIEM = 2000
+TRAVEL_ONDAY_PER_DIEM = 2000
+TRAVEL_HOLIDAY_PER_DIEM = 1000
+
+# テンプレートの数式（Z列・AB列）と同じ単価。SalaryCalculation の計算に使う
+REMOTE_SNACK_PER_DAY = 225
+REMOTE_UTILITY_PER_DAY = 300
+KIWI_POINT_THRESHOLD = 50  # テンプレートAK2の既定値（生成時はテンプレートのKIWIポイント列2行目の値を使う）
+
+# 値をそのまま書き込む WorkDataSummary の項目
+PASSTHROUGH_FIELDS = (
+    "working_days", "total_work_hours", "paid_leave_days", "statutory_holiday_hours",
+    "night_working_hours", "absence_days", "kiwi_points", "freee_expenses", "kincone_expenses",
+)
+
+COUNT_FIELDS = (
+    "remote_count", "lunch_count", "office_count", "event_count",
+    "trip_night_before_count", "trip_count", "travel_onday_count", "travel_holidays_count",
+    "special_holiday", "special_holiday_without_pay", "kiwi_points",
+    "freee_expenses", "kincone_expenses",
+)
+
+MODES = ("formulas", "values")
+
+
+@dataclass
+class Column:
+    """1項目分の計算結果（values は present が False の社員では無効）"""
+    values: np.ndarray
+    present: np.ndarray
+
+
+class AllowanceCalculator:
+    """全社員分の手当を列単位で計算"""
+
+    def __init__(self, summaries: Sequence[WorkDataSummary], kiwi_point_threshold: float = KIWI_POINT_THRESHOLD):
+        self.summaries = list(summaries)
+        self.kiwi_point_threshold = kiwi_point_threshold
+        # pydantic モデルの属性アクセスより速いため、項目は __dict__ から読む
+        self._records = [summary.__dict__ for summary in self.summaries]
+        self.inputs: Dict[str, Column] = {
+            name: self._column(name) for name in COUNT_FIELDS
+        }
+        self.no_limit = np.array([record["no_remote_allowance_limit"] for record in self._records], dtype=bool)
+        self.results = self._calculate()
+        # セルの取り出しは社員ごとなので、ndarray の要素アクセスを避けて Python のリストにしておく
+        self._lists = {
+            name: (column.values.tolist(), column.present.tolist())
+            for name, column in {**self.inputs, **self.results}.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.summaries)
+
+    def _column(self, name: str) -> Column:
+        raw = [record[name] for record in self._records]
+        present = np.array([value is not None for value in raw], dtype=bool)
+        values = np.array([value or 0 for value in raw], dtype=np.int64)
+        return Column(values, present)
+
+    def _calculate(self) -> Dict[str, Column]:
+        inputs = self.inputs
+        remote, lunch, office, event = (
+            inputs["remote_count"], inputs["lunch_count"], inputs["office_count"], inputs["event_count"]
+        )
+
+        remote_days = np.where(self.no_limit, remote.values, np.minimum(remote.values, REMOTE_DAYS_CAP))
+        lunch_days = np.minimum(lunch.values, LUNCH_DAYS_CAP)
+        office_days = np.minimum(office.values, OFFICE_DAYS_CAP)
+
+        trip_fields = ("trip_night_before_count", "trip_count", "travel_onday_count", "travel_holidays_count")
+        trip_present = np.logical_and.reduce([inputs[name].present for name in trip_fields])
+        trip_allowance = (
+            TRIP_NIGHT_BEFORE_PER_DIEM * inputs["trip_night_before_count"].values
+            + TRIP_PER_DIEM * inputs["trip_count"].values
+            + TRAVEL_ONDAY_PER_DIEM * inputs["travel_onday_count"].values
+            + TRAVEL_HOLIDAY_PER_DIEM * inputs["travel_holidays_count"].values
+        )
+
+        kiwi = inputs["kiwi_points"]
+        snack_allowance = np.where(kiwi.values < self.kiwi_point_threshold, 0, remote_days * REMOTE_SNACK_PER_DAY)
+        utility_allowance = remote_days * REMOTE_UTILITY_PER_DAY
+
+        return {
+            "remote_days": Column(remote_days, remote.present),
+            "lunch_days": Column(lunch_days, lunch.present),
+            "lunch_allowance": Column(lunch_days * LUNCH_ALLOWANCE_PER_DAY, lunch.present),
+            "office_days": Column(office.values, office.present),
+            "office_allowance_days": Column(office_days, office.present),
+            "office_allowance": Column(office_days * OFFICE_ALLOWANCE_PER_DAY, office.present),
+            "event_allowance": Column(event.values * EVENT_ALLOWANCE_PER_EVENT, event.present),
+            "trip_allowance": Column(trip_allowance, trip_present),
+            "remote_snack_allowance": Column(snack_allowance, remote.present),
+            "remote_utility_allowance": Column(utility_allowance, remote.present),
+            "expense_total": Column(
+                inputs["freee_expenses"].values + inputs["kincone_expenses"].values,
+                inputs["freee_expenses"].present | inputs["kincone_expenses"].present
+            ),
+        }
+
+    def _value(self, name: str, index: int) -> Optional[int]:
+        values, present = self._lists[name]
+        return values[index] if present[index] else None
+
+    def _masked(self, name: str, template: Optional[str] = None) -> list:
+        """項目の値のリスト（無い社員は None、template を渡すと数式の文字列）"""
+        values, present = self._lists[name]
+        if template is None:
+            return [value if has_value else None for value, has_value in zip(values, present)]
+        return [template.format(value) if has_value else None for value, has_value in zip(values, present)]
+
+    def columns(
+        self,
+        mode: str = "formulas",
+        special_holiday_base: Tuple[object, object] = (0, 0),
+        special_holiday_cells: Tuple[str, str] = ("H2", "I2")
+    ) -> List[Tuple[str, list]]:
+        """
+        項目（services.template_layout の列マップのキー）ごとに全社員分の書き込む値を返す（書き込まない社員は None）
+        mode="formulas": 手当を数式で出力（テンプレート上で根拠が見える従来の形式）
+                         特別休暇は special_holiday_cells のセル（テンプレート2行目）への加算式
+        mode="values": 計算済みの値を出力（special_holiday_base にテンプレート2行目の値を渡す）
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode は {', '.join(MODES)} のいずれかを指定してください")
+        formulas = mode == "formulas"
+
+        columns = [
+            (field_name, [record[field_name] for record in self._records])
+            for field_name in PASSTHROUGH_FIELDS
+        ]
+        columns.append(("remote_days", self._masked("remote_days")))
+        columns.append(("office_days", self._masked("office_days")))
+        if formulas:
+            columns.append(("lunch_allowance", self._masked("lunch_days", f"={LUNCH_ALLOWANCE_PER_DAY}*{{}}")))
+            columns.append(("office_allowance", self._masked("office_allowance_days", f"={OFFICE_ALLOWANCE_PER_DAY}*{{}}")))
+            columns.append(("event_allowance", self._masked("event_count", f"={EVENT_ALLOWANCE_PER_EVENT}*{{}}")))
+            trip_values = [self._lists[name][0] for name in (
+                "trip_night_before_count", "trip_count", "travel_onday_count", "travel_holidays_count"
+            )]
+            trip_template = (
+                f"={TRIP_NIGHT_BEFORE_PER_DIEM}*{{}}+{TRIP_PER_DIEM}*{{}}+"
+                f"{TRAVEL_ONDAY_PER_DIEM}*{{}}+{TRAVEL_HOLIDAY_PER_DIEM}*{{}}"
+            )
+            columns.append(("trip_allowance", [
+                trip_template.format(*counts) if has_value else None
+                for has_value, *counts in zip(self._lists["trip_allowance"][1], *trip_values)
+            ]))
+            for field_name, base_cell in zip(("special_holiday", "special_holiday_without_pay"), special_holiday_cells):
+                columns.append((field_name, self._masked(field_name, f"={base_cell}+{{}}")))
+        else:
+            for field_name in ("lunch_allowance", "office_allowance", "event_allowance", "trip_allowance"):
+                columns.append((field_name, self._masked(field_name)))
+            for field_name, base in zip(("special_holiday", "special_holiday_without_pay"), special_holiday_base):
+                base = _number(base)
+                columns.append((field_name, [
+                    None if days is None else base + days for days in self._masked(field_name)
+                ]))
+        return columns
+
+    def salary_calculation_rows(self, calculation_period_id: int) -> List[dict]:
+        """
+        SalaryCalculation の行（bulk_insert_mappings 用）
+
+        基本給・残業代・控除はExcelテンプレート側で管理しているため、
+        total_gross は手当と交通費の合計、net_salary は計算しない
+        """
+        results = self.results
+        remote_allowance = results["remote_snack_allowance"].values + results["remote_utility_allowance"].values
+        other_allowance = (
+            results["office_allowance"].values + results["lunch_allowance"].values
+            + results["event_allowance"].values + results["trip_allowance"].values * results["trip_allowance"].present
+        )
+        transportation = self.inputs["kincone_expenses"].values
+        total = remote_allowance + other_allowance + transportation
+
+        rows = []
+        for index, summary in enumerate(self.summaries):
+            details = {name: self._value(name, index) for name in results}
+            details.update(
+                working_days=summary.working_days,
+                total_work_hours=summary.total_work_hours,
+                paid_leave_days=summary.paid_leave_days,
+                absence_days=summary.absence_days,
+                kiwi_points=summary.kiwi_points,
+                freee_expenses=summary.freee_expenses,
+                kincone_expenses=summary.kincone_expenses,
+            )
+            rows.append({
+                "calculation_period_id": calculation_period_id,
+                "employee_id": summary.employee_id,
+                "base_salary": None,
+                "overtime_pay": Decimal(0),
+                "transportation_allowance": Decimal(int(transportation[index])),
+                "remote_allowance": Decimal(int(remote_allowance[index])),
+                "total_gross": Decimal(int(total[index])),
+                "deductions": Decimal(0),
+                "net_salary": None,
+                "calculation_details": details,
+            })
+        return rows
+
+
+def _number(value) -> float:
+    if isinstance(value, (int, float)):
+        return value
+    return 0
@@ -0,0 +1,216 @@
+"""
+生成ファイル（給与計算Excel）の保存先
+
+ARTIFACT_STORE で保存先を切り替える。
+    local  ARTIFACT_DIR 以下に、内容のハッシュで2階層に分けたディレクトリへ保存する
+           （1ディレクトリのファイル数が増え続けないようにする）
+    s3     S3互換ストレージ（ARTIFACT_S3_ENDPOINT_URL で MinIO などのローカル環境にも向けられる）
+           boto3 は s3 を使う場合のみ必要
+
+保存したファイルは generated_files テーブルで管理する（services.generated_files）。
+"""
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 生成ファイル名（payroll_2024_11_20241207131704.xlsx、同じ秒に生成した場合は _2 などの連番付き）
+FILE_NAME_PATTERN = re.compile(r"^payroll_\d{4}_\d{2}_\d{14}(_\d+)?\.xlsx$")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def validate_file_name(file_name: str) -> str:
+    """ダウンロード・保存に使うファイル名の検証（パスの区切りや想定外の名前は ValueError）"""
+    if not FILE_NAME_PATTERN.match(file_name or ""):
+        raise ValueError("不正なファイル名です")
+    return file_name
+
+
+def artifact_key(file_name: str, sha256: str) -> str:
+    """保存先のキー（内容のハッシュの先頭4文字で2階層に分ける）"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{validate_file_name(file_name)}"
+
+
+class ArtifactStore(ABC):
+    """生成ファイルの保存先のインターフェース"""
+
+    backend = ""
+
+    @abstractmethod
+    def save(self, key: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """削除（存在しなければ False）"""
+
+    @abstractmethod
+    def open_stream(self, key: str) -> Iterator[bytes]:
+        """ファイルの内容をチャンクで返す"""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """ディスク上のパス（ローカル以外は None。ダウンロードはパスがあれば FileResponse で返す）"""
+        return None
+
+    @abstractmethod
+    def list_keys(self) -> Iterator[Tuple[str, datetime]]:
+        """保存されている (キー, 更新日時)（GCで管理外のファイルを探すのに使う）"""
+
+
+class LocalArtifactStore(ArtifactStore):
+    """ローカルディスク（ARTIFACT_DIR/ab/cd/ファイル名）"""
+
+    backend = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError("不正な保存先です")
+        return path
+
+    def save(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルをダウンロードさせないよう、一時ファイルから置き換える
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        # 空になったシャードのディレクトリを片付ける
+        for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            if directory == self.root:
+                break
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+        return True
+
+    def open_stream(self, key: str) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def list_keys(self) -> Iterator[Tuple[str, datetime]]:
+        if not os.path.isdir(self.root):
+            return
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if not FILE_NAME_PATTERN.match(file_name):
+                    continue
+                path = os.path.join(directory, file_name)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                yield key, datetime.utcfromtimestamp(os.path.getmtime(path))
+
+
+class S3ArtifactStore(ArtifactStore):
+    """S3互換ストレージ（ARTIFACT_S3_BUCKET/ARTIFACT_S3_PREFIX/ab/cd/ファイル名）"""
+
+    backend = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("ARTIFACT_STORE=s3 には boto3 のインストールが必要です")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def save(self, key: str, data: bytes) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=data,
+            ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception:
+            return False
+        return True
+
+    def delete(self, key: str) -> bool:
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def open_stream(self, key: str) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"]
+        try:
+            while True:
+                chunk = body.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    def list_keys(self) -> Iterator[Tuple[str, datetime]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(prefix):]
+                if FILE_NAME_PATTERN.match(key.rsplit("/", 1)[-1]):
+                    yield key, item["LastModified"].replace(tzinfo=None)
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """設定に応じた保存先（プロセス内で1つ）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.ARTIFACT_STORE == "s3":
+                _store = S3ArtifactStore(
+                    settings.ARTIFACT_S3_BUCKET, settings.ARTIFACT_S3_PREFIX, settings.ARTIFACT_S3_ENDPOINT_URL
+                )
+            elif settings.ARTIFACT_STORE == "local":
+                _store = LocalArtifactStore(settings.ARTIFACT_DIR)
+            else:
+                raise RuntimeError(f"ARTIFACT_STORE は local または s3 を指定してください: {settings.ARTIFACT_STORE}")
+            logger.info(f"Artifact store: {_store.backend}")
+        return _store
@@ -0,0 +1,408 @@
+"""
+CSVインポート共通処理
+文字コード判定・社員番号の解決・CSV行からモデル属性への変換を、DB書き込みから切り離して提供する
+（通常インポートとドライランの両方で同じ変換処理を使う）
+"""
+import codecs
+import logging
+import re
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.tracing import get_tracer
+from models import AttendanceRecord, FreeeExpense, KinconeTransportation
+from schemas import CSVImportDryRunReport, CSVImportRowDiagnostic
+from services.date_parser import ColumnDateParser
+from services.employee_directory import get_employee_directory
+from services.duration_parser import parse_duration_seconds
+
+logger = logging.getLogger(__name__)
+_trace = get_tracer(__name__)
+
+ENCODINGS_TO_TRY = ['utf-8', 'utf-8-sig', 'shift_jis', 'cp932', 'euc-jp', 'iso-2022-jp', 'latin1']
+
+_BOMS = (
+    (b'\xef\xbb\xbf', "UTF-8"),
+    (b'\xff\xfe', "UTF-16LE"),
+    (b'\xfe\xff', "UTF-16BE"),
+)
+
+_PARTNER_EMPLOYEE_NUMBER = re.compile(r'★(\d+)')
+
+
+class CSVDecodeError(Exception):
+    """CSVファイルの文字エンコーディングを判定できない"""
+
+
+def decode_csv_content(content: bytes, replace_on_failure: bool = True) -> Tuple[str, str]:
+    """
+    BOMを除去し、候補のエンコーディングを順に試してデコード
+    戻り値: (デコード後の文字列, 判定したエンコーディング)
+    """
+    if _trace.enabled:
+        _trace("csv.sample_bytes", sample=content[:100])
+
+    for bom, bom_name in _BOMS:
+        if content.startswith(bom):
+            content = content[len(bom):]
+            logger.info(f"Removed {bom_name} BOM")
+            break
+
+    for encoding in ENCODINGS_TO_TRY:
+        try:
+            content_str = content.decode(encoding)
+        except UnicodeDecodeError as e:
+            if _trace.enabled:
+                _trace("csv.decode_failed", encoding=encoding, error=str(e))
+            continue
+        logger.info(f"Successfully decoded as {encoding}")
+        if _trace.enabled:
+            _trace("csv.first_lines", lines=content_str.split('\n', 3)[:3])
+        return content_str, encoding
+
+    logger.error(f"Failed to decode file with all attempted encodings: {ENCODINGS_TO_TRY}")
+    if not replace_on_failure:
+        raise CSVDecodeError("CSVファイルの文字エンコーディングが不正です")
+
+    # 最後の手段として、エラーを無視してUTF-8でデコード
+    logger.warning("Decoded with UTF-8 using error replacement")
+    return content.decode('utf-8', errors='replace'), 'utf-8-replace'
+
+
+def detect_csv_encoding(sample: bytes) -> Tuple[str, int]:
+    """
+    ファイル先頭のサンプルからエンコーディングを判定（大きなファイルを全体デコードしない場合に使用）
+    戻り値: (エンコーディング, 先頭のBOMのバイト数)
+    判定できない場合は ("utf-8", BOM長) を返し、呼び出し側で errors='replace' を使う
+    """
+    bom_length = 0
+    for bom, _ in _BOMS:
+        if sample.startswith(bom):
+            bom_length = len(bom)
+            break
+    sample = sample[bom_length:]
+
+    for encoding in ENCODINGS_TO_TRY:
+        # サンプル末尾でマルチバイト文字が途切れていても失敗しないよう、インクリメンタルデコーダーを使う
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding, bom_length
+
+    return 'utf-8', bom_length
+
+
+def extract_employee_number(partner_name: str) -> Optional[str]:
+    """取引先名から社員番号を抽出（★100吉村芙実 → 100）"""
+    if not partner_name:
+        return None
+    match = _PARTNER_EMPLOYEE_NUMBER.match(partner_name)
+    if match:
+        return match.group(1)
+    return None
+
+
+def parse_csv_decimal(amount_str: str) -> Decimal:
+    """CSV金額文字列をDecimalに変換（カンマ・「円」を除去）"""
+    if not amount_str or amount_str.strip() == "":
+        return Decimal('0')
+    try:
+        clean_amount = amount_str.replace(',', '').replace('円', '')
+        return Decimal(clean_amount)
+    except (ValueError, TypeError):
+        return Decimal('0')
+
+
+def parse_csv_int(count_str: str, default: int = 0) -> int:
+    """CSV数値文字列をintに変換"""
+    if not count_str or count_str.strip() == "":
+        return default
+    try:
+        return int(count_str)
+    except (ValueError, TypeError):
+        return default
+
+
+class EmployeeResolver:
+    """
+    社員番号 → 社員IDの解決
+    ユーザーの社員ディレクトリ（プロセス内キャッシュ）を使い、行ごとのクエリを発行しない
+    """
+
+    def __init__(self, db: Session, user_id: int, numeric_fallback: bool = True):
+        self.numeric_fallback = numeric_fallback
+        self.unmatched: Set[str] = set()
+        self.directory = get_employee_directory(db, user_id)
+
+    def resolve(self, employee_number: Optional[str]) -> Optional[int]:
+        """社員番号から社員IDを取得（完全一致 → 数値一致の順）"""
+        if not employee_number:
+            return None
+
+        # "006" と "6" のような表記ゆれは数値として比較
+        employee_id = self.directory.resolve(employee_number, numeric_fallback=self.numeric_fallback)
+        if _trace.enabled and employee_id is not None and employee_number not in self.directory.by_number:
+            _trace("employee.numeric_match", csv=employee_number, employee_id=employee_id)
+
+        if employee_id is None:
+            self.unmatched.add(employee_number)
+        return employee_id
+
+
+class ImportRowMapper(ABC):
+    """
+    CSV行 → モデル属性（dict）の変換
+    map_row() は (属性dict, 警告メッセージ) を返し、変換できない行では例外を送出する
+    """
+
+    source: str = ""
+    model = None
+    amount_field: Optional[str] = None
+    # 社員番号の数値一致（"006" = "6"）を許可するか
+    numeric_employee_match: bool = True
+
+    def __init__(self, calculation_period_id: int, resolver: EmployeeResolver):
+        self.calculation_period_id = calculation_period_id
+        self.resolver = resolver
+
+    @abstractmethod
+    def map_row(self, row: Dict[str, str]) -> Tuple[dict, List[str]]:
+        ...
+
+    def _resolve_employee(self, employee_number: Optional[str], messages: List[str]) -> Optional[int]:
+        if not employee_number:
+            messages.append("社員番号がありません")
+            return None
+        employee_id = self.resolver.resolve(employee_number)
+        if employee_id is None:
+            messages.append(f"社員番号 {employee_number} に一致する社員が見つかりません")
+        return employee_id
+
+    @staticmethod
+    def _parse_date(parser: ColumnDateParser, value: Optional[str], label: str, messages: List[str]):
+        result = parser(value)
+        if result is None and value and value.strip():
+            messages.append(f"{label}の日付形式が不正です: {value}")
+        return result
+
+
+class FreeeRowMapper(ImportRowMapper):
+    """Freee経費CSV"""
+
+    source = "freee"
+    model = FreeeExpense
+    amount_field = "amount"
+    numeric_employee_match = False
+
+    def __init__(self, calculation_period_id: int, resolver: EmployeeResolver):
+        super().__init__(calculation_period_id, resolver)
+        # Freeeは YYYY/MM/DD 固定
+        freee_date_formats = ("%Y/%m/%d",)
+        self.parse_occurrence_date = ColumnDateParser(freee_date_formats)
+        self.parse_payment_due_date = ColumnDateParser(freee_date_formats)
+        self.parse_payment_date = ColumnDateParser(freee_date_formats)
+
+    def map_row(self, row: Dict[str, str]) -> Tuple[dict, List[str]]:
+        messages: List[str] = []
+
+        # 取引先から社員番号を抽出
+        partner_name = row.get('取引先', '')
+        employee_number = extract_employee_number(partner_name)
+        employee_id = self._resolve_employee(employee_number, messages)
+
+        values = dict(
+            calculation_period_id=self.calculation_period_id,
+            employee_id=employee_id,
+            income_expense_type=row.get('収支区分', ''),
+            management_number=row.get('管理番号', ''),
+            occurrence_date=self._parse_date(self.parse_occurrence_date, row.get('発生日', ''), '発生日', messages),
+            payment_due_date=self._parse_date(self.parse_payment_due_date, row.get('支払期日', ''), '支払期日', messages),
+            partner_name=partner_name,
+            account_item=row.get('勘定科目', ''),
+            tax_classification=row.get('税区分', ''),
+            amount=parse_csv_decimal(row.get('金額', '0')),
+            tax_calculation_type=row.get('税計算区分', ''),
+            tax_amount=parse_csv_decimal(row.get('税額', '0')),
+            notes=row.get('備考', ''),
+            item_name=row.get('品目', ''),
+            department=row.get('部門', ''),
+            memo_tags=row.get('メモタグ（複数指定可、カンマ区切り）', ''),
+            payment_date=self._parse_date(self.parse_payment_date, row.get('支払日', ''), '支払日', messages),
+            payment_account=row.get('支払口座', ''),
+            payment_amount=parse_csv_decimal(row.get('支払金額', '0')),
+            employee_number=employee_number,
+            data_source='freee_csv'
+        )
+        return values, messages
+
+
+class KinconeRowMapper(ImportRowMapper):
+    """Kincone交通費CSV"""
+
+    source = "kincone"
+    model = KinconeTransportation
+    amount_field = "amount"
+
+    def __init__(self, calculation_period_id: int, resolver: EmployeeResolver):
+        super().__init__(calculation_period_id, resolver)
+        kincone_date_formats = ("%Y/%m/%d", "%Y-%m-%d")
+        self.parse_start_date = ColumnDateParser(kincone_date_formats)
+        self.parse_end_date = ColumnDateParser(kincone_date_formats)
+
+    def map_row(self, row: Dict[str, str]) -> Tuple[dict, List[str]]:
+        messages: List[str] = []
+
+        employee_number = row.get('従業員番号', '').strip()
+        employee_name = row.get('従業員名', '').strip()
+        employee_id = self._resolve_employee(employee_number, messages)
+
+        # 金額情報
+        transportation_fee = parse_csv_decimal(row.get('交通費', '0'))
+        commuting_fee = parse_csv_decimal(row.get('通勤費', '0'))
+        total_amount = parse_csv_decimal(row.get('総額', '0'))
+
+        # 期間情報
+        start_date = self._parse_date(self.parse_start_date, row.get('集計開始日', ''), '集計開始日', messages)
+        end_date = self._parse_date(self.parse_end_date, row.get('集計終了日', ''), '集計終了日', messages)
+
+        values = dict(
+            calculation_period_id=self.calculation_period_id,
+            employee_id=employee_id,
+            employee_number=employee_number,
+            employee_name=employee_name,
+            usage_date=start_date,  # 集計開始日を使用日として使用
+            departure='',  # CSVに含まれていない
+            destination='',  # CSVに含まれていない
+            transportation_type='',  # CSVに含まれていない
+            amount=total_amount,  # 総額を金額として使用
+            usage_count=parse_csv_int(row.get('利用件数', '1'), default=1),
+            route_info=f'交通費: {transportation_fee}円, 通勤費: {commuting_fee}円',  # 詳細情報として保存
+            purpose=f'{start_date} - {end_date}' if start_date and end_date else '',  # 期間を目的として保存
+            approval_status="pending",
+            data_source='kincone_csv'
+        )
+        return values, messages
+
+
+class AttendanceRowMapper(ImportRowMapper):
+    """勤怠CSV（列名は日本語/英語の両方に対応）"""
+
+    source = "attendance"
+    model = AttendanceRecord
+
+    # (属性名, 日本語列名, 英語列名)
+    TIME_COLUMNS = (
+        ('total_work_time', '総労働時間', 'Total Work Time'),
+        ('regular_work_time', '所定労働時間', 'Regular Work Time'),
+        ('actual_work_time', '実労働時間', 'Actual Work Time'),
+        ('overtime_work_time', '時間外労働時間', 'Overtime Work Time'),
+        ('late_night_work_time', '深夜労働時間', 'Late Night Work Time'),
+        ('holiday_work_time', '休日労働時間', 'Holiday Work Time'),
+    )
+
+    def __init__(self, calculation_period_id: int, resolver: EmployeeResolver):
+        super().__init__(calculation_period_id, resolver)
+        self.parse_period_start = ColumnDateParser()
+        self.parse_period_end = ColumnDateParser()
+
+    def map_row(self, row: Dict[str, str]) -> Tuple[dict, List[str]]:
+        messages: List[str] = []
+
+        employee_number = (row.get('従業員番号') or row.get('Employee Number') or '').strip()
+        employee_name = (row.get('従業員名') or row.get('Employee Name') or '').strip()
+        employee_id = self._resolve_employee(employee_number, messages)
+
+        values = dict(
+            calculation_period_id=self.calculation_period_id,
+            employee_id=employee_id,
+            employee_number=employee_number,
+            employee_name=employee_name,
+            period_start=self._parse_date(
+                self.parse_period_start, row.get('集計開始日') or row.get('Period Start') or '', '集計開始日', messages
+            ),
+            period_end=self._parse_date(
+                self.parse_period_end, row.get('集計終了日') or row.get('Period End') or '', '集計終了日', messages
+            ),
+            work_days=parse_csv_int(row.get('勤務日数') or row.get('Work Days') or '0'),
+            paid_leave_used=parse_csv_decimal(row.get('有給取得日数') or row.get('Paid Leave Used') or '0'),
+            paid_leave_remaining=parse_csv_decimal(row.get('有給残日数') or row.get('Paid Leave Remaining') or '0'),
+            absence_days=parse_csv_int(row.get('欠勤日数') or row.get('Absence Days') or '0'),
+            tardiness_count=parse_csv_int(row.get('遅刻回数') or row.get('Tardiness Count') or '0'),
+            early_leave_count=parse_csv_int(row.get('早退回数') or row.get('Early Leave Count') or '0'),
+            data_source='attendance_csv',
+            # 元のCSVデータを保存（デバッグ用）
+            raw_data=dict(row)
+        )
+
+        # 時間は文字列のまま保存し、形式だけ検証する
+        for field, ja_column, en_column in self.TIME_COLUMNS:
+            value = (row.get(ja_column) or row.get(en_column) or '').strip()
+            if value and value != '-' and parse_duration_seconds(value) is None:
+                messages.append(f"{ja_column}の時間形式が不正です: {value}")
+            values[field] = value
+
+        return values, messages
+
+
+IMPORT_MAPPERS = {
+    FreeeRowMapper.source: FreeeRowMapper,
+    KinconeRowMapper.source: KinconeRowMapper,
+    AttendanceRowMapper.source: AttendanceRowMapper,
+}
+
+
+def build_dry_run_report(
+    rows: Iterable[Dict[str, str]],
+    mapper: ImportRowMapper,
+    encoding: str
+) -> Tuple[CSVImportDryRunReport, List[str]]:
+    """
+    ORMオブジェクトを作らずに全行を変換し、診断結果を返す
+    戻り値: (レポート, 通常インポートと同じ形式のエラー一覧)
+    """
+    diagnostics: List[CSVImportRowDiagnostic] = []
+    errors: List[str] = []
+    total_rows = 0
+    matched_rows = 0
+    total_amount = Decimal('0') if mapper.amount_field else None
+
+    for row_num, row in enumerate(rows, start=2):  # ヘッダー行をスキップ
+        total_rows += 1
+        try:
+            values, messages = mapper.map_row(row)
+        except Exception as e:
+            errors.append(f"行 {row_num}: {str(e)}")
+            diagnostics.append(CSVImportRowDiagnostic(row_number=row_num, status="error", messages=[str(e)]))
+            continue
+
+        if values.get('employee_id') is not None:
+            matched_rows += 1
+        if total_amount is not None:
+            total_amount += values.get(mapper.amount_field) or Decimal('0')
+        if messages:
+            diagnostics.append(CSVImportRowDiagnostic(
+                row_number=row_num,
+                employee_number=values.get('employee_number'),
+                employee_id=values.get('employee_id'),
+                status="warning",
+                messages=messages
+            ))
+
+    report = CSVImportDryRunReport(
+        source=mapper.source,
+        encoding=encoding,
+        total_rows=total_rows,
+        valid_rows=total_rows - len(errors),
+        error_rows=len(errors),
+        matched_rows=matched_rows,
+        unmatched_rows=total_rows - len(errors) - matched_rows,
+        unmatched_employee_numbers=sorted(mapper.resolver.unmatched),
+        total_amount=total_amount,
+        rows=diagnostics
+    )
+    return report, errors
@@ -0,0 +1,129 @@
+"""
+リソースごとのデータバージョン（HTTPキャッシュ用）
+
+書き込み・インポートのたびに (ユーザー, リソース) 単位のカウンタを同じトランザクション内で進め、
+GETエンドポイントはカウンタから弱いETagを計算する。
+If-None-Match が一致すれば本体のテーブルを読まずに 304 を返す。
+全ユーザー分をまとめて返すデータは (リソース, ALL_USERS) を指定すると、ユーザーごとのカウンタを合算したETagになる
+（書き込みはユーザーごとの行だけをロックするため、他のユーザーの書き込みを待たせない）。
+"""
+import logging
+from datetime import datetime
+from typing import Optional, Set, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# リソース名
+CALCULATION_PERIODS = "calculation_periods"  # 全ユーザー共通
+EMPLOYEES = "employees"                      # ユーザー単位
+EXCEL_TEMPLATES = "excel_templates"          # ユーザー単位
+WORK_DATA = "work_data"                      # 勤怠・経費・交通費・社員・期間ロック（ユーザー単位、サマリは ALL_USERS で参照）
+SALARY_CALCULATIONS = "salary_calculations"  # 給与計算結果（Excel生成時に保存、全ユーザー共通）
+
+GLOBAL_SCOPE = 0
+ALL_USERS = -1  # data_etag で全ユーザーのカウンタを合算する指定（bump_data_version には使わない）
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump_data_version(db: Session, resource: str, user_id: int = GLOBAL_SCOPE) -> None:
+    """バージョンを1つ進める（コミットは呼び出し側のトランザクションで行う）"""
+    updated = db.query(DataVersion).filter(
+        DataVersion.user_id == user_id,
+        DataVersion.resource == resource
+    ).update(
+        {DataVersion.version: DataVersion.version + 1, DataVersion.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    if updated:
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(DataVersion(user_id=user_id, resource=resource, version=1, updated_at=datetime.utcnow()))
+    except IntegrityError:
+        # 同時に別のトランザクションが行を作成した場合はもう一度更新する
+        bump_data_version(db, resource, user_id)
+
+
+def _stamp(updated_at: Optional[datetime]) -> int:
+    return int(updated_at.timestamp() * 1000000) if updated_at else 0
+
+
+def _all_users_versions(db: Session, resources: Set[str]) -> dict:
+    """リソースごとの全ユーザー分のカウンタの合算（行数・バージョンの合計・最終更新時刻）"""
+    if not resources:
+        return {}
+    rows = db.query(
+        DataVersion.resource, func.count(), func.sum(DataVersion.version), func.max(DataVersion.updated_at)
+    ).filter(DataVersion.resource.in_(resources)).group_by(DataVersion.resource).all()
+    return {resource: (count, total or 0, updated_at) for resource, count, total, updated_at in rows}
+
+
+def data_etag(db: Session, *keys: Tuple[str, int]) -> str:
+    """(リソース, ユーザーID) の組からETagを計算（ユーザーIDが ALL_USERS の組は合算、各1クエリ）"""
+    user_keys = [(resource, user_id) for resource, user_id in keys if user_id != ALL_USERS]
+    versions = {}
+    if user_keys:
+        rows = db.query(
+            DataVersion.resource, DataVersion.user_id, DataVersion.version, DataVersion.updated_at
+        ).filter(
+            or_(*(and_(DataVersion.resource == resource, DataVersion.user_id == user_id) for resource, user_id in user_keys))
+        ).all()
+        versions = {(row.resource, row.user_id): row for row in rows}
+    totals = _all_users_versions(db, {resource for resource, user_id in keys if user_id == ALL_USERS})
+
+    parts = []
+    for resource, user_id in keys:
+        if user_id == ALL_USERS:
+            count, total, updated_at = totals.get(resource, (0, 0, None))
+            parts.append(f"{resource}.all.{count}.{total}.{_stamp(updated_at):x}")
+            continue
+        row = versions.get((resource, user_id))
+        if row is None:
+            parts.append(f"{resource}.{user_id}.0")
+        else:
+            # DBを作り直してもETagが一致しないよう更新時刻も含める
+            parts.append(f"{resource}.{user_id}.{row.version}.{_stamp(row.updated_at):x}")
+    return f'W/"{"-".join(parts)}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 弱い比較（W/ の有無は無視）
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified_response(
+    request: Request,
+    response: Response,
+    db: Session,
+    *keys: Tuple[str, int]
+) -> Optional[Response]:
+    """
+    If-None-Match がETagと一致すれば 304 レスポンスを返す
+    一致しなければ response にETagを設定して None を返す（呼び出し側で本体を取得する）
+    """
+    etag = data_etag(db, *keys)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
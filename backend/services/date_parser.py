@@ -0,0 +1,81 @@
+"""
+CSVインポート用の日付パーサー
+
+月次エクスポートに含まれる日付は高々31種類程度なので、解析結果をLRUキャッシュに保持する。
+ColumnDateParser は列ごとに最初に解析できた値から書式を確定し、以降はその書式を先に試す。
+（毎セルで誤った書式の ValueError を経由しない）
+"""
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+
+DATE_CACHE_SIZE = 1024
+
+# 既定の試行順（ISO形式 → Freee/Kincone形式）
+DEFAULT_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d")
+
+# 固定幅（YYYY?MM?DD）で解析できる書式と区切り文字
+_FIXED_WIDTH_SEPARATORS: Dict[str, str] = {
+    "%Y-%m-%d": "-",
+    "%Y/%m/%d": "/",
+}
+
+
+def _parse_fixed_width(value: str, separator: str) -> Optional[date]:
+    """YYYY?MM?DD 形式を strptime を使わずに解析"""
+    if len(value) != 10 or value[4] != separator or value[7] != separator:
+        return None
+    year, month, day = value[:4], value[5:7], value[8:]
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return None
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value: str, date_format: str) -> Optional[date]:
+    """日付文字列を指定書式で解析（解析できない場合はNone）"""
+    separator = _FIXED_WIDTH_SEPARATORS.get(date_format)
+    if separator is not None:
+        result = _parse_fixed_width(value, separator)
+        if result is not None:
+            return result
+
+    # ゼロ埋めなし（2024/1/5）などは strptime にフォールバック
+    try:
+        return datetime.strptime(value, date_format).date()
+    except ValueError:
+        return None
+
+
+class ColumnDateParser:
+    """列単位で書式を自動判定する日付パーサー"""
+
+    def __init__(self, formats: Sequence[str] = DEFAULT_DATE_FORMATS):
+        self.formats = tuple(formats)
+        self.detected_format: Optional[str] = None
+
+    def __call__(self, value: Optional[str]) -> Optional[date]:
+        if not value:
+            return None
+        value = value.strip()
+        if not value:
+            return None
+
+        if self.detected_format is not None:
+            result = parse_date(value, self.detected_format)
+            if result is not None:
+                return result
+
+        for date_format in self.formats:
+            if date_format == self.detected_format:
+                continue
+            result = parse_date(value, date_format)
+            if result is not None:
+                if self.detected_format is None:
+                    self.detected_format = date_format
+                return result
+
+        return None
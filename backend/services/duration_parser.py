@@ -0,0 +1,131 @@
+"""
+勤務時間文字列の共通パーサー
+CSVインポートとPayrollServiceで共有する
+
+対応形式:
+    "144:57"              HH:MM（時間は3桁以上も可）
+    "142:02:00"           HHH:MM:SS（PostgreSQL INTERVALの文字列表現）
+    "1 day 02:00:00"      日数付きINTERVAL
+    "142 hours 2 minutes" テキスト形式
+    "8.5"                 数値のみ（時間として扱う）
+
+勤怠CSVは "00:00" や "144:00" のような同じ値が大量に繰り返されるため、
+解析結果（整数秒）を有界のLRUキャッシュに保持する。
+"""
+import re
+from datetime import timedelta
+from functools import lru_cache
+from typing import Optional
+
+DURATION_CACHE_SIZE = 4096
+
+_EMPTY_VALUES = frozenset(("", "-"))
+_DAYS_PREFIX = re.compile(r'^(-?\d+)\s+days?\s+(.+)$', re.IGNORECASE)
+_TEXT_HOURS = re.compile(r'(\d+)\s*(?:hours?|hrs?|h)', re.IGNORECASE)
+_TEXT_MINUTES = re.compile(r'(\d+)\s*(?:minutes?|mins?|m)', re.IGNORECASE)
+_TEXT_SECONDS = re.compile(r'(\d+)\s*(?:seconds?|secs?|s)', re.IGNORECASE)
+
+
+def _parse_clock_seconds(value: str) -> Optional[int]:
+    """HH:MM / HHH:MM:SS を整数秒に変換（正規表現を使わない高速パス）"""
+    negative = value.startswith('-')
+    if negative:
+        value = value[1:]
+
+    parts = value.split(':')
+    if len(parts) > 3:
+        return None
+
+    # 秒に小数が含まれる場合（"00:00:30.5"）は切り捨て
+    if len(parts) == 3 and '.' in parts[2]:
+        parts[2] = parts[2].split('.', 1)[0]
+
+    if not all(part.isdigit() for part in parts):
+        return None
+
+    seconds = int(parts[0]) * 3600 + int(parts[1]) * 60
+    if len(parts) == 3:
+        seconds += int(parts[2])
+    return -seconds if negative else seconds
+
+
+def _parse_text_seconds(value: str) -> Optional[int]:
+    """"142 hours 2 minutes" のようなテキスト形式を整数秒に変換"""
+    hours_match = _TEXT_HOURS.search(value)
+    minutes_match = _TEXT_MINUTES.search(value)
+    seconds_match = _TEXT_SECONDS.search(value)
+    if not (hours_match or minutes_match or seconds_match):
+        return None
+
+    hours = int(hours_match.group(1)) if hours_match else 0
+    minutes = int(minutes_match.group(1)) if minutes_match else 0
+    seconds = int(seconds_match.group(1)) if seconds_match else 0
+    return hours * 3600 + minutes * 60 + seconds
+
+
+@lru_cache(maxsize=DURATION_CACHE_SIZE)
+def parse_duration_seconds(value: str) -> Optional[int]:
+    """
+    時間文字列を整数秒に変換
+    空文字・"-"・解析できない値はNone
+    """
+    value = value.strip()
+    if value in _EMPTY_VALUES:
+        return None
+
+    if ':' in value:
+        days_match = _DAYS_PREFIX.match(value)
+        if days_match:
+            clock_seconds = _parse_clock_seconds(days_match.group(2))
+            if clock_seconds is None:
+                return None
+            return int(days_match.group(1)) * 86400 + clock_seconds
+        return _parse_clock_seconds(value)
+
+    # 数値のみの場合は時間として扱う
+    try:
+        hours = float(value)
+    except ValueError:
+        return _parse_text_seconds(value)
+    try:
+        return round(hours * 3600)
+    except (ValueError, OverflowError):
+        # nan / inf
+        return None
+
+
+def parse_duration_minutes(value: Optional[str]) -> Optional[int]:
+    """時間文字列を分（int、端数切り捨て）に変換"""
+    if not value:
+        return None
+    seconds = parse_duration_seconds(value)
+    if seconds is None:
+        return None
+    return int(seconds / 60)
+
+
+def parse_duration_hours(value: Optional[str]) -> float:
+    """時間文字列を時間（float）に変換（解析できない場合は0.0）"""
+    if not value:
+        return 0.0
+    seconds = parse_duration_seconds(value)
+    if seconds is None:
+        return 0.0
+    return seconds / 3600
+
+
+def parse_duration_timedelta(value: Optional[str]) -> Optional[timedelta]:
+    """時間文字列をtimedeltaに変換"""
+    if not value:
+        return None
+    seconds = parse_duration_seconds(value)
+    if seconds is None:
+        return None
+    return timedelta(seconds=seconds)
+
+
+def format_minutes_hm(total_minutes: int) -> str:
+    """分（int）を H:MM 形式の文字列に変換"""
+    sign = "-" if total_minutes < 0 else ""
+    hours, minutes = divmod(abs(total_minutes), 60)
+    return f"{sign}{hours}:{minutes:02d}"
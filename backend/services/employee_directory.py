@@ -0,0 +1,177 @@
+"""
+ユーザーごとの社員ディレクトリ（プロセス内キャッシュ）
+
+社員一覧・CSVインポートの社員番号解決などで、同じユーザーの社員テーブルを毎回読み直さないよう、
+社員の主要項目をユーザー単位でキャッシュする。
+
+キャッシュは data_versions の社員バージョン（社員の書き込み時に同じトランザクションで進む）と
+一緒に保持し、バージョンが変わっていれば読み直す。バージョンの確認は1行の主キー相当の参照で、
+EMPLOYEE_DIRECTORY_REVALIDATE_SECONDS 秒以内は確認も省略する（0 なら毎回確認）。
+同じプロセス内の社員の書き込みは invalidate_employee_directory() で即座に破棄する。
+ディレクトリの version は依存するキャッシュのキーとして使える。
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.fast_json import dumps
+from models import DataVersion, Employee
+from services.data_versions import EMPLOYEES
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_employee_number(employee_number: Optional[str]) -> Optional[str]:
+    """"006" と "6" のような表記ゆれを吸収した社員番号（数値でなければそのまま）"""
+    if employee_number is None:
+        return None
+    employee_number = employee_number.strip()
+    try:
+        return str(int(employee_number))
+    except ValueError:
+        return employee_number
+
+
+@dataclass(frozen=True)
+class EmployeeEntry:
+    id: int
+    user_id: int
+    employee_number: Optional[str]
+    normalized_number: Optional[str]
+    name: Optional[str]
+    hire_date: Optional[date]
+    resignation_date: Optional[date]
+    kiwi_name: Optional[str]
+    remote_allowance: bool
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+# EmployeeResponse と同じ項目（社員一覧のレスポンスに使う）
+_RESPONSE_FIELDS = (
+    "employee_number", "name", "hire_date", "resignation_date", "kiwi_name",
+    "remote_allowance", "is_active", "id", "user_id", "created_at", "updated_at",
+)
+
+
+@dataclass
+class EmployeeDirectory:
+    """ユーザーの社員一覧（読み取り専用として扱う）"""
+    user_id: int
+    version: int
+    entries: Tuple[EmployeeEntry, ...]
+    version_updated_at: Optional[datetime] = None  # DBを作り直した場合にバージョン番号の重複を区別する
+    by_number: Dict[str, int] = field(default_factory=dict)
+    by_normalized: Dict[str, int] = field(default_factory=dict)
+    ids: FrozenSet[int] = frozenset()
+    checked_at: float = 0.0
+    _response_body: Optional[bytes] = None
+
+    def __post_init__(self):
+        for entry in self.entries:
+            if entry.employee_number is None:
+                continue
+            self.by_number.setdefault(entry.employee_number, entry.id)
+            self.by_normalized.setdefault(entry.normalized_number, entry.id)
+        self.ids = frozenset(entry.id for entry in self.entries)
+
+    def resolve(self, employee_number: Optional[str], numeric_fallback: bool = True) -> Optional[int]:
+        """社員番号から社員IDを取得（完全一致 → 表記ゆれを吸収した一致の順）"""
+        if not employee_number:
+            return None
+        employee_id = self.by_number.get(employee_number)
+        if employee_id is None and numeric_fallback:
+            employee_id = self.by_normalized.get(normalize_employee_number(employee_number))
+        return employee_id
+
+    def response_body(self) -> bytes:
+        """社員一覧APIのJSON（初回のみエンコード）"""
+        if self._response_body is None:
+            self._response_body = dumps([
+                {name: getattr(entry, name) for name in _RESPONSE_FIELDS} for entry in self.entries
+            ])
+        return self._response_body
+
+
+_directories: Dict[int, EmployeeDirectory] = {}
+_lock = threading.Lock()
+
+
+def _current_version(db: Session, user_id: int) -> Tuple[int, Optional[datetime]]:
+    row = db.query(DataVersion.version, DataVersion.updated_at).filter(
+        DataVersion.user_id == user_id,
+        DataVersion.resource == EMPLOYEES
+    ).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def _load_directory(db: Session, user_id: int, version: Tuple[int, Optional[datetime]]) -> EmployeeDirectory:
+    employees = db.query(
+        Employee.id, Employee.user_id, Employee.employee_number, Employee.name,
+        Employee.hire_date, Employee.resignation_date, Employee.kiwi_name,
+        Employee.remote_allowance, Employee.is_active, Employee.created_at, Employee.updated_at
+    ).filter(Employee.user_id == user_id).order_by(Employee.id).all()
+
+    entries = tuple(
+        EmployeeEntry(
+            id=row.id,
+            user_id=row.user_id,
+            employee_number=row.employee_number,
+            normalized_number=normalize_employee_number(row.employee_number),
+            name=row.name,
+            hire_date=row.hire_date,
+            resignation_date=row.resignation_date,
+            kiwi_name=row.kiwi_name,
+            remote_allowance=bool(row.remote_allowance),
+            is_active=bool(row.is_active),
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+        )
+        for row in employees
+    )
+    logger.debug(f"Employee directory loaded for user {user_id}: version={version[0]}, {len(entries)} employees")
+    return EmployeeDirectory(
+        user_id=user_id,
+        version=version[0],
+        version_updated_at=version[1],
+        entries=entries,
+        checked_at=time.monotonic()
+    )
+
+
+def get_employee_directory(db: Session, user_id: int) -> EmployeeDirectory:
+    """ユーザーの社員ディレクトリ（バージョンが変わっていなければキャッシュを返す）"""
+    with _lock:
+        directory = _directories.get(user_id)
+
+    now = time.monotonic()
+    if directory is not None and now - directory.checked_at < settings.EMPLOYEE_DIRECTORY_REVALIDATE_SECONDS:
+        return directory
+
+    # バージョンを先に読む（読み込み中に書き込まれても次回の確認で読み直される）
+    version = _current_version(db, user_id)
+    if directory is not None and (directory.version, directory.version_updated_at) == version:
+        directory.checked_at = now
+        return directory
+
+    directory = _load_directory(db, user_id, version)
+    with _lock:
+        _directories[user_id] = directory
+    return directory
+
+
+def invalidate_employee_directory(user_id: Optional[int] = None) -> None:
+    """社員の書き込み後にキャッシュを破棄（user_id 省略時は全ユーザー）"""
+    with _lock:
+        if user_id is None:
+            _directories.clear()
+        else:
+            _directories.pop(user_id, None)
+
@@ -0,0 +1,175 @@
+"""
+社員マスタの一括アップサート
+
+社員番号をキーに INSERT ... ON CONFLICT (employee_number) DO UPDATE で反映する。
+既存の社員は行を削除せずに更新するため、IDが変わらず勤怠・経費などの外部キーも保たれる。
+事前に対象の社員番号をまとめて読み込み、追加・更新・変更なしを判定して
+変更のある行だけを書き込む（バッチ単位で1〜2クエリ）。
+"""
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Employee
+from schemas import EmployeeImportResponse
+from services.data_versions import EMPLOYEES, WORK_DATA, bump_data_version
+
+logger = logging.getLogger(__name__)
+
+UPSERT_BATCH_SIZE = 1000
+
+# CSVの列名 → 社員の属性（社員情報.csv の形式）
+NUMBER_COLUMN = "社員番号"
+NAME_COLUMNS = ("給与計算氏名", "氏名")
+KIWI_NAME_COLUMN = "Kiwi氏名"
+REMOTE_ALLOWANCE_COLUMN = "リモート手当上限なし"
+
+# アップサートで更新する列（CSVに無い列は既存の値を保持）
+UPSERT_FIELDS = ("name", "kiwi_name", "remote_allowance")
+
+# 任意の列 → 社員の属性（ヘッダーに列がある場合のみ読み込む）
+OPTIONAL_COLUMNS = {
+    KIWI_NAME_COLUMN: "kiwi_name",
+    REMOTE_ALLOWANCE_COLUMN: "remote_allowance",
+}
+
+
+def parse_employee_csv(content: str) -> Tuple[List[dict], List[str]]:
+    """
+    社員CSVを社員属性の dict に変換（エラーは行番号付きで返す）
+    ヘッダーに無い任意の列は dict に含めない（アップサートで既存の値を保持する）
+    """
+    rows = []
+    errors = []
+    seen: Dict[str, int] = {}
+
+    reader = csv.DictReader(io.StringIO(content))
+    header = set(reader.fieldnames or [])
+    optional_fields = {field for column, field in OPTIONAL_COLUMNS.items() if column in header}
+
+    for row_num, row in enumerate(reader, start=2):
+        employee_number = (row.get(NUMBER_COLUMN) or "").strip()
+        name = next((row[column].strip() for column in NAME_COLUMNS if (row.get(column) or "").strip()), "")
+
+        if not employee_number:
+            errors.append(f"行 {row_num}: 社員番号がありません")
+            continue
+        if not name:
+            errors.append(f"行 {row_num}: 氏名がありません")
+            continue
+        if employee_number in seen:
+            errors.append(f"行 {row_num}: 社員番号 {employee_number} が行 {seen[employee_number]} と重複しています")
+            continue
+        seen[employee_number] = row_num
+
+        employee = {"employee_number": employee_number, "name": name}
+        if "kiwi_name" in optional_fields:
+            employee["kiwi_name"] = (row.get(KIWI_NAME_COLUMN) or "").strip() or None
+        if "remote_allowance" in optional_fields:
+            # リモート手当の判定（'x'がある場合はTrue）
+            employee["remote_allowance"] = (row.get(REMOTE_ALLOWANCE_COLUMN) or "").strip() == "x"
+        rows.append(employee)
+
+    return rows, errors
+
+
+def _insert_statement(db: Session):
+    """方言ごとの INSERT（ON CONFLICT は PostgreSQL と SQLite で利用可能）"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"{dialect} は社員の一括アップサートに対応していません")
+    return insert(Employee)
+
+
+def _upsert_batch(db: Session, user_id: int, rows: List[dict], fields: Tuple[str, ...], now: datetime) -> None:
+    stmt = _insert_statement(db)
+    stmt = stmt.values([
+        dict({"is_active": True}, **row, user_id=user_id, created_at=now, updated_at=now) for row in rows
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Employee.employee_number],
+        set_={**{field: stmt.excluded[field] for field in fields}, "updated_at": now},
+        # 他のユーザーの社員は更新しない（事前判定後に作成された場合の保険）
+        where=Employee.user_id == user_id
+    )
+    db.execute(stmt)
+
+
+def upsert_employees(
+    db: Session,
+    user_id: int,
+    rows: List[dict],
+    deactivate_missing: bool = False
+) -> EmployeeImportResponse:
+    """
+    社員を社員番号で一括アップサート（コミットは呼び出し側）
+    deactivate_missing=True の場合、CSVに無いユーザーの社員を無効化し（削除はしない）、
+    CSVにある社員は有効に戻す（行が無い場合は全社員を無効化しないよう ValueError）
+    更新するのは行に含まれる列のみ（CSVに無い列は既存の値を保持）
+    """
+    if deactivate_missing and not rows:
+        raise ValueError("社員の行が無いCSVでは、CSVに無い社員の無効化は実行できません")
+
+    result = EmployeeImportResponse(total_rows=len(rows), success=True)
+    now = datetime.utcnow()
+    present = set(rows[0]) if rows else set()
+    fields = tuple(field for field in UPSERT_FIELDS if field in present)
+    if deactivate_missing:
+        fields += ("is_active",)
+        rows = [dict(row, is_active=True) for row in rows]
+
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[start:start + UPSERT_BATCH_SIZE]
+        existing = {
+            employee.employee_number: employee
+            for employee in db.query(
+                Employee.employee_number, Employee.user_id, *(getattr(Employee, field) for field in fields)
+            ).filter(Employee.employee_number.in_([row["employee_number"] for row in batch]))
+        }
+
+        changed = []
+        for row in batch:
+            current = existing.get(row["employee_number"])
+            if current is None:
+                result.inserted_count += 1
+            elif current.user_id != user_id:
+                result.conflicts.append(row["employee_number"])
+                continue
+            elif all(getattr(current, field) == row[field] for field in fields):
+                result.unchanged_count += 1
+                continue
+            else:
+                result.updated_count += 1
+            changed.append(row)
+
+        if changed:
+            _upsert_batch(db, user_id, changed, fields, now)
+
+    if deactivate_missing:
+        numbers = [row["employee_number"] for row in rows]
+        result.deactivated_count = db.query(Employee).filter(
+            Employee.user_id == user_id,
+            Employee.is_active == True,
+            Employee.employee_number.notin_(numbers)
+        ).update({Employee.is_active: False, Employee.updated_at: now}, synchronize_session=False)
+
+    if result.inserted_count or result.updated_count or result.deactivated_count:
+        bump_data_version(db, EMPLOYEES, user_id)
+        bump_data_version(db, WORK_DATA, user_id)
+
+    if result.conflicts:
+        logger.warning("他のユーザーが使用中の社員番号をスキップしました: %s", result.conflicts)
+    logger.info(
+        f"Employee upsert for user {user_id}: inserted={result.inserted_count}, "
+        f"updated={result.updated_count}, unchanged={result.unchanged_count}, "
+        f"deactivated={result.deactivated_count}, conflicts={len(result.conflicts)}"
+    )
+    return result
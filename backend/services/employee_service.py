@@ -1,16 +1,58 @@
 from fastapi import HTTPException
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from models import User, Employee
+from services.employee_directory import get_employee_directory
 
 def get_user_employee(db: Session, user: User) -> Employee:
     """ユーザーの最初の従業員を取得（簡素化版）"""
-    employee = db.query(Employee).filter(Employee.user_id == user.id).first()
+    employee = get_user_employee_optional(db, user)
     if not employee:
         raise HTTPException(status_code=400, detail="従業員情報が見つかりません")
     return employee
 
 def get_user_employee_optional(db: Session, user: User) -> Optional[Employee]:
-    """ユーザーの最初の従業員を取得（Optional版）"""
-    return db.query(Employee).filter(Employee.user_id == user.id).first()
\ No newline at end of file
+    """ユーザーの最初の従業員を取得（Optional版、社員ディレクトリから主キーで取得）"""
+    directory = get_employee_directory(db, user.id)
+    if not directory.entries:
+        return None
+    return db.get(Employee, directory.entries[0].id)
+
+def user_employee_ids(user_id: int):
+    """ユーザーの社員IDを返すサブクエリ（IN句用、Pythonのリストに展開しない）"""
+    return select(Employee.id).where(Employee.user_id == user_id)
+
+def owned_by_user(model, user_id: int, include_unassigned: bool = False):
+    """ユーザーの社員に紐づく行の絞り込み条件（include_unassigned で employee_id が Null の行も含める）"""
+    condition = model.employee_id.in_(user_employee_ids(user_id))
+    if include_unassigned:
+        condition = or_(condition, model.employee_id.is_(None))
+    return condition
+
+def get_owned_record(
+    db: Session,
+    model,
+    record_id: int,
+    user_id: int,
+    not_found_detail: str,
+    allow_unassigned: bool = False
+):
+    """
+    社員を結合して1クエリでレコードと所有者を取得
+    存在しなければ404、他ユーザーの社員のレコードなら403（allow_unassigned で社員未割当は許可）
+    """
+    row = db.query(model, Employee.user_id).outerjoin(
+        Employee, Employee.id == model.employee_id
+    ).filter(model.id == record_id).first()
+    
+    if row is None:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    
+    record, owner_user_id = row
+    if allow_unassigned and record.employee_id is None:
+        return record
+    if owner_user_id != user_id:
+        raise HTTPException(status_code=403, detail="アクセス権限がありません")
+    return record
@@ -0,0 +1,118 @@
+"""
+ファクトテーブル（勤怠・Freee経費・Kincone交通費）のストリーミングエクスポート
+
+サーバーサイドカーソル（yield_per）で EXPORT_BATCH_SIZE 行ずつ取得し、
+NDJSON または CSV に変換してそのままレスポンスに流す。全件をメモリに載せないため、
+行数に関わらずメモリ使用量は一定で、最初のバッチを取得した時点で送信が始まる。
+
+リクエストのセッションはレスポンス送信前に閉じられるため、
+ジェネレータは送信中だけ読み取り用の専用セッションを使う。
+"""
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Callable, Iterator, List, Type
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Query, Session
+
+from core.config import settings
+from core.fast_json import dumps
+from database import ReadSessionLocal
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def export_columns(model, schema: Type[BaseModel]) -> List[str]:
+    """レスポンススキーマと同じ列（一覧APIと同じ項目を出力する）"""
+    return [name for name in schema.model_fields if hasattr(model, name)]
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode("utf-8")
+    if isinstance(value, datetime):
+        return value.isoformat()  # NDJSONと同じ表記
+    return value
+
+
+def _iter_rows(build_query: Callable[[Session], Query], model, columns: List[str], batch_size: int):
+    """専用セッションでサーバーサイドカーソルから行を取得"""
+    db = ReadSessionLocal()
+    try:
+        query = build_query(db).with_entities(*(getattr(model, name) for name in columns))
+        for row in query.yield_per(batch_size):
+            yield row
+    finally:
+        db.close()
+
+
+def _ndjson_chunks(rows, columns: List[str], batch_size: int) -> Iterator[bytes]:
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(dict(zip(columns, row))))
+        if len(chunk) >= batch_size:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def _csv_chunks(rows, columns: List[str], batch_size: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # Excelで開けるようBOM付きUTF-8。ヘッダーは最初のバッチを待たずに送る
+    writer.writerow(columns)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        count += 1
+        if count >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    if count:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_export(
+    build_query: Callable[[Session], Query],
+    model,
+    schema: Type[BaseModel],
+    export_format: str,
+    file_stem: str
+) -> StreamingResponse:
+    """
+    build_query(セッション) で作ったクエリの結果をストリーミングで返す
+    build_query はリクエストのセッションではなくエクスポート用セッションを受け取る
+    """
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format は ndjson または csv を指定してください")
+
+    batch_size = settings.EXPORT_BATCH_SIZE
+    columns = export_columns(model, schema)
+    rows = _iter_rows(build_query, model, columns, batch_size)
+    chunks = _ndjson_chunks if export_format == "ndjson" else _csv_chunks
+
+    logger.info(f"Export started: {file_stem}.{export_format}")
+    return StreamingResponse(
+        chunks(rows, columns, batch_size),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{file_stem}.{export_format}"'}
+    )
@@ -0,0 +1,192 @@
+"""
+生成ファイルの管理（保存・検索・保持期間によるGC）
+
+給与計算Excelは services.artifact_store の保存先に置き、generated_files テーブルに1行記録する。
+GCは次のファイルを削除する（ロックした期間のスナップショットが参照するファイルは残す）。
+    - GENERATED_FILE_RETENTION_DAYS 日より前に生成したファイル
+    - 新しい順に GENERATED_FILE_MAX_COUNT 件を超えたファイル
+    - 保存先にあるが generated_files に無いファイル
+      （生成後にロールバックされたものは1日後、以前の output_files 直下のファイルは保持日数の経過後）
+GENERATED_FILE_GC_INTERVAL_SECONDS 秒ごとにバックグラウンドのスレッドで実行する
+（スレッドはワーカープロセスごとに起動するが、PostgreSQL ではアドバイザリロックで同時に1つだけ実行する）。
+
+生成時の入力のフィンガープリントを input_fingerprint に記録し、同じ入力の生成では保存済みのファイルを返す。
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models import GeneratedFile, PeriodSnapshot
+from services.artifact_store import artifact_key, get_artifact_store
+
+logger = logging.getLogger(__name__)
+
+ORPHAN_GRACE = timedelta(days=1)
+
+GC_LOCK_KEY = 0x67656E66  # PostgreSQL のアドバイザリロックのキー（"genf"）
+
+
+def store_generated_file(
+    db: Session,
+    data: bytes,
+    file_name: str,
+    sha256: str,
+    calculation_period_id: int,
+    template_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    input_fingerprint: Optional[str] = None
+) -> GeneratedFile:
+    """ファイルを保存先に書き込み、generated_files に記録（コミットは呼び出し側）"""
+    store = get_artifact_store()
+    key = artifact_key(file_name, sha256)
+    store.save(key, data)
+
+    generated_file = GeneratedFile(
+        file_name=file_name,
+        storage_backend=store.backend,
+        storage_key=key,
+        file_size=len(data),
+        sha256=sha256,
+        input_fingerprint=input_fingerprint,
+        calculation_period_id=calculation_period_id,
+        template_id=template_id,
+        created_by_user_id=user_id
+    )
+    db.add(generated_file)
+    db.flush()
+    return generated_file
+
+
+def find_generated_file(db: Session, file_name: str) -> Optional[GeneratedFile]:
+    return db.query(GeneratedFile).filter(GeneratedFile.file_name == file_name).first()
+
+
+def find_reusable_generated_file(db: Session, input_fingerprint: str) -> Optional[GeneratedFile]:
+    """同じ入力で生成した最新のファイル（保存先から消えているものは使わない）"""
+    store = get_artifact_store()
+    generated_file = db.query(GeneratedFile).filter(
+        GeneratedFile.input_fingerprint == input_fingerprint,
+        GeneratedFile.storage_backend == store.backend
+    ).order_by(GeneratedFile.created_at.desc(), GeneratedFile.id.desc()).first()
+    if generated_file is None or not store.exists(generated_file.storage_key):
+        return None
+    return generated_file
+
+
+def _protected_file_names(db: Session) -> Set[str]:
+    """スナップショットが参照するファイル（ロック中の期間の確定版）"""
+    return {
+        file_name for (file_name,) in db.query(PeriodSnapshot.workbook_file_name).filter(
+            PeriodSnapshot.workbook_file_name.isnot(None)
+        )
+    }
+
+
+def _try_gc_lock(db: Session) -> bool:
+    """
+    他のワーカープロセスのGCと同時に実行しない
+    PostgreSQL はトランザクション単位のアドバイザリロック（コミットで解放）、それ以外のDBは常に True
+    （記録の削除は一括の DELETE のため、重なっても失敗しない）
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": GC_LOCK_KEY}).scalar())
+
+
+def collect_garbage(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    保持期間・保持件数を超えたファイルと管理外のファイルを削除し、種類ごとの件数を返す
+    記録の削除をコミットしてから保存先のファイルを削除する（コミットに失敗してもファイルは残る）
+    """
+    now = now or datetime.utcnow()
+    counts = {"expired": 0, "over_limit": 0, "orphaned": 0}
+    if not _try_gc_lock(db):
+        db.rollback()
+        logger.info("Generated file GC skipped: another worker is running it")
+        return counts
+
+    store = get_artifact_store()
+    protected = _protected_file_names(db)
+    columns = (GeneratedFile.id, GeneratedFile.file_name, GeneratedFile.storage_backend, GeneratedFile.storage_key)
+    doomed: Dict[int, Tuple[str, str]] = {}  # id → (保存先, キー)
+
+    if settings.GENERATED_FILE_RETENTION_DAYS > 0:
+        cutoff = now - timedelta(days=settings.GENERATED_FILE_RETENTION_DAYS)
+        for file_id, file_name, backend, key in db.query(*columns).filter(GeneratedFile.created_at < cutoff):
+            if file_name not in protected:
+                doomed[file_id] = (backend, key)
+                counts["expired"] += 1
+
+    if settings.GENERATED_FILE_MAX_COUNT > 0:
+        overflow = db.query(*columns).order_by(
+            GeneratedFile.created_at.desc(), GeneratedFile.id.desc()
+        ).offset(settings.GENERATED_FILE_MAX_COUNT)
+        for file_id, file_name, backend, key in overflow:
+            if file_id not in doomed and file_name not in protected:
+                doomed[file_id] = (backend, key)
+                counts["over_limit"] += 1
+
+    known = {
+        key for (key,) in db.query(GeneratedFile.storage_key).filter(GeneratedFile.storage_backend == store.backend)
+    }
+    legacy_grace = timedelta(days=settings.GENERATED_FILE_RETENTION_DAYS) if settings.GENERATED_FILE_RETENTION_DAYS > 0 else None
+    orphaned = []
+    for key, modified_at in list(store.list_keys()):
+        if key in known or key.rsplit("/", 1)[-1] in protected:
+            continue
+        grace = ORPHAN_GRACE if "/" in key else legacy_grace
+        if grace is not None and modified_at < now - grace:
+            orphaned.append(key)
+    counts["orphaned"] = len(orphaned)
+
+    if doomed:
+        db.query(GeneratedFile).filter(GeneratedFile.id.in_(list(doomed))).delete(synchronize_session=False)
+    db.commit()
+
+    for backend, key in doomed.values():
+        if backend == store.backend:
+            store.delete(key)
+    for key in orphaned:
+        store.delete(key)
+
+    if any(counts.values()):
+        logger.info(f"Generated file GC: {counts}")
+    return counts
+
+
+_gc_thread: Optional[threading.Thread] = None
+_gc_stop = threading.Event()
+
+
+def _gc_loop() -> None:
+    from database import SessionLocal
+
+    while not _gc_stop.wait(settings.GENERATED_FILE_GC_INTERVAL_SECONDS):
+        db = SessionLocal()
+        try:
+            collect_garbage(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"生成ファイルのGCに失敗しました: {e}")
+        finally:
+            db.close()
+
+
+def start_generated_file_gc() -> bool:
+    """GCのスレッドを開始（間隔が 0 なら開始しない）"""
+    global _gc_thread
+    if settings.GENERATED_FILE_GC_INTERVAL_SECONDS <= 0 or (_gc_thread and _gc_thread.is_alive()):
+        return False
+    _gc_stop.clear()
+    _gc_thread = threading.Thread(target=_gc_loop, name="generated-file-gc", daemon=True)
+    _gc_thread.start()
+    return True
+
+
+def stop_generated_file_gc() -> None:
+    _gc_stop.set()
@@ -0,0 +1,398 @@
+"""
+CSVインポートジョブ
+アップロードをディスクに一時保存してジョブIDを返し、ワーカースレッドでバッチ単位に取り込む
+
+- 各バッチの挿入とチェックポイント（コミット済みの最終CSV行番号）の更新は同じトランザクションで行う
+- プロセス再起動時は、待機中のジョブと、ハートビートが途絶えた実行中ジョブをチェックポイントから再開する。
+  同じホストで終了したプロセス（再起動前の自分を含む）が実行中のまま残したジョブは、ハートビートを待たずに再開する
+- 実行中のまま止まったジョブは IMPORT_JOB_STALE_SECONDS ごとの定期確認でも再開する（クライアントの取得を待たない）
+- チェックポイント・ハートビート・完了の更新は worker_id が自分のままの場合のみ行う。
+  別のワーカーに引き継がれていれば、そのバッチをロールバックして処理をやめる（同じ行を二重に取り込まない）
+- ハートビートはバッチのコミットに加えて、読み込み中も IMPORT_JOB_STALE_SECONDS の 1/3 ごとに更新する
+- 同期インポートと異なり全件ロールバックは行わない（変換できない行はエラーとして記録しスキップ）。
+  事前の検証には import-csv の dry_run を使う
+"""
+import csv
+import io
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import IMPORT_DURATION, IMPORT_FAILURES, IMPORT_ROWS, IMPORT_ROWS_PER_SECOND
+from database import SessionLocal
+from models import ImportJob
+from services.csv_import import IMPORT_MAPPERS, EmployeeResolver, detect_csv_encoding
+from services.data_versions import WORK_DATA, bump_data_version
+
+logger = logging.getLogger(__name__)
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+ENCODING_SAMPLE_SIZE = 1024 * 1024
+MAX_STORED_ERRORS = 100
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# プロセスの起動ごとに変わるID（PIDが再起動前と同じでも前のプロセスと区別する）
+_BOOT_ID = uuid.uuid4().hex[:12]
+
+
+class JobOwnershipLost(Exception):
+    """実行中のジョブが別のワーカーに引き継がれた"""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_WORKERS, thread_name_prefix="import-job")
+    return _executor
+
+
+async def spool_upload(file: UploadFile) -> str:
+    """アップロードファイルをチャンク単位でディスクに書き出し、パスを返す"""
+    os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+    spool_path = os.path.join(settings.IMPORT_SPOOL_DIR, f"{uuid.uuid4().hex}.csv")
+
+    with open(spool_path, "wb") as f:
+        while True:
+            chunk = await file.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+
+    return spool_path
+
+
+def create_import_job(
+    db: Session,
+    user_id: int,
+    source: str,
+    calculation_period_id: int,
+    file_name: Optional[str],
+    spool_path: str
+) -> ImportJob:
+    """ジョブを登録（status=queued）"""
+    job = ImportJob(
+        user_id=user_id,
+        calculation_period_id=calculation_period_id,
+        source=source,
+        status="queued",
+        file_name=file_name,
+        spool_path=spool_path,
+        file_size=os.path.getsize(spool_path),
+        rows_parsed=0,
+        rows_inserted=0,
+        error_count=0,
+        errors=[],
+        checkpoint_row=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def submit_import_job(job_id: int, abandoned_worker_id: Optional[str] = None) -> None:
+    """ワーカーにジョブを投入"""
+    _get_executor().submit(run_import_job, job_id, abandoned_worker_id)
+
+
+def current_worker_id() -> str:
+    """このプロセスのワーカーID（ホスト名:PID:起動ID）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_BOOT_ID}"
+
+
+def _worker_is_gone(worker_id: Optional[str]) -> bool:
+    """同じホストで既に終了したプロセス（再起動前の自分を含む）のワーカーIDか（判定できなければ False）"""
+    if not worker_id or os.name != "posix":
+        return False
+    try:
+        host, pid, boot_id = worker_id.rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        return boot_id != _BOOT_ID
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def _claim_job(db: Session, job_id: int, abandoned_worker_id: Optional[str] = None) -> bool:
+    """
+    ジョブを実行中に遷移（他のワーカーが処理中なら False）
+    待機中、ハートビートが途絶えた実行中ジョブ、
+    または abandoned_worker_id（終了したプロセス）が実行中のまま残したジョブのみ取得できる
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=settings.IMPORT_JOB_STALE_SECONDS)
+    reclaimable = (ImportJob.heartbeat_at.is_(None)) | (ImportJob.heartbeat_at < stale_before)
+    if abandoned_worker_id:
+        reclaimable = reclaimable | (ImportJob.worker_id == abandoned_worker_id)
+    claimed = db.query(ImportJob).filter(
+        ImportJob.id == job_id,
+        (ImportJob.status == "queued") | ((ImportJob.status == "running") & reclaimable)
+    ).update(
+        {ImportJob.status: "running", ImportJob.heartbeat_at: now, ImportJob.worker_id: current_worker_id()},
+        synchronize_session=False
+    )
+    db.commit()
+    return claimed == 1
+
+
+def _touch_job(db: Session, job: ImportJob) -> None:
+    """
+    ハートビートを更新（コミットは呼び出し側）
+    ジョブが別のワーカーに引き継がれていればロールバックして JobOwnershipLost
+    PostgreSQL ではコミットまでジョブの行がロックされ、その間は他のワーカーが引き継げない
+    """
+    updated = db.query(ImportJob).filter(
+        ImportJob.id == job.id,
+        ImportJob.worker_id == current_worker_id()
+    ).update({ImportJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+    if updated != 1:
+        db.rollback()
+        raise JobOwnershipLost(f"Import job {job.id} was taken over by another worker")
+
+
+def run_import_job(job_id: int, abandoned_worker_id: Optional[str] = None) -> None:
+    """ジョブを実行（ワーカースレッドから呼ばれる）"""
+    db = SessionLocal()
+    try:
+        if not _claim_job(db, job_id, abandoned_worker_id):
+            logger.info(f"Import job {job_id} is already being processed")
+            return
+
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if job.started_at is None:
+            job.started_at = datetime.utcnow()
+            db.commit()
+
+        _process_job(db, job)
+
+        _touch_job(db, job)
+        job.status = "completed"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        _remove_spool_file(job.spool_path)
+
+        IMPORT_DURATION.observe((job.finished_at - job.started_at).total_seconds(), source=job.source, mode="job")
+        throughput = rows_per_second(job)
+        if throughput:
+            IMPORT_ROWS_PER_SECOND.set(throughput, source=job.source)
+        logger.info(
+            f"Import job {job.id} completed: parsed={job.rows_parsed}, "
+            f"inserted={job.rows_inserted}, errors={job.error_count}"
+        )
+
+    except JobOwnershipLost as e:
+        # 引き継いだワーカーがチェックポイントから続ける（スプールファイルも残す）
+        logger.warning(str(e))
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {str(e)}")
+        db.rollback()
+        job = db.query(ImportJob).filter(
+            ImportJob.id == job_id,
+            ImportJob.worker_id == current_worker_id()
+        ).first()
+        if job:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+            job.errors = (job.errors or []) + [f"ジョブが異常終了しました: {str(e)}"]
+            job.error_count = (job.error_count or 0) + 1
+            db.commit()
+            IMPORT_FAILURES.inc(source=job.source)
+            _remove_spool_file(job.spool_path)
+    finally:
+        db.close()
+
+
+def _process_job(db: Session, job: ImportJob) -> None:
+    """スプールファイルをストリーミングで読み込み、バッチごとに挿入してチェックポイントを更新"""
+    mapper_class = IMPORT_MAPPERS[job.source]
+
+    with open(job.spool_path, "rb") as raw:
+        sample = raw.read(ENCODING_SAMPLE_SIZE)
+        encoding, bom_length = detect_csv_encoding(sample)
+        if job.encoding is None:
+            job.encoding = encoding
+            db.commit()
+
+        raw.seek(bom_length)
+        text = io.TextIOWrapper(raw, encoding=encoding, errors="replace", newline="")
+        reader = csv.DictReader(text)
+
+        resolver = EmployeeResolver(db, job.user_id, numeric_fallback=mapper_class.numeric_employee_match)
+        mapper = mapper_class(job.calculation_period_id, resolver)
+
+        checkpoint_row = job.checkpoint_row or 0
+        batch: List[dict] = []
+        batch_errors: List[str] = []
+        batch_parsed = 0
+        row_num = checkpoint_row
+        heartbeat_interval = settings.IMPORT_JOB_STALE_SECONDS / 3
+        next_heartbeat = time.monotonic() + heartbeat_interval
+
+        for row_num, row in enumerate(reader, start=2):  # ヘッダー行をスキップ
+            # 読み込みが長引いても他のワーカーに引き継がれないようハートビートを更新
+            if heartbeat_interval > 0 and time.monotonic() >= next_heartbeat:
+                _touch_job(db, job)
+                db.commit()
+                next_heartbeat = time.monotonic() + heartbeat_interval
+
+            # 前回までにコミット済みの行は読み飛ばす
+            if row_num <= checkpoint_row:
+                continue
+
+            batch_parsed += 1
+            try:
+                values, _ = mapper.map_row(row)
+                batch.append(values)
+            except Exception as e:
+                batch_errors.append(f"行 {row_num}: {str(e)}")
+
+            if batch_parsed >= settings.IMPORT_BATCH_SIZE:
+                _commit_batch(db, job, mapper_class.model, batch, batch_errors, batch_parsed, row_num)
+                batch, batch_errors, batch_parsed = [], [], 0
+
+        if batch_parsed:
+            _commit_batch(db, job, mapper_class.model, batch, batch_errors, batch_parsed, row_num)
+
+
+def _commit_batch(
+    db: Session,
+    job: ImportJob,
+    model,
+    batch: List[dict],
+    batch_errors: List[str],
+    batch_parsed: int,
+    last_row: int
+) -> None:
+    """バッチの挿入とジョブ進捗の更新を1トランザクションでコミット（別のワーカーに引き継がれていれば JobOwnershipLost）"""
+    _touch_job(db, job)
+    if batch:
+        db.bulk_insert_mappings(model, batch)
+
+    job.rows_parsed = (job.rows_parsed or 0) + batch_parsed
+    job.rows_inserted = (job.rows_inserted or 0) + len(batch)
+    if batch_errors:
+        job.error_count = (job.error_count or 0) + len(batch_errors)
+        stored_errors = list(job.errors or [])
+        job.errors = (stored_errors + batch_errors)[:MAX_STORED_ERRORS]
+    job.checkpoint_row = last_row
+    job.heartbeat_at = datetime.utcnow()
+    if batch:
+        bump_data_version(db, WORK_DATA, job.user_id)
+    db.commit()
+
+    if batch:
+        IMPORT_ROWS.inc(len(batch), source=job.source, outcome="inserted")
+    if batch_errors:
+        IMPORT_ROWS.inc(len(batch_errors), source=job.source, outcome="failed")
+
+
+def _remove_spool_file(spool_path: Optional[str]) -> None:
+    if spool_path and os.path.exists(spool_path):
+        try:
+            os.remove(spool_path)
+        except OSError as e:
+            logger.warning(f"スプールファイルの削除に失敗: {spool_path} - {str(e)}")
+
+
+def rows_per_second(job: ImportJob) -> Optional[float]:
+    """取り込みスループット（挿入行数/秒）"""
+    if not job.started_at or not job.rows_inserted:
+        return None
+    end = job.finished_at or datetime.utcnow()
+    elapsed = (end - job.started_at).total_seconds()
+    if elapsed <= 0:
+        return None
+    return round(job.rows_inserted / elapsed, 1)
+
+
+def _resubmit_jobs(stalled_only: bool) -> List[int]:
+    """
+    未完了のジョブを再投入（取得できるかはワーカー側の _claim_job で判定）
+    stalled_only=True の場合は、ハートビートが途絶えたか終了したプロセスが残したジョブと、
+    IMPORT_JOB_STALE_SECONDS を過ぎても待機中のジョブのみ
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.IMPORT_JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        jobs = db.query(
+            ImportJob.id, ImportJob.status, ImportJob.worker_id, ImportJob.heartbeat_at, ImportJob.created_at
+        ).filter(ImportJob.status.in_(ACTIVE_STATUSES)).all()
+    finally:
+        db.close()
+
+    job_ids = []
+    for job in jobs:
+        abandoned_worker_id = job.worker_id if job.status == "running" and _worker_is_gone(job.worker_id) else None
+        if stalled_only and abandoned_worker_id is None:
+            last_seen = job.heartbeat_at if job.status == "running" else job.created_at
+            if last_seen is not None and last_seen >= stale_before:
+                continue
+        submit_import_job(job.id, abandoned_worker_id)
+        job_ids.append(job.id)
+    return job_ids
+
+
+def resume_pending_import_jobs() -> int:
+    """起動時に未完了のジョブを再投入（再起動前のプロセスが実行中のまま残したジョブはすぐに再開）"""
+    try:
+        job_ids = _resubmit_jobs(stalled_only=False)
+    except Exception as e:
+        # テーブル未作成（マイグレーション前）などの場合は起動を妨げない
+        logger.warning(f"インポートジョブの再開確認に失敗: {str(e)}")
+        return 0
+
+    if job_ids:
+        logger.info(f"Resumed {len(job_ids)} import jobs: {job_ids}")
+    return len(job_ids)
+
+
+_watchdog_thread: Optional[threading.Thread] = None
+_watchdog_stop = threading.Event()
+
+
+def _watchdog_loop() -> None:
+    while not _watchdog_stop.wait(settings.IMPORT_JOB_STALE_SECONDS):
+        try:
+            job_ids = _resubmit_jobs(stalled_only=True)
+        except Exception as e:
+            logger.error(f"停止したインポートジョブの確認に失敗しました: {e}")
+            continue
+        if job_ids:
+            logger.info(f"Resubmitted stalled import jobs: {job_ids}")
+
+
+def start_import_job_watchdog() -> bool:
+    """停止したジョブを定期的に再投入するスレッドを開始（IMPORT_JOB_STALE_SECONDS が 0 なら開始しない）"""
+    global _watchdog_thread
+    if settings.IMPORT_JOB_STALE_SECONDS <= 0 or (_watchdog_thread and _watchdog_thread.is_alive()):
+        return False
+    _watchdog_stop.clear()
+    _watchdog_thread = threading.Thread(target=_watchdog_loop, name="import-job-watchdog", daemon=True)
+    _watchdog_thread.start()
+    return True
+
+
+def stop_import_job_watchdog() -> None:
+    _watchdog_stop.set()
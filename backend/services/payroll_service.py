@@ -1,23 +1,45 @@
 """
 給与計算Excel生成サービス
 Firebase Cloud Functionsからの移行版
+
+openpyxl / numpy（手当計算）は読み込みに時間がかかるため、起動時ではなくExcel生成時に読み込む
+同じ入力（勤務データ・計算期間・テンプレート・コードのバージョン）で生成済みのファイルがあれば、
+集計・Excel処理を行わずにそのファイルを返す（force=True で生成し直す）
 """
-import pandas as pd
-from openpyxl import load_workbook
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from decimal import Decimal
 from io import BytesIO
 import datetime
+import hashlib
 import logging
 
 from models import (
     CalculationPeriod, Employee, AttendanceRecord, 
-    FreeeExpense, KinconeTransportation, ExcelTemplate
+    FreeeExpense, KinconeTransportation, ExcelTemplate, GeneratedFile
 )
 from schemas import WorkDataSummary, PayrollGenerationResponse
+from core.config import settings
+from core.metrics import PAYROLL_GENERATIONS
+from core.tracing import get_tracer
+from services.data_versions import ALL_USERS, CALCULATION_PERIODS, GLOBAL_SCOPE, WORK_DATA, data_etag
+from services.generated_files import find_generated_file, find_reusable_generated_file, store_generated_file
+from services.duration_parser import (
+    format_minutes_hm, parse_duration_minutes, parse_duration_seconds, parse_duration_timedelta
+)
+from services.period_snapshot import load_snapshot_summaries
+from services.salary_ledger import save_salary_calculations
+from services.template_layout import ANALYZER_VERSION, LEGACY_COLUMN_MAP, template_layout
+from services.profiling import PhaseProfiler
+
+if TYPE_CHECKING:
+    from services.allowance_calculator import AllowanceCalculator
 
 logger = logging.getLogger(__name__)
+_trace = get_tracer(__name__)
+
+# 出力内容（手当の計算・書き込み）を変えたら上げる（以前に生成したファイルを再利用しない）
+PAYROLL_OUTPUT_VERSION = 1
 
 class PayrollService:
     """給与計算Excel生成サービス"""
@@ -28,12 +50,38 @@ class PayrollService:
     def generate_payroll_excel(
         self, 
         calculation_period_id: int, 
-        template_id: int
+        template_id: int,
+        profiler: Optional[PhaseProfiler] = None,
+        user_id: Optional[int] = None,
+        force: bool = False
     ) -> PayrollGenerationResponse:
         """
         給与計算Excelファイルを生成
         Firebase Cloud Functionsのgenerate_payroll関数を移行
+
+        profiler を渡すとフェーズ別の計測結果をレスポンスの profile に含める
+        生成したファイルは generated_files に記録する（コミットは呼び出し側）
+        同じ入力で生成済みのファイルがあればそれを返す（force=True なら生成し直す）
         """
+        profiler = profiler or PhaseProfiler()
+        profiler.start()
+        try:
+            result = self._generate_payroll_excel(calculation_period_id, template_id, profiler, user_id, force)
+        finally:
+            profiler.stop(label=f"payroll_{calculation_period_id}")
+        
+        PAYROLL_GENERATIONS.inc(status=result.status)
+        result.profile = profiler.result()
+        return result
+    
+    def _generate_payroll_excel(
+        self, 
+        calculation_period_id: int, 
+        template_id: int,
+        profiler: PhaseProfiler,
+        user_id: Optional[int] = None,
+        force: bool = False
+    ) -> PayrollGenerationResponse:
         error_messages = []
         
         try:
@@ -62,8 +110,25 @@ class PayrollService:
                     messages=error_messages
                 )
             
+            # 同じ入力で生成済みのファイルがあれば返す
+            with profiler.phase("lookup"):
+                input_fingerprint = self._input_fingerprint(calculation_period, template)
+                reusable_file = None if force else find_reusable_generated_file(self.db, input_fingerprint)
+            
+            if reusable_file:
+                logger.info(f"生成済みのファイルを返します: {reusable_file.file_name}")
+                return PayrollGenerationResponse(
+                    status="success",
+                    messages=error_messages,
+                    file_name=reusable_file.file_name,
+                    download_url=f"/payroll/download/{reusable_file.file_name}",
+                    file_sha256=reusable_file.sha256,
+                    reused=True
+                )
+            
             # 従業員データの統合取得
-            work_data_summaries = self._get_work_data_summaries(calculation_period_id)
+            with profiler.phase("aggregate"):
+                work_data_summaries = self.get_work_data_summaries(calculation_period_id)
             
             if not work_data_summaries:
                 error_messages.append('指定された年月のデータが見つかりません。')
@@ -73,56 +138,77 @@ class PayrollService:
                 )
             
             # テンプレートファイルの読み込み
-            template_content = self._load_template_file(template)
-            if not template_content:
-                error_messages.append('テンプレートファイルの読み込みに失敗しました。')
-                return PayrollGenerationResponse(
-                    status="error",
-                    messages=error_messages
+            with profiler.phase("template_load"):
+                from openpyxl import load_workbook
+                
+                template_content = self._load_template_file(template)
+                if not template_content:
+                    error_messages.append('テンプレートファイルの読み込みに失敗しました。')
+                    return PayrollGenerationResponse(
+                        status="error",
+                        messages=error_messages
+                    )
+                
+                # Excel処理（ヘッダー行・社員行・列マップはアップロード時の解析結果を使う）
+                template_wb = load_workbook(template_content)
+                ws = template_wb.active
+                template_metadata, column_map = template_layout(template, ws)
+            
+            # 社員番号 → 行番号（同じ番号が複数ある場合は最初の行）
+            employee_rows = template_metadata["employee_rows"]
+            
+            # 手当を全社員分まとめて計算
+            with profiler.phase("calculate"):
+                from services.allowance_calculator import AllowanceCalculator
+                calculator = AllowanceCalculator(
+                    work_data_summaries, kiwi_point_threshold=self._kiwi_point_threshold(ws, column_map)
                 )
             
-            # Excel処理
-            template_df = pd.read_excel(template_content, header=4)
-            template_wb = load_workbook(template_content)
-            ws = template_wb.active
-            
-            # A列にある社員番号の列を取得
-            employee_numbers = template_df.iloc[:, 0].astype(str)
-            
-            # 各従業員データをExcelに書き込み
-            for work_data in work_data_summaries:
-                employee_number_str = str(work_data.employee_number)
-                
-                # テンプレート内の該当行を検索
-                matching_row_index = template_df[employee_numbers == employee_number_str].index
-                if not matching_row_index.empty:
-                    row = matching_row_index[0] + 5 + 1  # ヘッダー行を考慮した実際の行番号
-                    
-                    # 各種データの書き込み（元のFirebase実装と同じ位置）
-                    self._write_work_data_to_excel(ws, row, work_data)
-            
-            # 生成されたExcelファイルをメモリに保存
-            output_stream = BytesIO()
-            template_wb.save(output_stream)
-            output_stream.seek(0)
+            # 各従業員データをExcelに書き込み（列はテンプレートの列マップで決まる）
+            with profiler.phase("write"):
+                rows = [employee_rows.get(str(work_data.employee_number)) for work_data in work_data_summaries]
+                unmatched = [
+                    str(work_data.employee_number) for work_data, row in zip(work_data_summaries, rows) if row is None
+                ]
+                if unmatched:
+                    logger.warning(f"テンプレートに行が無い社員: {unmatched}")
+                    error_messages.append(f"テンプレートに社員番号の行が無いため書き込んでいない社員: {', '.join(unmatched)}")
+                self._write_work_data_to_excel(ws, rows, calculator, column_map, settings.PAYROLL_CELL_MODE)
+            
+            # 計算結果を SalaryCalculation に保存（集計APIで使う、コミットは呼び出し側）
+            with profiler.phase("persist"):
+                save_salary_calculations(self.db, calculation_period_id, calculator)
             
             # ファイル名生成
             dt_now = datetime.datetime.utcnow() + datetime.timedelta(hours=9)
             file_name = f'payroll_{calculation_period.year}_{calculation_period.month:02d}_{dt_now.strftime("%Y%m%d%H%M%S")}.xlsx'
             
-            # ファイル保存処理
-            file_path = self._save_generated_file(output_stream, file_name)
-            download_url = f"/payroll/download/{file_name}" if file_path else None
+            with profiler.phase("save"):
+                # 生成されたExcelファイルをメモリに保存
+                output_stream = BytesIO()
+                template_wb.save(output_stream)
+                output_stream.seek(0)
+                file_sha256 = hashlib.sha256(output_stream.getbuffer()).hexdigest()
+                
+                # ファイル保存処理
+                generated_file = self._save_generated_file(
+                    output_stream.getvalue(), file_name, file_sha256, calculation_period_id, template_id, user_id,
+                    input_fingerprint
+                )
+            if generated_file:
+                file_name = generated_file.file_name
+            download_url = f"/payroll/download/{file_name}" if generated_file else None
             
             logger.info(f"給与計算Excel生成完了: {file_name}")
-            if file_path:
-                logger.info(f"ファイル保存先: {file_path}")
+            if generated_file:
+                logger.info(f"ファイル保存先: {generated_file.storage_backend}:{generated_file.storage_key}")
             
             return PayrollGenerationResponse(
                 status="success",
                 messages=error_messages,
                 file_name=file_name,
-                download_url=download_url
+                download_url=download_url,
+                file_sha256=file_sha256
             )
             
         except Exception as e:
@@ -132,6 +218,15 @@ class PayrollService:
                 messages=[str(e)]
             )
     
+    def get_work_data_summaries(self, calculation_period_id: int) -> List[WorkDataSummary]:
+        """
+        勤務データサマリを取得（確定済み期間はスナップショットから返す）
+        """
+        summaries = load_snapshot_summaries(self.db, calculation_period_id)
+        if summaries is not None:
+            return summaries
+        return self._get_work_data_summaries(calculation_period_id)
+    
     def _get_work_data_summaries(self, calculation_period_id: int) -> List[WorkDataSummary]:
         """
         計算期間内の全従業員の勤務データを統合して取得
@@ -202,31 +297,49 @@ class PayrollService:
         
         return summaries
     
-    def _save_generated_file(self, file_stream: BytesIO, file_name: str) -> Optional[str]:
+    def _input_fingerprint(self, calculation_period: CalculationPeriod, template: ExcelTemplate) -> str:
         """
-        生成されたExcelファイルをローカルに保存
+        生成結果を決める入力のフィンガープリント
+        勤務データ・計算期間のデータバージョン、テンプレートの内容のハッシュ、出力・解析のバージョンとセルの書き込み方式
+        """
+        template_sha256 = hashlib.sha256(template.file_data or b"").hexdigest()
+        parts = (
+            f"output={PAYROLL_OUTPUT_VERSION}",
+            f"analyzer={ANALYZER_VERSION}",
+            f"cell_mode={settings.PAYROLL_CELL_MODE}",
+            f"period={calculation_period.id}",
+            f"data={data_etag(self.db, (WORK_DATA, ALL_USERS), (CALCULATION_PERIODS, GLOBAL_SCOPE))}",
+            f"template={template.id}:{template_sha256}",
+        )
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+    
+    def _save_generated_file(
+        self,
+        data: bytes,
+        file_name: str,
+        file_sha256: str,
+        calculation_period_id: int,
+        template_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        input_fingerprint: Optional[str] = None
+    ) -> Optional[GeneratedFile]:
+        """
+        生成されたExcelファイルを保存先（services.artifact_store）に保存
+        同じ秒に生成したファイル名が既にあれば連番を付ける
         """
         try:
-            import os
-            
-            # 出力ディレクトリの作成
-            current_dir = os.path.dirname(os.path.dirname(__file__))  # backend/
-            project_root = os.path.dirname(current_dir)  # プロジェクトルート
-            output_dir = os.path.join(project_root, "output_files")
-            
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-                logger.info(f"出力ディレクトリを作成: {output_dir}")
-            
-            # ファイル保存
-            file_path = os.path.join(output_dir, file_name)
-            file_stream.seek(0)  # ストリームの先頭に戻る
-            
-            with open(file_path, 'wb') as f:
-                f.write(file_stream.read())
-            
-            logger.info(f"ファイル保存完了: {file_path}")
-            return file_path
+            base_name = file_name[:-len('.xlsx')]
+            suffix = 1
+            while find_generated_file(self.db, file_name):
+                suffix += 1
+                file_name = f'{base_name}_{suffix}.xlsx'
+            
+            # 保存に失敗しても生成結果（計算結果の保存など）は残す
+            with self.db.begin_nested():
+                return store_generated_file(
+                    self.db, data, file_name, file_sha256, calculation_period_id, template_id, user_id,
+                    input_fingerprint
+                )
             
         except Exception as e:
             logger.error(f"ファイル保存エラー: {str(e)}")
@@ -236,17 +349,7 @@ class PayrollService:
         """
         時間文字列（HH:MM形式）をtimedelta型に変換
         """
-        if not time_str or time_str == '-':
-            return None
-        
-        try:
-            if ':' in time_str:
-                hours, minutes = time_str.split(':')
-                return datetime.timedelta(hours=int(hours), minutes=int(minutes))
-            else:
-                return datetime.timedelta(hours=float(time_str))
-        except ValueError:
-            return None
+        return parse_duration_timedelta(time_str)
     
     def _timedelta_to_hours(self, td) -> float:
         """
@@ -255,21 +358,21 @@ class PayrollService:
         if not td:
             return 0.0
             
-        logger.info(f"時間変換処理: {td} (型: {type(td)})")
-            
         # 文字列の場合（PostgreSQLのINTERVAL型）
         if isinstance(td, str):
             hours = self._parse_interval_string_to_hours(td)
-            logger.info(f"文字列から時間変換: '{td}' → {hours}時間")
+            if _trace.enabled:
+                _trace("timedelta_to_hours.str", value=td, hours=hours)
             return hours
             
         # timedelta型の場合
         if isinstance(td, datetime.timedelta):
             hours = td.total_seconds() / 3600
-            logger.info(f"timedeltaから時間変換: {td} → {hours}時間")
+            if _trace.enabled:
+                _trace("timedelta_to_hours.timedelta", value=td, hours=hours)
             return hours
             
-        logger.warning(f"未対応の型での時間変換: {td} (型: {type(td)})")
+        logger.warning("未対応の型での時間変換: %r (型: %s)", td, type(td))
         return 0.0
     
     def _parse_interval_string_to_hours(self, interval_str: str) -> float:
@@ -279,40 +382,17 @@ class PayrollService:
         """
         if not interval_str:
             return 0.0
-            
-        logger.info(f"INTERVAL文字列解析開始: '{interval_str}'")
-            
-        try:
-            # HH:MM:SS形式の場合
-            if ':' in interval_str:
-                parts = interval_str.split(':')
-                hours = int(parts[0])
-                minutes = int(parts[1]) if len(parts) > 1 else 0
-                seconds = int(parts[2]) if len(parts) > 2 else 0
-                
-                result = hours + minutes / 60 + seconds / 3600
-                logger.info(f"HH:MM:SS形式解析: {hours}h {minutes}m {seconds}s → {result}時間")
-                return result
-                
-            # その他の形式（例: "142 hours 2 minutes"）
-            import re
-            
-            # 時間を抽出
-            hours_match = re.search(r'(\d+)\s*(?:hours?|hrs?|h)', interval_str, re.IGNORECASE)
-            minutes_match = re.search(r'(\d+)\s*(?:minutes?|mins?|m)', interval_str, re.IGNORECASE)
-            seconds_match = re.search(r'(\d+)\s*(?:seconds?|secs?|s)', interval_str, re.IGNORECASE)
-            
-            hours = int(hours_match.group(1)) if hours_match else 0
-            minutes = int(minutes_match.group(1)) if minutes_match else 0
-            seconds = int(seconds_match.group(1)) if seconds_match else 0
-            
-            result = hours + minutes / 60 + seconds / 3600
-            logger.info(f"テキスト形式解析: {hours}h {minutes}m {seconds}s → {result}時間")
-            return result
-            
-        except (ValueError, IndexError, AttributeError) as e:
-            logger.warning(f"INTERVAL文字列の解析に失敗: '{interval_str}' - エラー: {str(e)}")
+        
+        seconds = parse_duration_seconds(interval_str)
+        if seconds is None:
+            if _trace.enabled:
+                _trace("interval.parse.failed", value=interval_str)
             return 0.0
+        
+        result = seconds / 3600
+        if _trace.enabled:
+            _trace("interval.parse", value=interval_str, hours=result)
+        return result
     
     def _timedelta_to_minutes(self, td) -> int:
         """
@@ -323,8 +403,7 @@ class PayrollService:
             
         # 文字列の場合（PostgreSQLのINTERVAL型）
         if isinstance(td, str):
-            hours = self._parse_interval_string_to_hours(td)
-            return int(hours * 60)
+            return parse_duration_minutes(td) or 0
             
         # timedelta型の場合
         if isinstance(td, datetime.timedelta):
@@ -338,31 +417,8 @@ class PayrollService:
         """
         if not td:
             return "0:00"
-            
-        # 文字列の場合（PostgreSQLのINTERVAL型）
-        if isinstance(td, str):
-            # すでにHH:MM:SS形式の場合はそのまま使用
-            if ':' in td:
-                parts = td.split(':')
-                hours = int(parts[0])
-                minutes = int(parts[1]) if len(parts) > 1 else 0
-                return f"{hours}:{minutes:02d}"
-            else:
-                # 他の形式の場合は時間に変換してからフォーマット
-                hours = self._parse_interval_string_to_hours(td)
-                total_minutes = int(hours * 60)
-                h = total_minutes // 60
-                m = total_minutes % 60
-                return f"{h}:{m:02d}"
         
-        # timedelta型の場合
-        if isinstance(td, datetime.timedelta):
-            total_minutes = int(td.total_seconds() / 60)
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            return f"{hours}:{minutes:02d}"
-            
-        return "0:00"
+        return format_minutes_hm(self._timedelta_to_minutes(td))
     
     def _format_hours_to_hm(self, hours: float) -> str:
         """
@@ -371,10 +427,7 @@ class PayrollService:
         if not hours or hours <= 0:
             return "0:00"
             
-        total_minutes = int(hours * 60)
-        h = total_minutes // 60
-        m = total_minutes % 60
-        return f"{h}:{m:02d}"
+        return format_minutes_hm(int(hours * 60))
     
     def _load_template_file(self, template: ExcelTemplate) -> Optional[BytesIO]:
         """
@@ -398,92 +451,49 @@ class PayrollService:
             logger.error(f"テンプレートファイル読み込みエラー: {str(e)}")
             return None
     
-    def _write_work_data_to_excel(self, ws, row: int, work_data: WorkDataSummary):
+    def _kiwi_point_threshold(self, ws, column_map: Dict[str, int]) -> float:
         """
-        勤務データをExcelの指定行に書き込み
-        Firebase実装と同じ列位置を使用
+        お菓子飲み物手当のKIWIポイントの基準値（テンプレートのKIWIポイント列2行目、Z列の数式が参照するセル）
+        数値でない場合は既定値
         """
-        # 出勤日数
-        if work_data.working_days is not None:
-            ws[f'E{row}'] = work_data.working_days
-        
-        # 総労働時間（文字列のまま書き込み）
-        if work_data.total_work_hours is not None:
-            ws[f'F{row}'] = work_data.total_work_hours
-        
-        # 有給取得日数
-        if work_data.paid_leave_days is not None:
-            ws[f'G{row}'] = work_data.paid_leave_days
-        
-        # 法定休日時間（文字列のまま書き込み）
-        if work_data.statutory_holiday_hours is not None:
-            ws[f'N{row}'] = work_data.statutory_holiday_hours
-        
-        # 深夜時間（文字列のまま書き込み）
-        if work_data.night_working_hours is not None:
-            ws[f'O{row}'] = work_data.night_working_hours
-        
-        # 欠勤日数
-        if work_data.absence_days is not None:
-            ws[f'P{row}'] = work_data.absence_days
-        
-        # リモート＠家（上限10日、noRemoteAllowanceLimitチェック）
-        if work_data.remote_count is not None:
-            remote_count = work_data.remote_count
-            if remote_count >= 10 and not work_data.no_remote_allowance_limit:
-                remote_count = 10
-            ws[f'X{row}'] = remote_count
-        
-        # 出社ランチ（上限10日）
-        if work_data.lunch_count is not None:
-            lunch_count = work_data.lunch_count
-            if lunch_count >= 10:
-                lunch_count = 10
-            ws[f'AG{row}'] = f'=500*{lunch_count}'
-        
-        # 通勤日数
-        if work_data.office_count is not None:
-            ws[f'AP{row}'] = work_data.office_count
-        
-        # オフィス出社手当（上限10日）
-        if work_data.office_count is not None:
-            office_count = work_data.office_count
-            if office_count >= 10:
-                office_count = 10
-            ws[f'AF{row}'] = f'=2000*{office_count}'
+        from services.allowance_calculator import KIWI_POINT_THRESHOLD
         
-        # イベント参加
-        if work_data.event_count is not None:
-            ws[f'AH{row}'] = f'=3000*{work_data.event_count}'
-        
-        # 出張日当計算
-        if all(x is not None for x in [
-            work_data.trip_night_before_count, work_data.trip_count,
-            work_data.travel_onday_count, work_data.travel_holidays_count
-        ]):
-            ws[f'AR{row}'] = (
-                f'=2000*{work_data.trip_night_before_count}+'
-                f'2000*{work_data.trip_count}+'
-                f'2000*{work_data.travel_onday_count}+'
-                f'1000*{work_data.travel_holidays_count}'
-            )
-        
-        # Kiwi points
-        if work_data.kiwi_points is not None:
-            ws[f'AK{row}'] = work_data.kiwi_points
-        
-        # 特別休暇
-        if work_data.special_holiday is not None:
-            ws[f'H{row}'] = f'=H2+{work_data.special_holiday}'
-        
-        # 特別休暇(無給)
-        if work_data.special_holiday_without_pay is not None:
-            ws[f'I{row}'] = f'=I2+{work_data.special_holiday_without_pay}'
+        column = column_map.get("kiwi_points", LEGACY_COLUMN_MAP["kiwi_points"])
+        value = ws.cell(row=2, column=column).value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        try:
+            return float(str(value).strip())
+        except (TypeError, ValueError):
+            logger.warning(f"KIWIポイントの基準値を読み取れないため既定値 {KIWI_POINT_THRESHOLD} を使います: {value!r}")
+            return KIWI_POINT_THRESHOLD
+    
+    def _write_work_data_to_excel(
+        self,
+        ws,
+        rows: List[Optional[int]],
+        calculator: "AllowanceCalculator",
+        column_map: Dict[str, int],
+        cell_mode: str = "formulas"
+    ):
+        """
+        勤務データを列ごとにExcelへ書き込み（rows は社員ごとの行番号、テンプレートに無い社員は None）
+        column_map（項目 → 列番号）に無い項目は書き込まない
+        """
+        from openpyxl.utils import get_column_letter
         
-        # freee立替経費
-        if work_data.freee_expenses is not None:
-            ws[f'AT{row}'] = work_data.freee_expenses
+        # 特別休暇はテンプレート2行目の値に加算する
+        special_holiday_columns = [
+            column_map.get(field_name, LEGACY_COLUMN_MAP[field_name])
+            for field_name in ("special_holiday", "special_holiday_without_pay")
+        ]
+        special_holiday_base = tuple(ws.cell(row=2, column=column).value for column in special_holiday_columns)
+        special_holiday_cells = tuple(f"{get_column_letter(column)}2" for column in special_holiday_columns)
         
-        # kincone立替経費
-        if work_data.kincone_expenses is not None:
-            ws[f'AU{row}'] = work_data.kincone_expenses
\ No newline at end of file
+        for field_name, values in calculator.columns(cell_mode, special_holiday_base, special_holiday_cells):
+            column = column_map.get(field_name)
+            if column is None:
+                continue
+            for row, value in zip(rows, values):
+                if row is not None and value is not None:
+                    ws.cell(row=row, column=column, value=value)
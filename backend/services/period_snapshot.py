@@ -0,0 +1,125 @@
+"""
+確定済み（locked）計算期間のスナップショット
+
+ロック時に勤務データサマリ・ソース別の行数・生成したExcelのハッシュを保存し、
+以降のサマリ取得やExcel生成はファクトテーブルを再集計せずスナップショットから返す。
+ロック後にファクト行が編集されても、確定時点の内容を再現できる。
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import (
+    AttendanceRecord, CalculationPeriod, FreeeExpense, KinconeTransportation, PeriodSnapshot
+)
+from schemas import WorkDataSummary
+
+logger = logging.getLogger(__name__)
+
+LOCKED_STATUS = "locked"
+
+# 検証済みサマリのキャッシュ（スナップショットは不変なのでIDをキーにできる）
+SNAPSHOT_CACHE_SIZE = 16
+_summary_cache: "OrderedDict[int, List[WorkDataSummary]]" = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+
+def count_source_rows(db: Session, calculation_period_id: int) -> Dict[str, int]:
+    """ソース別の行数"""
+    counts = {}
+    for source, model in (
+        ("attendance", AttendanceRecord),
+        ("freee", FreeeExpense),
+        ("kincone", KinconeTransportation),
+    ):
+        counts[source] = db.query(func.count(model.id)).filter(
+            model.calculation_period_id == calculation_period_id
+        ).scalar() or 0
+    return counts
+
+
+def get_period_snapshot(db: Session, calculation_period_id: int) -> Optional[PeriodSnapshot]:
+    return db.query(PeriodSnapshot).filter(
+        PeriodSnapshot.calculation_period_id == calculation_period_id
+    ).first()
+
+
+def load_snapshot_summaries(db: Session, calculation_period_id: int) -> Optional[List[WorkDataSummary]]:
+    """スナップショットがあればサマリを返す（無ければNone）"""
+    snapshot_id = db.query(PeriodSnapshot.id).filter(
+        PeriodSnapshot.calculation_period_id == calculation_period_id
+    ).scalar()
+    if snapshot_id is None:
+        return None
+
+    with _summary_cache_lock:
+        summaries = _summary_cache.get(snapshot_id)
+        if summaries is not None:
+            _summary_cache.move_to_end(snapshot_id)
+            return summaries
+
+    stored = db.query(PeriodSnapshot.summaries).filter(PeriodSnapshot.id == snapshot_id).scalar()
+    summaries = [WorkDataSummary.model_validate(summary) for summary in stored or []]
+
+    with _summary_cache_lock:
+        _summary_cache[snapshot_id] = summaries
+        while len(_summary_cache) > SNAPSHOT_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return summaries
+
+
+def freeze_period(
+    db: Session,
+    period: CalculationPeriod,
+    user_id: int,
+    template_id: Optional[int] = None
+) -> PeriodSnapshot:
+    """
+    期間のスナップショットを作成（既存のものは作り直す）
+    template_id を指定した場合はスナップショットからExcelを生成し、ファイル名とハッシュを保存する
+    """
+    from services.payroll_service import PayrollService
+
+    release_period_snapshot(db, period.id)
+
+    summaries = PayrollService(db)._get_work_data_summaries(period.id)
+    snapshot = PeriodSnapshot(
+        calculation_period_id=period.id,
+        summaries=[summary.model_dump(mode="json") for summary in summaries],
+        summary_count=len(summaries),
+        row_counts=count_source_rows(db, period.id),
+        created_by_user_id=user_id
+    )
+    db.add(snapshot)
+    db.flush()
+
+    if template_id is not None:
+        result = PayrollService(db).generate_payroll_excel(period.id, template_id, user_id=user_id)
+        if result.status != "success":
+            with _summary_cache_lock:
+                _summary_cache.pop(snapshot.id, None)
+            raise ValueError(", ".join(result.messages) or "Excelの生成に失敗しました")
+        snapshot.template_id = template_id
+        snapshot.workbook_file_name = result.file_name
+        snapshot.workbook_sha256 = result.file_sha256
+
+    logger.info(
+        f"Period {period.id} frozen: {snapshot.summary_count} summaries, rows={snapshot.row_counts}"
+    )
+    return snapshot
+
+
+def release_period_snapshot(db: Session, calculation_period_id: int) -> bool:
+    """ロック解除時にスナップショットを削除（以降はファクトテーブルから集計）"""
+    snapshot = get_period_snapshot(db, calculation_period_id)
+    if snapshot is None:
+        return False
+    with _summary_cache_lock:
+        _summary_cache.pop(snapshot.id, None)
+    db.delete(snapshot)
+    db.flush()
+    return True
@@ -0,0 +1,129 @@
+"""
+給与計算Excel生成のフェーズ別プロファイラ
+
+フェーズ（aggregate, template_load, write, save）ごとに
+- 処理時間を /metrics のヒストグラムに常に記録する
+- enabled の場合はウォールタイムと tracemalloc によるメモリ確保ピークも保持し、レスポンスに返す
+- cprofile_dir を指定した場合は生成処理全体の cProfile を .pstats ファイルに書き出す（管理者のみ）
+
+tracemalloc・cProfile はプロセス全体で1つのため、プロファイル付きの実行は同時に1つに限る
+（実行中に別のプロファイルを開始すると ProfilerBusyError）。
+"""
+import cProfile
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from core.metrics import PAYROLL_PHASE_DURATION
+from schemas import PayrollPhaseProfile, PayrollProfile
+
+logger = logging.getLogger(__name__)
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """別のリクエストがプロファイル付きで実行中"""
+
+
+class PhaseProfiler:
+    """フェーズ単位の計測"""
+
+    def __init__(self, enabled: bool = False, cprofile_dir: Optional[str] = None):
+        self.enabled = enabled
+        self.cprofile_dir = cprofile_dir
+        self.phases: List[PayrollPhaseProfile] = []
+        self.pstats_file: Optional[str] = None
+        self._started_tracemalloc = False
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._start_time = 0.0
+        self._total_seconds = 0.0
+        self._locked = False
+
+    def start(self) -> None:
+        """計測開始（tracemalloc・cProfile を必要に応じて有効化、他のプロファイルが実行中なら ProfilerBusyError）"""
+        if self.enabled or self.cprofile_dir:
+            if not _profile_lock.acquire(blocking=False):
+                raise ProfilerBusyError("別のプロファイルが実行中です。しばらくしてから再実行してください")
+            self._locked = True
+        self._start_time = time.perf_counter()
+        try:
+            if self.enabled and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            if self.cprofile_dir:
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+        except Exception:
+            # 別のプロファイラが有効な場合など（ロックを残さない）
+            self._cprofile = None
+            self.stop()
+            raise
+
+    def stop(self, label: str = "payroll") -> None:
+        """計測終了（自分で開始した tracemalloc のみ停止）"""
+        self._total_seconds = time.perf_counter() - self._start_time
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self.pstats_file = self._dump_pstats(label)
+            self._cprofile = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self._locked:
+            self._locked = False
+            _profile_lock.release()
+
+    @contextmanager
+    def phase(self, name: str):
+        """with ブロックを1フェーズとして計測"""
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        else:
+            base_memory = None
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            PAYROLL_PHASE_DURATION.observe(elapsed, phase=name)
+            if self.enabled:
+                peak_kb = None
+                if base_memory is not None:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    peak_kb = round(max(peak - base_memory, 0) / 1024, 1)
+                self.phases.append(PayrollPhaseProfile(
+                    phase=name,
+                    wall_ms=round(elapsed * 1000, 2),
+                    peak_alloc_kb=peak_kb
+                ))
+
+    def result(self) -> Optional[PayrollProfile]:
+        """レスポンス用のプロファイル（無効時はNone）"""
+        if not self.enabled and not self.pstats_file:
+            return None
+        return PayrollProfile(
+            total_ms=round(self._total_seconds * 1000, 2),
+            phases=self.phases,
+            pstats_file=self.pstats_file
+        )
+
+    def _dump_pstats(self, label: str) -> Optional[str]:
+        try:
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+            file_path = os.path.join(
+                self.cprofile_dir, f"{label}_{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}.pstats"
+            )
+            self._cprofile.dump_stats(file_path)
+            logger.info(f"cProfile を書き出しました: {file_path}")
+            return file_path
+        except OSError as e:
+            logger.error(f"cProfile の書き出しに失敗: {str(e)}")
+            return None
@@ -0,0 +1,127 @@
+"""
+給与計算結果（SalaryCalculation）の保存と集計
+
+Excel生成のたびに AllowanceCalculator の結果を計算期間単位で一括保存し、
+期間ごとの合計・社員ごとの履歴はワークブックを開かずに SQL の集計で返す。
+確定（confirmed）・支払済（paid）の行は再生成しても上書きしない。
+"""
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
+
+from sqlalchemy import case, func, insert
+from sqlalchemy.orm import Session
+
+from models import CalculationPeriod, SalaryCalculation
+from services.data_versions import SALARY_CALCULATIONS, bump_data_version
+from services.employee_service import owned_by_user
+
+if TYPE_CHECKING:
+    from services.allowance_calculator import AllowanceCalculator
+
+logger = logging.getLogger(__name__)
+
+DRAFT_STATUS = "draft"
+
+# 期間合計で集計する金額の列
+AMOUNT_COLUMNS = (
+    "base_salary", "overtime_pay", "transportation_allowance", "remote_allowance",
+    "total_gross", "deductions", "net_salary",
+)
+
+# Excel生成では計算しない（NULL で保存する）列。全員分の値がある期間のみ合計し、それ以外は NULL を返す
+UNCOMPUTED_AMOUNT_COLUMNS = ("base_salary", "net_salary")
+
+
+def _amount_total(column: str):
+    amount = getattr(SalaryCalculation, column)
+    if column in UNCOMPUTED_AMOUNT_COLUMNS:
+        return case((func.count(amount) == func.count(SalaryCalculation.id), func.sum(amount)), else_=None).label(column)
+    return func.coalesce(func.sum(amount), 0).label(column)
+
+
+def save_salary_calculations(
+    db: Session,
+    calculation_period_id: int,
+    calculator: "AllowanceCalculator"
+) -> int:
+    """
+    期間の下書き（draft）の計算結果を置き換えて一括保存（コミットは呼び出し側）
+    保存した行数を返す
+    同じ期間の同時の生成が削除・追加の間に割り込まないよう、計算期間の行をコミットまでロックする
+    """
+    db.query(CalculationPeriod.id).filter(
+        CalculationPeriod.id == calculation_period_id
+    ).with_for_update().one_or_none()
+
+    finalized = {
+        employee_id for (employee_id,) in db.query(SalaryCalculation.employee_id).filter(
+            SalaryCalculation.calculation_period_id == calculation_period_id,
+            SalaryCalculation.status != DRAFT_STATUS
+        )
+    }
+    db.query(SalaryCalculation).filter(
+        SalaryCalculation.calculation_period_id == calculation_period_id,
+        SalaryCalculation.status == DRAFT_STATUS
+    ).delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    rows = [
+        dict(row, status=DRAFT_STATUS, calculated_at=now, updated_at=now)
+        for row in calculator.salary_calculation_rows(calculation_period_id)
+        if row["employee_id"] not in finalized
+    ]
+    if rows:
+        db.execute(insert(SalaryCalculation), rows)
+    bump_data_version(db, SALARY_CALCULATIONS)
+
+    logger.info(
+        f"Salary calculations saved for period {calculation_period_id}: "
+        f"{len(rows)} rows, {len(finalized)} finalized rows kept"
+    )
+    return len(rows)
+
+
+def period_totals(db: Session, user_id: int, calculation_period_id: Optional[int] = None) -> List[dict]:
+    """
+    計算期間ごとの合計（ユーザーの社員のみ、新しい期間から）
+    基本給・差引支給額は未計算の社員がいれば NULL（0円として扱わない）
+    """
+    query = db.query(
+        SalaryCalculation.calculation_period_id,
+        CalculationPeriod.year,
+        CalculationPeriod.month,
+        CalculationPeriod.period_name,
+        func.count(SalaryCalculation.id).label("employee_count"),
+        *(_amount_total(column) for column in AMOUNT_COLUMNS)
+    ).join(
+        CalculationPeriod, CalculationPeriod.id == SalaryCalculation.calculation_period_id
+    ).filter(owned_by_user(SalaryCalculation, user_id))
+
+    if calculation_period_id:
+        query = query.filter(SalaryCalculation.calculation_period_id == calculation_period_id)
+
+    query = query.group_by(
+        SalaryCalculation.calculation_period_id, CalculationPeriod.year,
+        CalculationPeriod.month, CalculationPeriod.period_name
+    ).order_by(CalculationPeriod.year.desc(), CalculationPeriod.month.desc())
+    return [row._asdict() for row in query]
+
+
+def employee_history(db: Session, employee_id: int) -> List[dict]:
+    """社員の計算結果を期間の古い順に返す"""
+    rows = db.query(
+        SalaryCalculation, CalculationPeriod.year, CalculationPeriod.month, CalculationPeriod.period_name
+    ).join(
+        CalculationPeriod, CalculationPeriod.id == SalaryCalculation.calculation_period_id
+    ).filter(
+        SalaryCalculation.employee_id == employee_id
+    ).order_by(CalculationPeriod.year, CalculationPeriod.month)
+
+    return [
+        dict(
+            {column.key: getattr(calculation, column.key) for column in SalaryCalculation.__table__.columns},
+            year=year, month=month, period_name=period_name
+        )
+        for calculation, year, month, period_name in rows
+    ]
@@ -0,0 +1,263 @@
+"""
+Excelテンプレートの解析（列マップ・社員行・数式セル）
+
+アップロード時にテンプレートを1回だけ解析し、結果を ExcelTemplate に保存する。
+    column_map         項目 → 列番号（ヘッダー行の見出しから検出）
+    template_metadata  シートの大きさ、ヘッダー行、社員番号 → 行番号、列ごとの数式セル数、警告
+Excel生成時は保存済みの解析結果で ws.cell(row, column) に書き込み、ヘッダー行や社員行を探し直さない
+（列の追加・移動があったテンプレートもコード変更なしで扱える）。
+ヘッダー行・社員番号の列・社員行が見つからないテンプレートはアップロード時に拒否する。
+解析結果が未保存のテンプレート（以前にアップロードされたもの）は生成時に解析して保存する。
+その際に見出しが見つからない場合は、標準のテンプレートの位置（5行目がヘッダー、A列が社員番号）で扱う。
+openpyxl は起動時に読み込まないよう関数内で import する。
+"""
+import logging
+import unicodedata
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import ExcelTemplate
+
+logger = logging.getLogger(__name__)
+
+ANALYZER_VERSION = 2  # 解析内容を変えたら上げる（古い解析結果は生成時に作り直す）
+
+HEADER_SCAN_ROWS = 20  # ヘッダー行を探す範囲（標準のテンプレートは5行目）
+
+EMPLOYEE_NUMBER_LABELS = ("社員No", "社員番号")
+
+# 標準のテンプレートのヘッダー行・社員番号の列（見出しを検出できない以前のテンプレートで使う）
+LEGACY_HEADER_ROW = 5
+LEGACY_EMPLOYEE_COLUMN = 1  # A
+
+
+class TemplateAnalysisError(ValueError):
+    """テンプレートとして使えないファイル"""
+
+# 項目 → ヘッダーの見出し（normalize_label 後に完全一致で比較）
+COLUMN_LABELS = {
+    "working_days": ("出勤日数",),
+    "total_work_hours": ("総労働時間",),
+    "paid_leave_days": ("有休日数", "有給日数"),
+    "special_holiday": ("特休(有給)",),
+    "special_holiday_without_pay": ("特休(無給)",),
+    "statutory_holiday_hours": ("法定休日時間",),
+    "night_working_hours": ("深夜時間",),
+    "absence_days": ("欠勤日数",),
+    "remote_days": ("ﾘﾓｰﾄ@家日数", "リモート@家日数"),
+    "office_allowance": ("出社手当",),
+    "lunch_allowance": ("ランチ手当",),
+    "event_allowance": ("ｲﾍﾞﾝﾄありがとう手当",),
+    "kiwi_points": ("KIWIﾎﾟｲﾝﾄ",),
+    "office_days": ("通勤日数",),
+    "trip_allowance": ("出張日当",),
+    "freee_expenses": ("freee立替経費",),
+    "kincone_expenses": ("kincone立替経費",),
+}
+
+# 標準のテンプレートの列位置（Firebase実装と同じ）
+LEGACY_COLUMN_MAP = {
+    "working_days": 5,                    # E
+    "total_work_hours": 6,                # F
+    "paid_leave_days": 7,                 # G
+    "special_holiday": 8,                 # H
+    "special_holiday_without_pay": 9,     # I
+    "statutory_holiday_hours": 14,        # N
+    "night_working_hours": 15,            # O
+    "absence_days": 16,                   # P
+    "remote_days": 24,                    # X
+    "office_allowance": 32,               # AF
+    "lunch_allowance": 33,                # AG
+    "event_allowance": 34,                # AH
+    "kiwi_points": 37,                    # AK
+    "office_days": 42,                    # AP
+    "trip_allowance": 44,                 # AR
+    "freee_expenses": 46,                 # AT
+    "kincone_expenses": 47,               # AU
+}
+
+
+def normalize_label(value) -> str:
+    """半角カナ・全角英数・空白・大文字小文字の違いを吸収した見出し"""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).casefold()
+    return "".join(text.split())
+
+
+_LABEL_INDEX = {
+    normalize_label(label): field_name
+    for field_name, labels in COLUMN_LABELS.items()
+    for label in labels
+}
+
+
+def detect_column_map(header_values: Iterable) -> Dict[str, int]:
+    """ヘッダー行の値から列マップを作る（同じ見出しが複数ある場合は左の列）"""
+    column_map: Dict[str, int] = {}
+    for column_index, value in enumerate(header_values, start=1):
+        field_name = _LABEL_INDEX.get(normalize_label(value))
+        if field_name is not None:
+            column_map.setdefault(field_name, column_index)
+    return column_map
+
+
+_EMPLOYEE_LABELS = {normalize_label(label) for label in EMPLOYEE_NUMBER_LABELS}
+
+
+def _employee_number_key(value) -> Optional[str]:
+    """
+    社員行の検索キー（勤務データサマリの社員番号と str() で比較する）
+    空のセルと見出しの繰り返しは除く（説明文の行はキーになるが社員番号と一致しないため書き込まれない）
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    text = str(value).strip()
+    if not text or normalize_label(text) in _EMPLOYEE_LABELS:
+        return None
+    return text
+
+
+def _layout_metadata(
+    ws,
+    rows: List[tuple],
+    header_row: int,
+    employee_column: int,
+    column_map: Dict[str, int],
+    warnings: List[str]
+) -> dict:
+    """ヘッダー行・社員番号の列から社員行・数式セルを集めて template_metadata を作る"""
+    from openpyxl.utils import get_column_letter
+
+    employee_rows: Dict[str, int] = {}
+    duplicates: List[str] = []
+    formula_cells: Dict[str, int] = {}
+    max_row = max_column = 0
+    for row_number, values in enumerate(rows, start=1):
+        for column_index, value in enumerate(values, start=1):
+            if value is None:
+                continue
+            max_row, max_column = row_number, max(max_column, column_index)
+            if isinstance(value, str) and value.startswith("="):
+                letter = get_column_letter(column_index)
+                formula_cells[letter] = formula_cells.get(letter, 0) + 1
+        if row_number > header_row and len(values) >= employee_column:
+            key = _employee_number_key(values[employee_column - 1])
+            if key is None:
+                continue
+            if key in employee_rows:
+                duplicates.append(key)
+            else:
+                employee_rows[key] = row_number
+
+    missing = sorted(set(COLUMN_LABELS) - set(column_map))
+    if missing:
+        warnings.append(f"見出しが見つからない項目は書き込みません: {', '.join(missing)}")
+    if duplicates:
+        warnings.append(f"社員番号が重複しています（最初の行に書き込みます）: {', '.join(sorted(set(duplicates)))}")
+    employee_row_numbers = set(employee_rows.values())
+    overwritten = sorted(
+        get_column_letter(column) for field_name, column in column_map.items()
+        if any(
+            isinstance(rows[row - 1][column - 1], str) and rows[row - 1][column - 1].startswith("=")
+            for row in employee_row_numbers if len(rows[row - 1]) >= column
+        )
+    )
+    if overwritten:
+        warnings.append(f"書き込み先の列に数式があります（生成時に上書きされます）: {', '.join(overwritten)}")
+
+    return {
+        "analyzer_version": ANALYZER_VERSION,
+        "sheet_title": ws.title,
+        "dimensions": f"A1:{get_column_letter(max(max_column, 1))}{max(max_row, 1)}",
+        "max_row": max_row,
+        "max_column": max_column,
+        "header_row": header_row,
+        "employee_column": employee_column,
+        "employee_rows": employee_rows,
+        "formula_cells": formula_cells,
+        "warnings": warnings,
+    }
+
+
+def analyze_worksheet(ws) -> Tuple[dict, Dict[str, int]]:
+    """
+    シートを解析して (template_metadata, column_map) を返す
+    テンプレートとして使えない場合は TemplateAnalysisError
+    """
+    rows: List[tuple] = list(ws.iter_rows(values_only=True))
+
+    # 既知の見出しが最も多い行をヘッダー行とする
+    header_row, column_map, best_count = None, {}, 0
+    for row_number, values in enumerate(rows[:HEADER_SCAN_ROWS], start=1):
+        detected = detect_column_map(values)
+        if len(detected) > best_count:
+            header_row, column_map, best_count = row_number, detected, len(detected)
+    if header_row is None:
+        raise TemplateAnalysisError(
+            f"先頭{HEADER_SCAN_ROWS}行に給与計算の見出し（出勤日数・総労働時間など）が見つかりません"
+        )
+
+    employee_column = next(
+        (index for index, value in enumerate(rows[header_row - 1], start=1) if normalize_label(value) in _EMPLOYEE_LABELS),
+        None
+    )
+    if employee_column is None:
+        raise TemplateAnalysisError(
+            f"{header_row}行目に社員番号の見出し（{'・'.join(EMPLOYEE_NUMBER_LABELS)}）が見つかりません"
+        )
+
+    metadata = _layout_metadata(ws, rows, header_row, employee_column, column_map, [])
+    if not metadata["employee_rows"]:
+        raise TemplateAnalysisError(f"{header_row}行目より下に社員番号の行がありません")
+    return metadata, column_map
+
+
+def legacy_layout(ws, column_map: Optional[Dict[str, int]] = None) -> Tuple[dict, Dict[str, int]]:
+    """
+    標準のテンプレートの位置（5行目がヘッダー、A列が社員番号）での (template_metadata, column_map)
+    見出しを検出できない以前のテンプレートを、列マップの導入前と同じ位置で生成するために使う
+    """
+    column_map = dict(column_map or LEGACY_COLUMN_MAP)
+    rows: List[tuple] = list(ws.iter_rows(values_only=True))
+    warnings = ["見出しを検出できないため、標準のテンプレートの位置（5行目がヘッダー、A列が社員番号）で書き込みます"]
+    metadata = _layout_metadata(ws, rows, LEGACY_HEADER_ROW, LEGACY_EMPLOYEE_COLUMN, column_map, warnings)
+    metadata["legacy_layout"] = True
+    return metadata, column_map
+
+
+def analyze_template(file_data: bytes) -> Tuple[dict, Dict[str, int]]:
+    """アップロードされたテンプレートを解析（読めないファイルは TemplateAnalysisError）"""
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(BytesIO(file_data), read_only=True)
+    except Exception as e:
+        raise TemplateAnalysisError(f"Excelファイル (.xlsx) として読み込めません: {e}")
+    try:
+        return analyze_worksheet(workbook.active)
+    finally:
+        workbook.close()
+
+
+def template_layout(template: ExcelTemplate, ws) -> Tuple[dict, Dict[str, int]]:
+    """
+    Excel生成で使う (template_metadata, column_map)
+    保存済みの解析結果が無い・古い場合は読み込んだシートを解析して保存する（コミットは呼び出し側）
+    解析できない場合（見出しの無い以前のテンプレート）は標準のテンプレートの位置で扱う
+    """
+    metadata = template.template_metadata
+    if not metadata or metadata.get("analyzer_version") != ANALYZER_VERSION or not template.column_map:
+        try:
+            metadata, column_map = analyze_worksheet(ws)
+        except TemplateAnalysisError as e:
+            logger.warning(f"テンプレート {template.id} を解析できないため標準の位置で扱います: {e}")
+            metadata, column_map = legacy_layout(ws, template.column_map)
+        template.template_metadata = metadata
+        template.column_map = column_map
+        logger.info(f"テンプレート {template.id} を解析しました: header_row={metadata['header_row']}")
+
+    column_map = {field_name: int(column) for field_name, column in template.column_map.items()}
+    return metadata, column_map